@@ -0,0 +1,4 @@
+"""
+Offline benchmarks of bot internals. Run them from repository root, e.g.:
+python -m benchmarks.async_db
+"""
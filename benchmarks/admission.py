@@ -0,0 +1,153 @@
+"""
+Admission control: memory and speed of token buckets of many users against
+dict of buckets, latency of normal users while one user floods bot with
+and without admission middleware, and check of pending reminders limit by
+counter table against COUNT(*)
+
+python -m benchmarks.admission --users 1000000 --flood 3000
+"""
+import asyncio
+import json
+import random
+import tracemalloc
+from argparse import ArgumentParser
+from difflib import SequenceMatcher
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+from types import SimpleNamespace
+
+from bot.admission import Admission, TokenBuckets
+from bot.db import Database
+from bot.texts import store
+
+from ._stats import summary
+
+
+def dict_take(buckets: dict, key: int, now: float, rate: float, capacity: float) -> float:
+    """Plain implementation, which keeps bucket of every user ever seen"""
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = buckets[key] = [capacity, now]
+    tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+    bucket[0], bucket[1] = max(tokens - 1, 0), now
+    return tokens
+
+
+def fill_plain(keys: list) -> dict:
+    plain = {}
+    # All users are active within 10 seconds
+    for index, key in enumerate(keys):
+        dict_take(plain, key, index / len(keys) * 10, 1, 20)
+    return plain
+
+
+def fill_buckets(keys: list) -> TokenBuckets:
+    buckets = TokenBuckets(1, 20)
+    for index, key in enumerate(keys):
+        buckets.take(key, index / len(keys) * 10)
+    return buckets
+
+
+def buckets_memory(users: int) -> dict:
+    """Time is measured without tracemalloc, which slows allocations down"""
+    report = {}
+    keys = random.sample(range(10 ** 10), users)
+    for name, fill in (('dict', fill_plain), ('buckets', fill_buckets)):
+        start = perf_counter()
+        fill(keys)
+        report[f'{name}_take_us'] = (perf_counter() - start) / users * 1e6
+        tracemalloc.start()
+        filled = fill(keys)
+        report[f'{name}_peak_bytes_per_user'] = tracemalloc.get_traced_memory()[1] / users
+        report[f'{name}_users_kept'] = len(filled)
+        del filled
+        tracemalloc.stop()
+    return report
+
+
+async def flood(args, admission) -> dict:
+    """One user sends `flood` updates at once, others send one update every 200 ms"""
+    latencies = []
+
+    async def handler(event, data) -> None:
+        # Scoring of lesson names and database query
+        SequenceMatcher(None, event.text, 'теория вероятностей и математическая статистика').ratio()
+        await asyncio.sleep(0.002)
+
+    async def feed(user_id: int, text: str, measure: bool) -> None:
+        start = perf_counter()
+        user = SimpleNamespace(id=user_id, language_code='ru')
+        event = SimpleNamespace(update_id=0, text=text)
+        data = {'event_from_user': user, 'event_chat': None}
+        if admission is None:
+            await handler(event, data)
+        else:
+            await admission(handler, event, data)
+        if measure:
+            latencies.append(perf_counter() - start)
+
+    async def normal(user_id: int) -> None:
+        tasks = []
+        for _ in range(args.updates):
+            tasks.append(asyncio.create_task(feed(user_id, 'теор вер', True)))
+            await asyncio.sleep(0.2)
+        await asyncio.gather(*tasks)
+
+    spam = [asyncio.create_task(feed(0, 'x' * 500, False)) for _ in range(args.flood)]
+    start = perf_counter()
+    await asyncio.gather(*(normal(user_id) for user_id in range(1, args.normal + 1)))
+    result = summary(latencies, perf_counter() - start)
+    await asyncio.gather(*spam)
+    return result
+
+
+def pending_check(rows: int, owners: int, lookups: int) -> dict:
+    with TemporaryDirectory() as folder:
+        db = Database(Path(folder) / 'reminds.db', readers=0)
+        now = time()
+        with db.cursor(autocommit=True) as cur:
+            hash_ = store(db.db, 'x')
+            start = perf_counter()
+            cur.executemany(
+                "INSERT INTO reminds (datetime, owner, text_hash) VALUES (?, ?, ?)",
+                ((now + i, i % owners, hash_) for i in range(rows))
+            )
+        report = {'insert_with_counter_us': (perf_counter() - start) / rows * 1e6}
+        with db.cursor() as cur:
+            start = perf_counter()
+            for i in range(lookups):
+                cur.execute("SELECT count(*) FROM reminds WHERE owner = ?", (i % owners,)).fetchone()
+            report['count_query_us'] = (perf_counter() - start) / lookups * 1e6
+            start = perf_counter()
+            for i in range(lookups):
+                cur.execute("SELECT count FROM pending_counts WHERE owner = ?", (i % owners,)).fetchone()
+            report['counter_lookup_us'] = (perf_counter() - start) / lookups * 1e6
+        db.unload_instance_normal()
+    report['reminders_per_owner'] = rows // owners
+    return report
+
+
+async def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--flood', type=int, default=3_000, help='Updates sent at once by flooding user')
+    parser.add_argument('--normal', type=int, default=20, help='Users sending updates at normal pace')
+    parser.add_argument('--updates', type=int, default=10, help='Updates of every normal user')
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--owners', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = {'buckets': buckets_memory(args.users)}
+    report['flood_without_admission'] = await flood(args, None)
+    admission = Admission()
+    report['flood_with_admission'] = await flood(args, admission)
+    report['flood_with_admission']['rejected'] = admission.rejected
+    report['pending'] = pending_check(args.rows, args.owners, 20_000)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Handler latency under concurrent load: synchronous sqlite calls inside
+coroutines (old way) against awaitable Database API
+
+python -m benchmarks.async_db --rows 200000 --concurrency 50
+"""
+import asyncio
+import json
+import random
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+
+from bot.db import Database
+from bot.texts import store_many, text_hash
+
+from ._stats import summary
+
+
+VIEW_QUERY = (
+    "SELECT datetime, body FROM reminds JOIN reminder_texts ON hash = text_hash "
+    "WHERE OWNER=? ORDER BY datetime DESC"
+)
+INSERT_QUERY = "INSERT INTO reminds (datetime, owner, text_hash) VALUES (?, ?, ?)"
+FILL_TEXT = 'x' * 200
+WRITE_TEXT = 'benchmark'
+
+
+def fill(path: Path, rows: int, owners: int) -> None:
+    db = Database(path, readers=0)
+    now = time()
+    with db.cursor(autocommit=True) as cur:
+        fill_hash, _ = store_many(db.db, (FILL_TEXT, WRITE_TEXT))
+        cur.executemany(INSERT_QUERY, (
+            (now + random.random() * 86400 * 365, random.randrange(owners), fill_hash)
+            for _ in range(rows)
+        ))
+    db.unload_instance_normal()
+
+
+async def answer() -> None:
+    """Imitation of network call to Telegram"""
+    await asyncio.sleep(0.001)
+
+
+async def handler_sync(db: Database, owner: int, write: bool) -> None:
+    with db.cursor(autocommit=write) as cur:
+        if write:
+            cur.execute(INSERT_QUERY, (time(), owner, text_hash(WRITE_TEXT)))
+        else:
+            cur.execute(VIEW_QUERY, (owner,)).fetchmany(5)
+    await answer()
+
+
+async def handler_async(db: Database, owner: int, write: bool) -> None:
+    async with db.cursor(autocommit=write) as cur:
+        if write:
+            await cur.execute(INSERT_QUERY, (time(), owner, text_hash(WRITE_TEXT)))
+        else:
+            await cur.fetchmany(VIEW_QUERY, (owner,), 5)
+    await answer()
+
+
+async def ticker(lags: list, stop: asyncio.Event) -> None:
+    """Measures how long event loop was blocked, other updates wait that long"""
+    while not stop.is_set():
+        start = perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(perf_counter() - start - 0.001)
+
+
+async def load(handler, db: Database, args) -> dict:
+    latencies = []
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+
+    async def client() -> None:
+        for _ in range(args.requests):
+            start = perf_counter()
+            await handler(db, random.randrange(args.owners), random.random() < args.writes)
+            latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    result = summary(latencies, perf_counter() - start)
+    stop.set()
+    await tick
+    result['loop_lag_p99_ms'] = summary(lags, 1)['p99_ms']
+    return result
+
+
+async def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--owners', type=int, default=2_000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--writes', type=float, default=0.1, help='Share of writing handlers')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as folder:
+        path = Path(folder) / 'reminds.db'
+        fill(path, args.rows, args.owners)
+        results = {}
+        for name, handler in (('sync', handler_sync), ('async', handler_async)):
+            db = Database(path)
+            results[name] = await load(handler, db, args)
+            await db.unload_instance()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Date parser: throughput of parse_many on generated expressions, against
+string slicing of 'ДД.ММ.ГГ ЧЧ:ММ' used before, and fuzzing with mutations
+of corpus in data/dates_corpus.txt. Fuzzing fails on any exception, or on
+result which is neither future datetime nor non-empty list of errors
+
+python -m benchmarks.dates --texts 100000 --mutations 200000
+"""
+import json
+import random
+import string
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from time import perf_counter
+
+from bot.dates import WEEK_NAMES, DateError, DateParser
+
+
+CORPUS = Path(__file__).parent / 'data' / 'dates_corpus.txt'
+WEEKDAY_FORMS = (
+    'понедельник', 'вторник', 'среду', 'четверг', 'пятницу', 'субботу', 'воскресенье'
+)
+ALPHABET = string.digits + string.punctuation + ' абвгдеёжзийклмнопрстуфхцчшщъыьэюя\t\n '
+
+
+def sliced(text: str, now: datetime):
+    """Implementation before parser module, without awaited answers"""
+    try:
+        day, month, year = int(text[0:2]), int(text[3:5]), int(text[6:8])
+        hour = text[9:11]
+        if hour:
+            hour, minute = int(hour), int(text[12:15])
+        else:
+            hour, minute = now.hour, now.minute
+        return datetime(year + 2000, month, day, hour, minute, tzinfo=now.tzinfo)
+    except ValueError:
+        return None
+
+
+def generate(kind: str, rng: random.Random, now: datetime) -> str:
+    if kind == 'absolute':
+        date = now + timedelta(minutes=rng.randrange(1, 365 * 24 * 60))
+        return f'{date:%d.%m.%y %H:%M}'
+    if kind == 'relative':
+        return f'через {rng.randint(1, 48)} ' + rng.choice(('минут', 'часа', 'дней', 'недели'))
+    if kind == 'day':
+        return rng.choice(('завтра', 'послезавтра')) + f' в {rng.randrange(24)}'
+    return f'в {rng.choice(WEEKDAY_FORMS)} в {rng.randrange(24)}:{rng.randrange(60):02}'
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    chars = list(text)
+    for _ in range(rng.randint(1, 4)):
+        operation = rng.randrange(4)
+        position = rng.randint(0, len(chars))
+        if operation == 0:
+            chars.insert(position, rng.choice(ALPHABET))
+        elif operation == 1 and chars:
+            del chars[min(position, len(chars) - 1)]
+        elif operation == 2 and chars:
+            chars[min(position, len(chars) - 1)] = rng.choice(ALPHABET)
+        else:
+            # Long runs of digits and repeated parts
+            chars.insert(position, rng.choice(('9' * rng.randint(1, 5000), text, ' через 2 часа')))
+    return ''.join(chars)
+
+
+def valid(result, now: datetime) -> bool:
+    if isinstance(result, datetime):
+        return result.tzinfo is not None and result > now
+    return bool(result) and all(isinstance(error, DateError) for error in result)
+
+
+def fuzz(parser: DateParser, corpus: list, mutations: int, now: datetime, seed: int) -> dict:
+    rng = random.Random(seed)
+    failures = []
+    parsed = 0
+    for _ in range(mutations):
+        text = mutate(rng.choice(corpus), rng)
+        try:
+            result = parser.parse(text, now)
+        except Exception as e:
+            failures.append({'text': text[:200], 'error': repr(e)})
+            continue
+        if not valid(result, now):
+            failures.append({'text': text[:200], 'result': repr(result)})
+        parsed += isinstance(result, datetime)
+    return {'mutations': mutations, 'parsed': parsed, 'failures': failures[:20]}
+
+
+def main() -> None:
+    parser_ = ArgumentParser(description=__doc__)
+    parser_.add_argument('--texts', type=int, default=100_000)
+    parser_.add_argument('--mutations', type=int, default=200_000)
+    parser_.add_argument('--seed', type=int, default=0)
+    args = parser_.parse_args()
+
+    parser = DateParser(WEEK_NAMES)
+    now = datetime.now(timezone(timedelta(hours=3)))
+    rng = random.Random(args.seed)
+    report = {'throughput_per_s': {}}
+    for kind in ('absolute', 'relative', 'day', 'weekday'):
+        texts = [generate(kind, rng, now) for _ in range(args.texts)]
+        start = perf_counter()
+        results = parser.parse_many(texts, now)
+        report['throughput_per_s'][kind] = len(texts) / (perf_counter() - start)
+        assert all(isinstance(result, datetime) for result in results), kind
+        if kind == 'absolute':
+            start = perf_counter()
+            for text in texts:
+                sliced(text, now)
+            report['throughput_per_s']['absolute_sliced'] = len(texts) / (perf_counter() - start)
+
+    corpus = [
+        line.rstrip('\n') for line in CORPUS.read_text(encoding='utf-8').splitlines()
+        if not line.startswith('#')
+    ]
+    corpus_results = parser.parse_many(corpus, now)
+    report['corpus'] = {
+        'texts': len(corpus),
+        'parsed': sum(isinstance(result, datetime) for result in corpus_results),
+        'invalid': [text for text, result in zip(corpus, corpus_results) if not valid(result, now)],
+    }
+    report['fuzz'] = fuzz(parser, corpus, args.mutations, now, args.seed)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Durability profiles: writes per second of concurrent handlers, every one
+committing its write, and latency of readers running at the same time.
+Every profile is measured with commit per handler, with group commit and
+with group commit waiting for more handlers within window. Writes are
+new reminders by Reminder.commit, as handlers create them, and bare
+inserts of autocommit cursor
+
+python -m benchmarks.durability --rows 100000 --writers 50 --readers 20
+"""
+import asyncio
+import json
+import random
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from datetime import datetime, timedelta, timezone
+from time import perf_counter, time
+
+from bot.db import DURABILITY, Database, IdentityMap, Reminder
+from bot.metrics import COMMITS_PER_GROUP
+from bot.settings import Settings
+from bot.texts import store_many, text_hash
+
+from ._stats import summary
+
+
+VIEW_QUERY = (
+    "SELECT datetime, body FROM reminds JOIN reminder_texts ON hash = text_hash "
+    "WHERE owner = ? ORDER BY datetime DESC"
+)
+INSERT_QUERY = "INSERT INTO reminds (datetime, owner, text_hash) VALUES (?, ?, ?)"
+FILL_TEXT = 'x' * 200
+WRITE_TEXT = 'benchmark'
+WRITES = ('reminder', 'insert')
+
+
+class Scheduler:
+    def schedule(self, id_: int, timestamp: float) -> None:
+        pass
+
+
+def fill(path: Path, rows: int, owners: int, durability: str) -> None:
+    db = Database(path, readers=0, durability=durability)
+    now = time()
+    with db.cursor(autocommit=True) as cur:
+        fill_hash, _ = store_many(db.db, (FILL_TEXT, WRITE_TEXT))
+        cur.executemany(INSERT_QUERY, (
+            (now + random.random() * 86400 * 365, random.randrange(owners), fill_hash)
+            for _ in range(rows)
+        ))
+    db.unload_instance_normal()
+
+
+async def write_reminder(db: Database, args) -> None:
+    reminder = await Reminder.new()
+    reminder.owner = random.randrange(args.owners)
+    reminder.datetime = datetime.now(Settings.timezone) + timedelta(days=random.random() * 300)
+    reminder.text = WRITE_TEXT
+    await reminder.commit()
+
+
+async def write_insert(db: Database, args) -> None:
+    async with db.cursor(autocommit=True) as cur:
+        await cur.execute(
+            INSERT_QUERY, (time(), random.randrange(args.owners), text_hash(WRITE_TEXT))
+        )
+
+
+async def run(db: Database, write, args) -> dict:
+    writes, reads = [], []
+    done = asyncio.Event()
+
+    async def writer() -> None:
+        for _ in range(args.writes):
+            start = perf_counter()
+            await write(db, args)
+            writes.append(perf_counter() - start)
+
+    async def reader() -> None:
+        while not done.is_set():
+            start = perf_counter()
+            async with db.cursor() as cur:
+                await cur.fetchmany(VIEW_QUERY, (random.randrange(args.owners),), 5)
+            reads.append(perf_counter() - start)
+
+    groups = COMMITS_PER_GROUP.count()
+    readers = [asyncio.create_task(reader()) for _ in range(args.readers)]
+    start = perf_counter()
+    await asyncio.gather(*(writer() for _ in range(args.writers)))
+    elapsed = perf_counter() - start
+    done.set()
+    await asyncio.gather(*readers)
+    result = {'writes': summary(writes, elapsed), 'reads': summary(reads, elapsed)}
+    if db.group_commit is not None:
+        # Disk is synced once per transaction
+        result['transactions'] = COMMITS_PER_GROUP.count() - groups
+    else:
+        result['transactions'] = len(writes)
+    return result
+
+
+async def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--owners', type=int, default=2_000)
+    parser.add_argument('--writers', type=int, default=50)
+    parser.add_argument('--writes', type=int, default=40, help='Writes of every writer')
+    parser.add_argument('--readers', type=int, default=20)
+    parser.add_argument('--window', type=float, default=0.002)
+    parser.add_argument('--folder', type=Path, help='Folder on disk to measure, temporary by default')
+    args = parser.parse_args()
+
+    Settings.timezone = timezone(timedelta(hours=3))
+    Settings.Scheduler = Scheduler()
+    results = {}
+    with TemporaryDirectory(dir=args.folder) as folder:
+        for write in WRITES:
+            for durability in DURABILITY:
+                for window in (None, 0, args.window):
+                    path = Path(folder) / f'{write}-{durability}-{window}.db'
+                    fill(path, args.rows, args.owners, durability)
+                    db = Settings.Database = Database(path, durability=durability, group_commit=window)
+                    Settings.Reminders = IdentityMap()
+                    results[f'{write}: {durability}, group_commit={window}'] = await run(
+                        db, globals()[f'write_{write}'], args
+                    )
+                    await db.unload_instance()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+"""
+Local stand-in of Telegram Bot API, enough to run the bot without network.
+Bot is pointed to it by TelegramAPIServer.from_base(server.base)
+"""
+import asyncio
+import json
+from time import perf_counter, time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import ClientSession, web
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class FakeBotAPI:
+    """
+    Serves getUpdates and webhook delivery of injected updates
+    and records every message sent by bot
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.sent: List[Tuple[int, str, float]] = []
+        self.waiters: Dict[int, asyncio.Future] = {}
+        self._update_id = 0
+        self._message_id = 0
+        self._pending: List[dict] = []
+        self._arrived = asyncio.Event()
+        self._webhook: Optional[Tuple[str, str]] = None
+        self._connections: Optional[asyncio.Semaphore] = None
+        self._client: Optional[ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._pushes: set = set()
+        # Set when bot starts to poll or registers webhook
+        self.ready = asyncio.Event()
+
+    @property
+    def base(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._client = ClientSession()
+
+    async def stop(self) -> None:
+        for task in self._pushes:
+            task.cancel()
+        await self._client.close()
+        await self._runner.cleanup()
+
+    def _next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    def inject(self, chat_id: int, text: str) -> asyncio.Future:
+        """Sends text from user to bot. Future is resolved by the next message to this chat"""
+        self._update_id += 1
+        message = {
+            'message_id': self._next_message_id(),
+            'date': int(time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'},
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [
+                {'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}
+            ]
+        update = {'update_id': self._update_id, 'message': message}
+        future = self.waiters[chat_id] = asyncio.get_running_loop().create_future()
+        if self._webhook is None:
+            self._pending.append(update)
+            self._arrived.set()
+        else:
+            task = asyncio.create_task(self._push(update))
+            self._pushes.add(task)
+            task.add_done_callback(self._pushes.discard)
+        return future
+
+    async def _push(self, update: dict) -> None:
+        url, secret = self._webhook
+        async with self._connections:
+            async with self._client.post(url, json=update, headers={SECRET_HEADER: secret}) as response:
+                response.raise_for_status()
+
+    async def _get_updates(self, offset: int, timeout: float) -> List[dict]:
+        self._pending = [update for update in self._pending if update['update_id'] >= offset]
+        if not self._pending:
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._pending[:100]
+
+    def _message(self, chat_id: int, text: str) -> dict:
+        self.sent.append((chat_id, text, perf_counter()))
+        waiter = self.waiters.pop(chat_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(perf_counter())
+        return {
+            'message_id': self._next_message_id(),
+            'date': int(time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': text,
+        }
+
+    @staticmethod
+    def _error(description: str) -> web.Response:
+        return web.json_response(
+            {'ok': False, 'error_code': 400, 'description': f'Bad Request: {description}'},
+            status=400, dumps=json.dumps,
+        )
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        try:
+            return await self._call(request)
+        except json.JSONDecodeError:
+            return self._error("can't parse JSON")
+        except (KeyError, TypeError, ValueError) as e:
+            # Missing or malformed parameter, as Telegram answers it
+            return self._error(repr(e))
+
+    async def _call(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        # Bot API takes parameters both as JSON and as form
+        if request.content_type == 'application/json':
+            params: Dict[str, Any] = await request.json()
+            if not isinstance(params, dict):
+                raise TypeError('parameters should be object')
+        else:
+            params = dict(await request.post())
+        result: Any = True
+        if method in ('getupdates', 'setwebhook'):
+            self.ready.set()
+        if method == 'getme':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        elif method == 'getupdates':
+            result = await self._get_updates(
+                int(params.get('offset', 0)), float(params.get('timeout', 0))
+            )
+        elif method == 'setwebhook':
+            self._webhook = (params['url'], params.get('secret_token', ''))
+            self._connections = asyncio.Semaphore(int(params.get('max_connections', 40)))
+        elif method == 'deletewebhook':
+            self._webhook = None
+        elif method in ('sendmessage', 'editmessagetext'):
+            result = self._message(int(params['chat_id']), params['text'])
+        return web.json_response({'ok': True, 'result': result}, dumps=json.dumps)
@@ -0,0 +1,93 @@
+"""
+Lesson name matching: linear SequenceMatcher scan against trigram index
+
+python -m benchmarks.find_pair --sizes 10 1000 50000
+"""
+import json
+import random
+from argparse import ArgumentParser
+from difflib import SequenceMatcher
+from time import perf_counter
+
+from bot.matching import PairMatcher
+
+
+WORDS = (
+    'теория вероятностей математика статистика проектирование баз данных '
+    'принятия решений иностранный язык английский технология разработки '
+    'программных приложений многоагентное моделирование физическая культура '
+    'спорт лекция практика анализ алгоритмы сети операционные системы '
+    'экономика философия история физика химия биология механика графика'
+).split()
+
+
+def generate(aliases: int) -> dict:
+    random.seed(aliases)
+    pairs = {}
+    for number in range(0, aliases, 3):
+        name = ' '.join(random.sample(WORDS, random.randint(2, 4)))
+        short = ''.join(word[0] for word in name.split())
+        pairs[(name, short, f'{name} лк')[:aliases - number]] = number
+    return pairs
+
+
+def linear(pairs: dict, string: str) -> tuple:
+    """Implementation before trigram index"""
+    output = (0, None, '')
+    for strings, value in pairs.items():
+        for expecting_string in strings:
+            ratio = SequenceMatcher(None, string, expecting_string).quick_ratio()
+            if ratio > output[0]:
+                output = (ratio, value, expecting_string)
+    return output
+
+
+def queries(pairs: dict, amount: int) -> list:
+    aliases = [alias for strings in pairs for alias in strings]
+    output = []
+    for _ in range(amount):
+        alias = list(random.choice(aliases))
+        # Typos: dropped and swapped characters
+        if len(alias) > 3:
+            del alias[random.randrange(len(alias))]
+            i = random.randrange(len(alias) - 1)
+            alias[i], alias[i+1] = alias[i+1], alias[i]
+        output.append(''.join(alias))
+    return output
+
+
+def measure(func, strings: list) -> tuple:
+    start = perf_counter()
+    results = [func(string) for string in strings]
+    return len(strings) / (perf_counter() - start), results
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 50000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    report = {}
+    for size in args.sizes:
+        pairs = generate(size)
+        strings = queries(pairs, args.queries)
+        start = perf_counter()
+        matcher = PairMatcher(pairs)
+        build = perf_counter() - start
+        linear_qps, expected = measure(lambda string: linear(pairs, string), strings)
+        # Cache is bypassed, every query is scored
+        index_qps, found = measure(matcher._find, strings)
+        report[size] = {
+            'build_ms': build * 1000,
+            'linear_qps': linear_qps,
+            'index_qps': index_qps,
+            'same_ratio': sum(
+                a[0] == b[0] for a, b in zip(expected, found)
+            ) / len(strings),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
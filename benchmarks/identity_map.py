@@ -0,0 +1,96 @@
+"""
+Reminder objects: loading by rowid one query per object, as before
+identity map, against shared loaded objects and batched loading. Changing
+one field of many reminders by full-row commit of each against unit of
+work, which writes only changed columns in one transaction
+
+python -m benchmarks.identity_map --rows 100000 --lookups 20000 --changes 2000
+"""
+import asyncio
+import json
+import random
+from argparse import ArgumentParser
+from datetime import timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+
+from bot.db import Database, IdentityMap, Reminder, UnitOfWork
+from bot.settings import Settings
+from bot.texts import store
+
+
+class Scheduler:
+    def schedule(self, id_: int, timestamp: float) -> None:
+        pass
+
+
+def fill(path: Path, rows: int) -> None:
+    db = Database(path, readers=0)
+    now = time()
+    with db.cursor(autocommit=True) as cur:
+        hash_ = store(db.db, 'x' * 200)
+        cur.executemany(
+            "INSERT INTO reminds (datetime, owner, text_hash) VALUES (?, ?, ?)",
+            ((now + 86400 + i, i, hash_) for i in range(rows))
+        )
+    db.unload_instance_normal()
+
+
+def hot_ids(rng: random.Random, rows: int, count: int) -> list:
+    """Most lookups are of few reminders, as handlers show the same pages"""
+    return [min(int(rng.paretovariate(1.2)), rows) for _ in range(count)]
+
+
+async def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=20_000)
+    parser.add_argument('--changes', type=int, default=2_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    Settings.timezone = timezone(timedelta(hours=3))
+    Settings.Scheduler = Scheduler()
+    report = {}
+    with TemporaryDirectory() as folder:
+        path = Path(folder) / 'reminds.db'
+        fill(path, args.rows)
+        Settings.Database = Database(path)
+        ids = hot_ids(rng, args.rows, args.lookups)
+
+        start = perf_counter()
+        for id_ in ids:
+            await Reminder(id_).load()
+        report['load_per_object_us'] = (perf_counter() - start) / len(ids) * 1e6
+        Settings.Reminders = IdentityMap()
+        start = perf_counter()
+        for id_ in ids:
+            await Reminder.by_id(id_)
+        report['identity_map_us'] = (perf_counter() - start) / len(ids) * 1e6
+        report['identity_map_size'] = len(Settings.Reminders)
+        Settings.Reminders = IdentityMap()
+        start = perf_counter()
+        for index in range(0, len(ids), 50):
+            await Reminder.by_ids(ids[index:index + 50])
+        report['batched_by_50_us'] = (perf_counter() - start) / len(ids) * 1e6
+
+        changed = rng.sample(range(1, args.rows + 1), args.changes)
+        start = perf_counter()
+        for id_ in changed[:args.changes // 2]:
+            reminder = await Reminder.by_id(id_)
+            reminder.datetime += timedelta(minutes=1)
+            await reminder.commit()
+        report['full_row_commit_us'] = (perf_counter() - start) / (args.changes // 2) * 1e6
+        start = perf_counter()
+        async with UnitOfWork() as uow:
+            for reminder in (await Reminder.by_ids(changed[args.changes // 2:])).values():
+                uow.add(reminder).datetime += timedelta(minutes=1)
+        report['unit_of_work_us'] = (perf_counter() - start) / (args.changes - args.changes // 2) * 1e6
+        await Settings.Database.unload_instance()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
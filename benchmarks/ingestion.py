@@ -0,0 +1,135 @@
+"""
+Update ingestion: long polling against webhook mode, both served by local
+fake Bot API. Fake API and virtual users run in separate process, every
+user sends /start and waits for the answer
+
+python -m benchmarks.ingestion --users 200 --messages 10
+"""
+import asyncio
+import json
+import logging
+from argparse import ArgumentParser
+from datetime import timedelta, timezone
+from multiprocessing import Process, Queue
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from bot.settings import Settings
+from bot.db import Database
+from bot.fsm_storage import SQLiteStorage
+from bot.webhook import Webhook
+
+from ._stats import summary
+from .fake_api import FakeBotAPI
+
+
+TOKEN = '123456:fake-token-for-local-api'
+MODES = ('polling', 'webhook')
+
+
+async def load(api: FakeBotAPI, users: int, messages: int) -> dict:
+    latencies = []
+
+    async def user(chat_id: int) -> None:
+        for _ in range(messages):
+            start = perf_counter()
+            answered = await asyncio.wait_for(api.inject(chat_id, '/start'), 30)
+            latencies.append(answered - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(user(chat_id) for chat_id in range(1, users + 1)))
+    return summary(latencies, perf_counter() - start)
+
+
+async def users_process(port: int, users: int, messages: int, results: Queue) -> None:
+    api = FakeBotAPI(port=port)
+    await api.start()
+    try:
+        await asyncio.wait_for(api.ready.wait(), 30)
+        results.put(await load(api, users, messages))
+    finally:
+        await api.stop()
+
+
+def _users_main(*args) -> None:
+    asyncio.run(users_process(*args))
+
+
+def start_users(port: int, args) -> tuple:
+    results = Queue()
+    process = Process(
+        target=_users_main,
+        args=(port, args.users, args.messages, results),
+        daemon=True,
+    )
+    process.start()
+    return process, results
+
+
+async def run_mode(mode: str, args) -> dict:
+    process, results = start_users(args.api_port, args)
+    bot = Bot(TOKEN, session=AiohttpSession(
+        api=TelegramAPIServer.from_base(f'http://127.0.0.1:{args.api_port}')
+    ))
+    dispatcher: Dispatcher = Settings.Dispatcher
+    if mode == 'webhook':
+        webhook = Webhook(
+            f'http://127.0.0.1:{args.webhook_port}/webhook',
+            port=args.webhook_port,
+            workers=args.workers,
+        )
+        serving = asyncio.create_task(webhook.run(bot, dispatcher))
+    else:
+        webhook = None
+        serving = asyncio.create_task(dispatcher.start_polling(
+            bot, polling_timeout=1, handle_signals=False
+        ))
+    # Fake API server may be not listening yet
+    await asyncio.sleep(0.5)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, results.get)
+    finally:
+        if webhook is not None:
+            webhook.stop()
+        else:
+            await dispatcher.stop_polling()
+        await serving
+        process.join()
+
+
+async def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=10, help='Messages of every user')
+    parser.add_argument('--workers', type=int, default=32, help='Webhook workers')
+    parser.add_argument('--api-port', type=int, default=8088)
+    parser.add_argument('--webhook-port', type=int, default=8089)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    Settings.loop = asyncio.get_running_loop()
+    Settings.timezone = timezone(timedelta(hours=3), name='MSK')
+    report = {}
+    with TemporaryDirectory() as temporary:
+        Settings.Database = Database(Path(temporary) / 'reminds.db')
+        storage = SQLiteStorage(Settings.Database)
+        Settings.Dispatcher = Dispatcher(storage=storage)
+        from bot import reminders_cycle, states_functions
+        storage.start()
+        try:
+            for mode in args.modes:
+                report[mode] = await run_mode(mode, args)
+        finally:
+            await storage.close()
+            await Settings.Database.unload_instance()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
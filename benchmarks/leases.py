@@ -0,0 +1,117 @@
+"""
+Several dispatcher processes sharing one SQLite file. Checks that every
+due reminder is delivered exactly once, and that reminders leased by
+crashed process are reclaimed after lease expiry
+
+python -m benchmarks.leases --rows 20000 --processes 4
+"""
+import asyncio
+import json
+from argparse import ArgumentParser
+from multiprocessing import Process, Queue
+from queue import Empty
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+
+from bot.db import Database
+from bot.leases import SQLiteLeaseBackend
+from bot.texts import store
+
+
+def fill(path: Path, rows: int) -> None:
+    db = Database(path, readers=0)
+    now = time()
+    with db.cursor(autocommit=True) as cur:
+        hash_ = store(db.db, 'x')
+        cur.executemany(
+            "INSERT INTO reminds (datetime, owner, text_hash) VALUES (?, ?, ?)",
+            ((now - i, i, hash_) for i in range(rows))
+        )
+    db.unload_instance_normal()
+
+
+async def dispatch(path: Path, worker_id: str, ttl: float, crash: bool, results: Queue) -> None:
+    db = Database(path, readers=0)
+    leases = SQLiteLeaseBackend(db, worker_id=worker_id, ttl=ttl)
+    delivered = []
+    idle_since = None
+    while True:
+        batch = await leases.claim(time(), 50)
+        if crash:
+            # Process dies holding leases
+            break
+        if not batch:
+            # Waiting for leases of crashed process to expire
+            idle_since = idle_since or time()
+            if time() - idle_since > ttl * 2:
+                break
+            await asyncio.sleep(ttl / 10)
+            continue
+        idle_since = None
+        for id_, *_ in batch:
+            await leases.complete(id_)
+            delivered.append(id_)
+    await db.unload_instance()
+    results.put(delivered)
+
+
+def worker(path: Path, worker_id: str, ttl: float, crash: bool, results: Queue) -> None:
+    asyncio.run(dispatch(path, worker_id, ttl, crash, results))
+
+
+def collect(processes: list, results: Queue) -> list:
+    """Results of every process. Crashed process fails the run, rather than hangs it"""
+    delivered = []
+    while len(delivered) < len(processes):
+        try:
+            delivered.append(results.get(timeout=1))
+        except Empty:
+            failed = [process for process in processes if process.exitcode not in (None, 0)]
+            if failed:
+                for process in processes:
+                    process.terminate()
+                raise SystemExit(f'Worker {failed[0].name} exited with code {failed[0].exitcode}')
+    return delivered
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--ttl', type=float, default=3.0, help='Leases shorter than batch processing time produce duplicates')
+    parser.add_argument('--no-crash', action='store_true', help="Don't simulate crashed dispatcher")
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as folder:
+        path = Path(folder) / 'reminds.db'
+        fill(path, args.rows)
+        results = Queue()
+        processes = [
+            Process(target=worker, args=(
+                path, f'worker-{number}', args.ttl,
+                number == 0 and not args.no_crash, results
+            ))
+            for number in range(args.processes)
+        ]
+        start = perf_counter()
+        for process in processes:
+            process.start()
+        delivered = collect(processes, results)
+        elapsed = perf_counter() - start
+        for process in processes:
+            process.join()
+
+    ids = [id_ for part in delivered for id_ in part]
+    print(json.dumps({
+        'rows': args.rows,
+        'delivered': len(set(ids)),
+        'duplicates': len(ids) - len(set(ids)),
+        'per_process': [len(part) for part in delivered],
+        'seconds': elapsed,
+        'throughput': len(ids) / elapsed,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Scheduler index: heap of (datetime, rowid) tuples against hourly buckets
+of arrays. Memory of index, schedule and pop_due timings
+
+python -m benchmarks.scheduler --sizes 100000 1000000 5000000
+"""
+import json
+import random
+import sys
+from argparse import ArgumentParser
+from heapq import heapify, heappop, heappush
+from time import perf_counter, time
+
+from bot.reminders_cycle import Scheduler
+
+
+class HeapIndex:
+    """Implementation before compact index"""
+
+    def __init__(self):
+        self.heap = []
+
+    def schedule(self, id_: int, timestamp: float) -> None:
+        heappush(self.heap, (timestamp, id_))
+
+    def pop_due(self, timestamp: float) -> list:
+        due = []
+        while self.heap and self.heap[0][0] <= timestamp:
+            due.append(heappop(self.heap)[1])
+        return due
+
+
+def build(factory, timestamps: list):
+    index = factory()
+    if isinstance(index, HeapIndex):
+        index.heap = [(timestamp, id_) for id_, timestamp in enumerate(timestamps)]
+        heapify(index.heap)
+    else:
+        for id_, timestamp in enumerate(timestamps):
+            index._add(id_, timestamp)
+    return index
+
+
+def size_of(index) -> int:
+    if isinstance(index, HeapIndex):
+        return sys.getsizeof(index.heap) + sum(
+            sys.getsizeof(item) + sys.getsizeof(item[0]) + sys.getsizeof(item[1])
+            for item in index.heap
+        )
+    return sys.getsizeof(index._keys) + sys.getsizeof(index._buckets) + sum(
+        sys.getsizeof(bucket) + sys.getsizeof(bucket[0]) + sys.getsizeof(bucket[1])
+        for bucket in index._buckets.values()
+    )
+
+
+def measure(factory, timestamps: list, operations: int) -> dict:
+    start = perf_counter()
+    index = build(factory, timestamps)
+    built = perf_counter() - start
+    memory = size_of(index)
+
+    now = time()
+    random.seed(operations)
+    start = perf_counter()
+    for id_ in range(operations):
+        index.schedule(len(timestamps) + id_, now + random.random() * 365 * 86400)
+    scheduled = perf_counter() - start
+    # Every pop is one scheduler wakeup, a minute later than previous
+    start = perf_counter()
+    popped = sum(len(index.pop_due(now + minute * 60)) for minute in range(operations))
+    pops = perf_counter() - start
+    return {
+        'memory_mb': memory / 2 ** 20,
+        'bytes_per_reminder': memory / len(timestamps),
+        'build_s': built,
+        'schedule_us': scheduled / operations * 1e6,
+        'pop_due_us': pops / operations * 1e6,
+        'popped': popped,
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--operations', type=int, default=10_000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    report = {}
+    for size in args.sizes:
+        now = time()
+        timestamps = [now + random.random() * 365 * 86400 for _ in range(size)]
+        report[size] = {
+            'heap': measure(HeapIndex, timestamps, args.operations),
+            'buckets': measure(Scheduler, timestamps, args.operations),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Startup: import time of modules, time from process start to first handled
+update, and time to deliver reminders missed during downtime, with and
+without merging them per user. Bot runs in subprocess against fake Bot API
+
+python -m benchmarks.startup --rows 20000 --owners 100 --due 0.01
+"""
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+from argparse import SUPPRESS, ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+
+
+TOKEN = '123456:fake-token-for-local-api'
+SOURCE = Path(__file__).parent.parent / 'src'
+
+
+def _environment() -> dict:
+    return {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, (
+        str(SOURCE), str(SOURCE.parent), os.environ.get('PYTHONPATH')
+    )))}
+
+
+def import_times(top: int = 10) -> dict:
+    """Parses `python -X importtime` of bot package"""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import bot'],
+        capture_output=True, text=True, check=True, env=_environment(),
+    ).stderr
+    modules = []
+    for line in output.splitlines()[1:]:
+        _, own, cumulative, name = line.replace(':', '|', 1).split('|')
+        # Nested imports are indented by two spaces
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), depth, int(cumulative) / 1000))
+    packages = sorted(
+        (module for module in modules if '.' not in module[0]), key=lambda module: -module[2]
+    )
+    return {
+        'total_ms': sum(cumulative for _, depth, cumulative in modules if depth == 0),
+        # Cumulative, so package includes packages it imports
+        'packages_ms': {name: cumulative for name, _, cumulative in packages[:top]},
+        'own_modules_ms': {
+            name: cumulative for name, _, cumulative in modules if name.startswith('bot')
+        },
+    }
+
+
+async def child(database: str, port: int, merge_missed: bool) -> None:
+    """Runs bot until first update is handled and missed reminders are sent"""
+    import bot
+    from aiogram.client.telegram import TelegramAPIServer
+    from bot.main import main
+    from bot.settings import Settings
+
+    Settings.loop = asyncio.get_running_loop()
+    running = asyncio.create_task(main(
+        TOKEN,
+        merge_missed=merge_missed,
+        database=Path(database),
+        api=TelegramAPIServer.from_base(f'http://127.0.0.1:{port}'),
+    ))
+    while not {'first_update', 'drained'} <= Settings.Startup.phases.keys():
+        await asyncio.sleep(0.05)
+    print(json.dumps(Settings.Startup.phases))
+    await Settings.Dispatcher.stop_polling()
+    await running
+
+
+async def measure(database: Path, merge_missed: bool) -> dict:
+    from .fake_api import FakeBotAPI
+
+    api = FakeBotAPI()
+    await api.start()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, '-m', 'benchmarks.startup', '--child', str(database),
+        str(api.port), str(int(merge_missed)),
+        stdout=subprocess.PIPE, env=_environment(),
+    )
+    await api.ready.wait()
+    # User writes to bot as soon as it starts to poll
+    api.inject(10 ** 9, '/start')
+    stdout, _ = await process.communicate()
+    await api.stop()
+    phases = json.loads(stdout.decode().strip().splitlines()[-1])
+    return {
+        'phases_s': phases,
+        'messages': sum(text.startswith(('Пропущенное', 'Пока бот')) for _, text, _ in api.sent),
+    }
+
+
+async def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--owners', type=int, default=100)
+    parser.add_argument('--due', type=float, default=0.01, help='Share of missed reminders')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--child', nargs=3, help=SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        database, port, merge_missed = args.child
+        await child(database, int(port), merge_missed == '1')
+        return
+
+    # Child process doesn't import anything heavy before bot package
+    from .suite.synthetic import generate
+
+    report = {'imports': import_times()}
+    with TemporaryDirectory() as temporary:
+        source = Path(temporary) / 'source.db'
+        generate(source, args.rows, args.owners, args.due, args.seed)
+        for merge_missed in (False, True):
+            database = Path(temporary) / f'reminds_{merge_missed}.db'
+            shutil.copy(source, database)
+            name = 'merged' if merge_missed else 'separate'
+            report[name] = await measure(database, merge_missed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""
+Storage layout: reminders with inline text against scheduling columns with
+compressed, deduplicated texts in separate table. Database is built in old
+layout, measured, migrated and measured again
+
+python -m benchmarks.storage --rows 1000000 --owners 10000 --duplicates 0.3
+"""
+import json
+import random
+import sqlite3
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+
+from bot.migrations import MIGRATIONS, migrate
+
+from ._stats import summary
+
+
+# Texts are made of words, so they compress like real ones
+WORDS = (
+    'пара лекция семинар сдать отчёт купить молоко позвонить маме встреча '
+    'в 10:00 завтра не забыть лабораторная работа дедлайн по матанализу '
+    'проверить почту оплатить интернет тренировка записаться к врачу'
+).split()
+CHUNK = 100_000
+
+SCAN_QUERY = "SELECT datetime, rowid FROM reminds WHERE (datetime, rowid) > (?, -1) LIMIT 50000"
+# Any query, which can't be answered by index, reads whole table
+TABLE_QUERY = "SELECT count(*) FROM reminds NOT INDEXED WHERE lease_owner IS NOT NULL"
+DUE_QUERY = (
+    "SELECT rowid FROM reminds WHERE datetime <= ? "
+    "AND (lease_expiry IS NULL OR lease_expiry < ?) ORDER BY datetime LIMIT 100"
+)
+PAGE_QUERY = {
+    'inline': (
+        "SELECT datetime, rowid, text FROM reminds WHERE owner = ? "
+        "ORDER BY datetime DESC, rowid DESC LIMIT 6"
+    ),
+    'split': (
+        "SELECT datetime, reminds.rowid, body FROM reminds "
+        "JOIN reminder_texts ON hash = text_hash WHERE owner = ? "
+        "ORDER BY datetime DESC, reminds.rowid DESC LIMIT 6"
+    ),
+}
+
+
+def build(path: Path, rows: int, owners: int, duplicates: float, seed: int) -> None:
+    """Database in layout before split, with inline texts"""
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path, isolation_level=None)
+    cur = connection.cursor()
+    for version, step in enumerate(MIGRATIONS[:6], start=1):
+        cur.execute('BEGIN')
+        step(cur)
+        cur.execute(f'PRAGMA user_version = {version}')
+        cur.execute('COMMIT')
+    common = [' '.join(rng.choices(WORDS, k=rng.randint(2, 6))) for _ in range(50)]
+    now = time()
+    for start in range(0, rows, CHUNK):
+        cur.execute('BEGIN')
+        cur.executemany(
+            "INSERT OR IGNORE INTO reminds (datetime, owner, text) VALUES (?, ?, ?)",
+            [(
+                now + rng.random() * 365 * 86400,
+                rng.randrange(owners),
+                rng.choice(common) if rng.random() < duplicates
+                else ' '.join(rng.choices(WORDS, k=rng.randint(3, 60))),
+            ) for _ in range(min(CHUNK, rows - start))]
+        )
+        cur.execute('COMMIT')
+    connection.close()
+
+
+def measure(path: Path, layout: str, owners: int, operations: int) -> dict:
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute('VACUUM')
+    size = path.stat().st_size
+    # Pages are read from disk cache, as on running bot
+    connection.execute('PRAGMA cache_size = -2000')
+    now = time()
+
+    start = perf_counter()
+    key, total = float('-inf'), 0
+    while True:
+        chunk = connection.execute(SCAN_QUERY, (key,)).fetchall()
+        total += len(chunk)
+        if len(chunk) < 50000:
+            break
+        key = chunk[-1][0]
+    scan = perf_counter() - start
+    start = perf_counter()
+    connection.execute(TABLE_QUERY).fetchall()
+    table_scan = perf_counter() - start
+
+    rng = random.Random(operations)
+    pages, due = [], []
+    for _ in range(operations):
+        owner = rng.randrange(owners)
+        start = perf_counter()
+        connection.execute(PAGE_QUERY[layout], (owner,)).fetchall()
+        pages.append(perf_counter() - start)
+        timestamp = now + rng.random() * 365 * 86400
+        start = perf_counter()
+        connection.execute(DUE_QUERY, (timestamp, timestamp)).fetchall()
+        due.append(perf_counter() - start)
+    connection.close()
+    return {
+        'db_mb': size / 2 ** 20,
+        'bytes_per_reminder': size / total,
+        'scheduler_load_s': scan,
+        'table_scan_s': table_scan,
+        'owner_page': summary(pages, sum(pages)),
+        'due_lookup': summary(due, sum(due)),
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--owners', type=int, default=10_000)
+    parser.add_argument('--duplicates', type=float, default=0.3,
+                        help='Share of reminders with one of few common texts')
+    parser.add_argument('--operations', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    report = {'arguments': vars(args)}
+    with TemporaryDirectory() as temporary:
+        path = Path(temporary) / 'reminds.db'
+        build(path, args.rows, args.owners, args.duplicates, args.seed)
+        report['inline'] = measure(path, 'inline', args.owners, args.operations)
+        connection = sqlite3.connect(path)
+        start = perf_counter()
+        migrate(connection)
+        report['migration_s'] = perf_counter() - start
+        connection.close()
+        report['split'] = measure(path, 'split', args.owners, args.operations)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
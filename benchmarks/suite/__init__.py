@@ -0,0 +1,7 @@
+"""
+Synthetic-load benchmarks of create, browse and delivery paths.
+Real handlers are driven through fake Bot and Message objects, no network
+is used. Results are saved as JSON to compare between commits:
+
+python -m benchmarks.suite --rows 10000 1000000 --output results.json
+"""
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+from argparse import ArgumentParser, BooleanOptionalAction
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from aiogram import Dispatcher
+
+from bot.settings import Settings
+from bot.db import Database, Reminder
+from bot.delivery import Sender
+from bot.leases import SQLiteLeaseBackend
+from bot.main import user_notify
+
+from .._stats import summary
+from . import __doc__ as description
+from .fakes import FakeBot, FakeCallbackQuery, FakeMessage, FakeState
+from .synthetic import generate
+
+
+def setup() -> None:
+    """Registers handlers on dispatcher, as main.main does"""
+    Settings.loop = asyncio.get_running_loop()
+    Settings.timezone = timezone(timedelta(hours=3), name='MSK')
+    Settings.Dispatcher = Dispatcher()
+    from bot import reminders_cycle, states_functions
+
+
+def future_date(rng: random.Random) -> datetime:
+    return (
+        datetime.now(Settings.timezone)
+        + timedelta(minutes=rng.randrange(1, 360 * 24 * 60))
+    ).replace(second=0, microsecond=0)
+
+
+async def timed(operations: int, func) -> dict:
+    latencies = []
+    start = perf_counter()
+    for number in range(operations):
+        begin = perf_counter()
+        await func(number)
+        latencies.append(perf_counter() - begin)
+    return summary(latencies, perf_counter() - start)
+
+
+async def bench_create(args, rng: random.Random) -> dict:
+    from bot.states_functions.reminder_creating import text_date
+
+    async def create(_) -> None:
+        message = FakeMessage(rng.randrange(args.owners), 'Синтетическое напоминание')
+        await text_date(message, FakeState({'date': future_date(rng)}))
+    return await timed(args.operations, create)
+
+
+async def bench_commit(args, rng: random.Random) -> dict:
+    async def commit(_) -> None:
+        reminder = await Reminder.new()
+        reminder.owner = rng.randrange(args.owners)
+        reminder.datetime = future_date(rng)
+        reminder.text = 'Синтетическое напоминание'
+        try:
+            await reminder.commit()
+        except ValueError:
+            # Owner already has reminder at this minute
+            pass
+    return await timed(args.operations, commit)
+
+
+async def bench_browse(args, rng: random.Random) -> dict:
+    from bot.states_functions.reminder_viewing import (
+        PageCallback,
+        page_cache,
+        view_reminders,
+        view_reminders_page,
+    )
+
+    async def browse(number: int) -> None:
+        owner = rng.randrange(args.owners)
+        await view_reminders(FakeMessage(owner), FakeState())
+        # Every second user opens next pages too
+        if number % 2:
+            return
+        async with Settings.Database.cursor() as cur:
+            row = await cur.fetchone(
+                "SELECT datetime, rowid FROM reminds WHERE owner = ? "
+                "ORDER BY datetime DESC, rowid DESC LIMIT 1 OFFSET 4",
+                (owner,)
+            )
+        if row is not None:
+            callback = PageCallback(direction='next', datetime=row[0], rowid=row[1])
+            await view_reminders_page(FakeCallbackQuery(owner), callback)
+    page_cache._owners.clear()
+    return await timed(args.operations, browse)
+
+
+async def bench_delivery(args, bot: FakeBot) -> dict:
+    bot.sent.clear()
+    start = perf_counter()
+    await user_notify()
+    await Settings.Sender.queue.join()
+    elapsed = perf_counter() - start
+    # Latency is time from start of tick to delivery of every message
+    return summary([moment - start for *_, moment in bot.sent], elapsed)
+
+
+PATHS = ('create', 'commit', 'browse', 'delivery')
+
+
+async def run_size(path: Path, rows: int, args) -> dict:
+    rng = random.Random(args.seed)
+    start = perf_counter()
+    generate(path, rows, args.owners, args.due, args.seed)
+    generated = perf_counter() - start
+
+    Settings.Database = Database(path)
+    Settings.Leases = SQLiteLeaseBackend(Settings.Database)
+    bot = FakeBot()
+    Settings.Sender = Sender(bot, global_rate=1e9, chat_rate=1e9, coalesce=args.coalesce)
+    Settings.Sender.start()
+    results = {'generate_seconds': generated}
+    try:
+        for name in args.paths:
+            if name == 'create':
+                results[name] = await bench_create(args, rng)
+            elif name == 'commit':
+                results[name] = await bench_commit(args, rng)
+            elif name == 'browse':
+                results[name] = await bench_browse(args, rng)
+            elif name == 'delivery':
+                results[name] = await bench_delivery(args, bot)
+    finally:
+        Settings.Sender.stop()
+        await Settings.Database.unload_instance()
+    results['db_bytes'] = path.stat().st_size
+    return results
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+        'arguments': vars(args),
+    }
+
+
+async def main() -> None:
+    parser = ArgumentParser(description=description)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000])
+    parser.add_argument('--owners', type=int, default=10_000)
+    parser.add_argument('--due', type=float, default=0.001, help='Share of already due reminders')
+    parser.add_argument('--operations', type=int, default=1000, help='Operations per path')
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=list(PATHS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--coalesce', action=BooleanOptionalAction, default=True,
+                        help='Merge due reminders of one user into one message')
+    parser.add_argument('--output', type=Path, help='JSON file for results')
+    parser.add_argument('--folder', type=Path, help='Where to keep generated databases')
+    args = parser.parse_args()
+
+    setup()
+    report = {'meta': metadata(args), 'results': {}}
+    with TemporaryDirectory() as temporary:
+        folder = args.folder or Path(temporary)
+        for rows in args.rows:
+            path = folder / f'reminds_{rows}.db'
+            path.unlink(missing_ok=True)
+            report['results'][rows] = await run_size(path, rows, args)
+    text = json.dumps(report, indent=2, default=str)
+    if args.output is not None:
+        args.output.write_text(text)
+    print(text)
+
+
+asyncio.run(main())
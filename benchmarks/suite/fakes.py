@@ -0,0 +1,71 @@
+"""
+Minimal stand-ins of aiogram objects, used by handlers
+"""
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+
+class FakeBot:
+    __slots__ = ('sent',)
+
+    def __init__(self):
+        # (chat_id, text, perf_counter moment)
+        self.sent: List[tuple] = []
+
+    async def send_message(self, chat_id: int, text: str, **_) -> None:
+        self.sent.append((chat_id, text, perf_counter()))
+
+
+class FakeUser:
+    __slots__ = ('id', 'language_code')
+
+    def __init__(self, id_: int):
+        self.id = id_
+        self.language_code = 'ru'
+
+
+class FakeMessage:
+    __slots__ = ('text', 'from_user', 'answers')
+
+    def __init__(self, user_id: int, text: str = ''):
+        self.text = text
+        self.from_user = FakeUser(user_id)
+        self.answers: List[str] = []
+
+    async def answer(self, text: str, *_, **__) -> None:
+        self.answers.append(text)
+
+    async def edit_text(self, text: str, **_) -> None:
+        self.answers.append(text)
+
+
+class FakeCallbackQuery:
+    __slots__ = ('from_user', 'message')
+
+    def __init__(self, user_id: int):
+        self.from_user = FakeUser(user_id)
+        self.message = FakeMessage(user_id)
+
+    async def answer(self, *_, **__) -> None:
+        pass
+
+
+class FakeState:
+    """Replaces FSMContext of one chat"""
+    __slots__ = ('state', 'data')
+
+    def __init__(self, data: Dict[str, Any] = None):
+        self.state: Optional[str] = None
+        self.data = {} if data is None else data
+
+    async def get_state(self) -> Optional[str]:
+        return self.state
+
+    async def set_state(self, state: Any = None) -> None:
+        self.state = getattr(state, 'state', state)
+
+    async def get_data(self) -> Dict[str, Any]:
+        return self.data.copy()
+
+    async def set_data(self, data: Dict[str, Any]) -> None:
+        self.data = data.copy()
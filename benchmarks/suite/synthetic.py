@@ -0,0 +1,39 @@
+"""
+Reproducible synthetic reminders database
+"""
+import random
+from pathlib import Path
+from time import time
+
+from bot.db import Database
+from bot.texts import store_many
+
+
+CHUNK = 100_000
+
+
+def generate(path: Path, rows: int, owners: int, due: float, seed: int) -> None:
+    """
+    Fills database with `rows` reminders of `owners` users.
+    `due` share of them is already due, others are spread over the next year
+    """
+    rng = random.Random(seed)
+    now = time()
+    db = Database(path, readers=0)
+    with db.cursor(autocommit=True) as cur:
+        for start in range(0, rows, CHUNK):
+            batch = [(
+                now - rng.random() * 3600 if rng.random() < due
+                else now + 60 + rng.random() * 364 * 86400,
+                rng.randrange(owners),
+                'Напоминание ' * rng.randint(1, 40),
+            ) for _ in range(min(CHUNK, rows - start))]
+            hashes = store_many(db.db, (text for _, _, text in batch))
+            cur.executemany(
+                "INSERT OR IGNORE INTO reminds (datetime, owner, text_hash) VALUES (?, ?, ?)",
+                [(date, owner, hash_) for (date, owner, _), hash_ in zip(batch, hashes)]
+            )
+            # Texts of ignored duplicates aren't referenced
+            cur.execute("DELETE FROM reminder_texts WHERE refs <= 0")
+            db.db.commit()
+    db.unload_instance_normal()
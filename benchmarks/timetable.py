@@ -0,0 +1,102 @@
+"""
+Timetables: next lesson start by stepping days, as before timetable engine,
+against bisect in compiled two-week cycle. Loading of many groups and
+reloading after one group's file is changed
+
+python -m benchmarks.timetable --groups 500 --lessons 40 --lookups 100000
+"""
+import json
+import os
+import random
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from bot.timetable import Timetables
+
+
+def stepping(lesson: dict, now: datetime) -> datetime:
+    """Implementation before timetable engine, without week parity"""
+    date = now
+    while date.weekday() != lesson['weekday']:
+        date += timedelta(days=1)
+    hours, minutes = lesson['start_time'].split(':')
+    return date.replace(hour=int(hours), minute=int(minutes))
+
+
+def generate(folder: Path, groups: int, lessons: int, rng: random.Random) -> None:
+    for group in range(groups):
+        (folder / f'group{group}.json').write_text(json.dumps({
+            'first_week': '2026-09-01',
+            'lessons': [{
+                'names': [f'предмет {group} {number}', f'п{number}'],
+                'weekday': rng.randrange(6),
+                'start_time': f'{rng.randrange(8, 20)}:{rng.choice((0, 30, 40)):02}',
+                'kind': rng.choice(('practice', 'lecture')),
+                'weeks': rng.choice(('all', 'odd', 'even')),
+            } for number in range(lessons)],
+        }, ensure_ascii=False), encoding='utf-8')
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--groups', type=int, default=500)
+    parser.add_argument('--lessons', type=int, default=40)
+    parser.add_argument('--lookups', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tz = timezone(timedelta(hours=3))
+    report = {}
+    with TemporaryDirectory() as temporary:
+        folder = Path(temporary)
+        generate(folder, args.groups, args.lessons, rng)
+        timetables = Timetables(folder, check_interval=0)
+
+        start = perf_counter()
+        for group in timetables.groups():
+            timetables.get(group)
+        report['load_all_s'] = perf_counter() - start
+        start = perf_counter()
+        for group in timetables.groups():
+            timetables.get(group)
+        report['check_all_unchanged_s'] = perf_counter() - start
+        changed = folder / 'group0.json'
+        os.utime(changed, ns=(changed.stat().st_atime_ns, changed.stat().st_mtime_ns + 1))
+        start = perf_counter()
+        for group in timetables.groups():
+            timetables.get(group)
+        report['check_all_one_changed_s'] = perf_counter() - start
+
+        timetable = timetables.get('group0')
+        lessons = json.loads(changed.read_text(encoding='utf-8'))['lessons']
+        base = datetime(2026, 10, 1, tzinfo=tz)
+        queries = [
+            (base + timedelta(minutes=rng.randrange(365 * 24 * 60)), rng.randrange(args.lessons))
+            for _ in range(args.lookups)
+        ]
+        start = perf_counter()
+        for moment, number in queries:
+            stepping(lessons[number], moment)
+        report['stepping_us'] = (perf_counter() - start) / args.lookups * 1e6
+        start = perf_counter()
+        for moment, number in queries:
+            timetable.next_after(moment, number)
+        report['bisect_us'] = (perf_counter() - start) / args.lookups * 1e6
+        # Next lesson of any subject needs stepping for every lesson
+        start = perf_counter()
+        for moment, _ in queries[:args.lookups // 100]:
+            min(stepping(lesson, moment) for lesson in lessons)
+        report['stepping_any_lesson_us'] = (perf_counter() - start) / (args.lookups // 100) * 1e6
+        start = perf_counter()
+        for moment, _ in queries:
+            timetable.next_after(moment)
+        report['bisect_any_lesson_us'] = (perf_counter() - start) / args.lookups * 1e6
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
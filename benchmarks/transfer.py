@@ -0,0 +1,91 @@
+"""
+Bulk import and export: generates JSONL or CSV file of reminders, imports
+it into empty database chunk by chunk, and exports it back. Reports rows
+per second and peak memory of process, which shouldn't grow with rows
+
+python -m benchmarks.transfer --rows 1000000 --format jsonl
+"""
+import csv
+import json
+import random
+import resource
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from bot.db import Database
+from bot.settings import Settings
+from bot.transfer import FIELDS, dump, export_rows, import_file
+
+
+def peak_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def generate(path: Path, rows: int, owners: int, format_: str, rng: random.Random) -> None:
+    now = datetime.now(Settings.timezone)
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file) if format_ == 'csv' else None
+        if writer is not None:
+            writer.writerow(FIELDS)
+        for i in range(rows):
+            record = (
+                i % owners,
+                (now + timedelta(minutes=i // owners + 1)).isoformat(),
+                # Every fourth text is repeated, as templates of users
+                f'напоминание {i if i % 4 else 0}',
+                'every:3600' if i % 10 == 0 else None,
+            )
+            if writer is not None:
+                writer.writerow((*record[:3], record[3] or ''))
+            else:
+                file.write(json.dumps(dict(zip(FIELDS, record)), ensure_ascii=False) + '\n')
+    # Invalid records are reported, not imported
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write('0,not a date,text,\n' if format_ == 'csv' else '{"owner": 0, "datetime": "not a date"}\n')
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--per-owner', type=int, default=500)
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument('--chunk', type=int, default=50_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    Settings.timezone = timezone(timedelta(hours=3), name='MSK')
+    rng = random.Random(args.seed)
+    report = {}
+    with TemporaryDirectory() as folder:
+        source = Path(folder) / f'reminders.{args.format}'
+        generate(source, args.rows, max(args.rows // args.per_owner, 1), args.format, rng)
+        report['file_mb'] = source.stat().st_size / 2 ** 20
+        report['peak_mb_before'] = peak_mb()
+
+        db = Database(Path(folder) / 'reminds.db', readers=0)
+        errors = []
+        start = perf_counter()
+        with open(source, encoding='utf-8', newline='') as file:
+            report['import'] = import_file(
+                db.db, file, args.format, lambda number, message: errors.append(number), args.chunk
+            )
+        elapsed = perf_counter() - start
+        report['import_rows_per_s'] = args.rows / elapsed
+        report['import_10m_rows_min'] = 10_000_000 / report['import_rows_per_s'] / 60
+        report['peak_mb_after_import'] = peak_mb()
+        report['errors'] = len(errors)
+
+        start = perf_counter()
+        with open(Path(folder) / f'export.{args.format}', 'w', encoding='utf-8', newline='') as file:
+            exported = dump(export_rows(db.db), file, args.format)
+        report['export_rows_per_s'] = exported / (perf_counter() - start)
+        report['peak_mb_after_export'] = peak_mb()
+        db.unload_instance_normal()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,3 @@
+# Imported first, so startup time includes other imports
+from . import startup
 from .main import run
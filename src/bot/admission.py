@@ -0,0 +1,174 @@
+"""
+Admission control of updates. Every user has token bucket, and all
+updates share global one, so flood of one client doesn't delay others.
+Updates over limit are dropped before handlers, user is told about it
+once per flood through queue of sender
+"""
+import logging
+from array import array
+from bisect import bisect_left
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+
+from .settings import Settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBuckets:
+    """
+    Token buckets of many keys, refilled by `rate` tokens per second up to
+    `capacity`. Buckets live in sorted arrays, 20 bytes per key, and are
+    found by bisect. Keys seen since last compaction are kept in dict.
+    Compaction merges them into arrays and drops refilled buckets, which
+    are the same as absent ones, so only recently active keys take memory.
+    Dict is compacted, when it reaches quarter of arrays, so merging costs
+    constant time per key
+    """
+    __slots__ = ('rate', 'capacity', 'compact_interval', 'max_recent',
+                 '_keys', '_tokens', '_stamps', '_recent', '_compacted')
+
+    def __init__(
+            self,
+            rate: float,
+            capacity: float,
+            compact_interval: float = 60,
+            max_recent: int = 10_000,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.compact_interval = compact_interval
+        self.max_recent = max_recent
+        self._keys = array('q')
+        self._tokens = array('f')
+        self._stamps = array('d')
+        # Key: [tokens, monotonic time of last take]
+        self._recent: Dict[int, List[float]] = {}
+        self._compacted = monotonic()
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._recent)
+
+    def take(self, key: int, now: Optional[float] = None) -> float:
+        """
+        Takes token of key. Returns tokens, that bucket had before,
+        so take succeeded if result is at least 1
+        """
+        if now is None:
+            now = monotonic()
+        if (
+                now - self._compacted > self.compact_interval
+                or len(self._recent) > max(self.max_recent, len(self._keys) // 4)
+        ):
+            self.compact(now)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            tokens = min(self.capacity, self._tokens[index] + (now - self._stamps[index]) * self.rate)
+            self._tokens[index] = _spend(tokens)
+            self._stamps[index] = now
+            return tokens
+        bucket = self._recent.get(key)
+        if bucket is None:
+            tokens = self.capacity
+            self._recent[key] = [_spend(tokens), now]
+        else:
+            tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[0], bucket[1] = _spend(tokens), now
+        return tokens
+
+    def compact(self, now: Optional[float] = None) -> None:
+        """Merges recent keys into arrays and drops refilled buckets"""
+        if now is None:
+            now = monotonic()
+        # Buckets, which aren't refilled by now
+        active = [
+            (key, tokens, stamp)
+            for key, tokens, stamp in zip(self._keys, self._tokens, self._stamps)
+            if tokens + (now - stamp) * self.rate < self.capacity
+        ]
+        active.extend(
+            (key, tokens, stamp)
+            for key, (tokens, stamp) in self._recent.items()
+            if tokens + (now - stamp) * self.rate < self.capacity
+        )
+        active.sort()
+        self._keys = array('q', (key for key, _, _ in active))
+        self._tokens = array('f', (tokens for _, tokens, _ in active))
+        self._stamps = array('d', (stamp for _, _, stamp in active))
+        self._recent = {}
+        self._compacted = now
+
+
+def _spend(tokens: float) -> float:
+    return tokens - 1 if tokens >= 1 else tokens
+
+
+class Admission(BaseMiddleware):
+    """
+    Outer middleware of updates. User bucket is checked first,
+    so rejected updates of flooding user don't spend global tokens.
+    User is notified on the first rejected update, and again only
+    after bucket of user was refilled to capacity, so once per flood
+    """
+
+    def __init__(
+            self,
+            user_rate: float = 1,
+            user_burst: float = 20,
+            total_rate: float = 200,
+            total_burst: float = 400,
+            max_notified: int = 10_000,
+    ):
+        self.users = TokenBuckets(user_rate, user_burst)
+        self.total = TokenBuckets(total_rate, total_burst, max_recent=1)
+        self.rejected = 0
+        self.max_notified = max_notified
+        # Notified user id: monotonic time of last rejected update
+        self._notified: Dict[int, float] = {}
+
+    async def __call__(
+            self,
+            handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+            event: Any,
+            data: Dict[str, Any]
+    ) -> Any:
+        now = monotonic()
+        user = data.get('event_from_user')
+        if user is not None:
+            tokens = self.users.take(user.id, now)
+            if tokens < 1:
+                self.rejected += 1
+                if user.id in self._notified:
+                    self._notified[user.id] = now
+                else:
+                    self._notify(user, data.get('event_chat'), now)
+                return None
+            if tokens >= self.users.capacity:
+                # Flood is over, the next one is told about again
+                self._notified.pop(user.id, None)
+        if self.total.take(0, now) < 1:
+            self.rejected += 1
+            logger.debug('Update %s is dropped, global limit is reached', event.update_id)
+            return None
+        return await handler(event, data)
+
+    def _notify(self, user: Any, chat: Any, now: float) -> None:
+        """Queues notice without waiting, so flooding user doesn't hold update on network"""
+        if len(self._notified) >= self.max_notified:
+            # Buckets of users, rejected that long ago, are refilled by now
+            refill = self.users.capacity / self.users.rate
+            self._notified = {
+                key: stamp for key, stamp in self._notified.items() if now - stamp < refill
+            }
+        self._notified[user.id] = now
+        if chat is None:
+            return
+        tr = Settings.Translations
+        if not Settings.Sender.notify(chat.id, tr.get(
+                tr.locale(user.language_code),
+                'Слишком много сообщений. Подождите немного, прежде чем продолжить'
+        )):
+            logger.debug('Queue of sender is full, user %s is not told about flood limit', user.id)
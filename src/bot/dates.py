@@ -0,0 +1,160 @@
+"""
+Parser of reminder dates typed by user: absolute 'ДД.ММ.ГГ ЧЧ:ММ',
+relative 'через 2 часа', 'завтра в 9' and weekday names 'в среду в 10:40'.
+Pure and synchronous, so it's also used for bulk import
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Iterable, List, NamedTuple, Sequence, Union
+
+
+class DateError(NamedTuple):
+    """Problem with one part of text. Field is 'day', 'month', 'year', 'hour', 'minute', 'unit' or 'text'"""
+    field: str
+    value: str
+    message: str
+
+
+PARSED = Union[datetime, List[DateError]]
+
+WEEK_NAMES = (
+    'Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'
+)
+
+_UNITS = (
+    ('мин', 60),
+    ('полчас', 30 * 60),
+    ('час', 60 * 60),
+    ('дн', 24 * 60 * 60),
+    ('ден', 24 * 60 * 60),
+    ('сут', 24 * 60 * 60),
+    ('нед', 7 * 24 * 60 * 60),
+)
+_DAY_WORDS = {'сегодня': 0, 'завтра': 1, 'послезавтра': 2}
+# Reminders can't be set further, same as in check_fields of db.py
+MAX_AHEAD = timedelta(days=366)
+TOO_FAR = 'Напоминание можно поставить не больше чем на год вперёд'
+
+# Amounts are limited in length, so int() never gets huge strings
+_TIME = r'(?:\s+(?:в\s+)?(?P<hour>\d{1,2})(?:[:.](?P<minute>\d{1,2}))?)?'
+_ABSOLUTE = re.compile(
+    r'(?P<day>\d{1,2})\.(?P<month>\d{1,2})(?:\.(?P<year>\d{4}|\d{2}))?' + _TIME
+)
+_RELATIVE = re.compile(r'через((?:\s+(?:\d{1,6}\s*)?[а-яё]+)+)')
+_PART = re.compile(r'(\d{1,6})?\s*([а-яё]+)')
+
+
+class DateParser:
+    """
+    Built once from names of weekdays. `parse` returns aware datetime
+    later than `now`, or list of errors
+    """
+    __slots__ = ('_weekday', '_stems')
+
+    def __init__(self, week_names: Sequence[str] = WEEK_NAMES):
+        # Stem without last letter matches forms like 'среду' and 'пятницу'
+        self._stems = {name.casefold()[:-1]: number for number, name in enumerate(week_names)}
+        self._weekday = re.compile(
+            r'(?:(?P<word>' + '|'.join(_DAY_WORDS) + r')|(?:во?\s+)?(?P<weekday>'
+            + '|'.join(map(re.escape, self._stems)) + r')[а-яё]?)' + _TIME
+        )
+
+    def parse(self, text: str, now: datetime) -> PARSED:
+        text = text.strip().casefold()
+        if text[:1].isdigit():
+            match = _ABSOLUTE.fullmatch(text)
+            if match is not None:
+                return _absolute(match, now)
+        elif text.startswith('через'):
+            match = _RELATIVE.fullmatch(text)
+            if match is not None:
+                return _relative(match.group(1), now)
+        else:
+            match = self._weekday.fullmatch(text)
+            if match is not None:
+                return self._day(match, now)
+        return [DateError('text', text, 'Не смог прочитать дату')]
+
+    def parse_many(self, texts: Iterable[str], now: datetime) -> List[PARSED]:
+        """Parses all texts relatively to the same moment"""
+        parse = self.parse
+        return [parse(text, now) for text in texts]
+
+    def _day(self, match: re.Match, now: datetime) -> PARSED:
+        errors: List[DateError] = []
+        hour, minute = _time(match, now, errors)
+        if errors:
+            return errors
+        word = match.group('word')
+        if word is not None:
+            days = _DAY_WORDS[word]
+        else:
+            days = (self._stems[match.group('weekday')] - now.weekday()) % 7
+        date = now.replace(hour=hour, minute=minute, second=0, microsecond=0) + timedelta(days=days)
+        if word is None and date <= now:
+            date += timedelta(days=7)
+        return _future(date, match.group(0), now)
+
+
+def _time(match: re.Match, now: datetime, errors: List[DateError]) -> tuple[int, int]:
+    """Time of day from match, current time if it's omitted"""
+    hour, minute = match.group('hour', 'minute')
+    if hour is None:
+        return now.hour, now.minute
+    hour = int(hour)
+    minute = int(minute or 0)
+    if not 0 <= hour < 24:
+        errors.append(DateError('hour', match.group('hour'), 'Час должен быть от 0 до 23'))
+    if not 0 <= minute < 60:
+        errors.append(DateError('minute', match.group('minute'), 'Минуты должны быть от 0 до 59'))
+    return hour, minute
+
+
+def _absolute(match: re.Match, now: datetime) -> PARSED:
+    errors: List[DateError] = []
+    day, month = int(match.group('day')), int(match.group('month'))
+    if not 1 <= day <= 31:
+        errors.append(DateError('day', match.group('day'), 'День месяца должен быть числом от 01 до 31'))
+    if not 1 <= month <= 12:
+        errors.append(DateError('month', match.group('month'), 'Месяц должен быть числом от 01 до 12'))
+    hour, minute = _time(match, now, errors)
+    if errors:
+        return errors
+
+    year = match.group('year')
+    try:
+        if year is not None:
+            date = datetime(int(year) + 2000 if len(year) == 2 else int(year),
+                            month, day, hour, minute, tzinfo=now.tzinfo)
+        else:
+            # Without year the nearest such date is meant
+            date = datetime(now.year, month, day, hour, minute, tzinfo=now.tzinfo)
+            if date <= now:
+                date = date.replace(year=now.year + 1)
+    except ValueError:
+        return [DateError('day', match.group(0), 'Такой даты нет в календаре')]
+    return _future(date, match.group(0), now)
+
+
+def _relative(parts: str, now: datetime) -> PARSED:
+    seconds = 0
+    for amount, unit in _PART.findall(parts):
+        for prefix, step in _UNITS:
+            if unit.startswith(prefix):
+                seconds += int(amount or 1) * step
+                break
+        else:
+            return [DateError('unit', unit, 'Неизвестная единица времени')]
+    delta = timedelta(seconds=seconds)
+    # Checked before addition, which overflows for huge amounts
+    if delta > MAX_AHEAD:
+        return [DateError('text', parts.strip(), TOO_FAR)]
+    return _future(now + delta, parts.strip(), now)
+
+
+def _future(date: datetime, text: str, now: datetime) -> PARSED:
+    if date <= now:
+        return [DateError('text', text, 'Дата уже прошла')]
+    if date - now > MAX_AHEAD:
+        return [DateError('text', text, TOO_FAR)]
+    return date
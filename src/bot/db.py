@@ -1,19 +1,64 @@
-from typing import Optional, Self
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Self, Set, Tuple
+from asyncio import Future, get_running_loop, shield, sleep, wait
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from sqlite3 import connect
+from sqlite3 import Connection, IntegrityError, connect
 from sqlite3 import Cursor as SQLCursor
+from threading import Lock, local
+from time import monotonic
 from datetime import datetime, timedelta
 
 from .settings import Settings
+from .migrations import migrate
+from .recurrence import Rule
+from .metrics import COMMITS_PER_GROUP, timed_call
+from .texts import decode, load as load_text, store as store_text
+
+
+TEXT_LIMIT = 2000
+# Separates texts of reminders, merged because of same owner and time
+APPEND_SEPARATOR = '\n---\n'
+# Journal mode and synchronous setting of durability profiles. In 'wal'
+# committed transactions survive crash of process, in 'wal-full' also
+# power loss. 'unsafe' has no journal, so crash mid-write can corrupt file
+DURABILITY = {
+    'wal': ('WAL', 'NORMAL'),
+    'wal-full': ('WAL', 'FULL'),
+    'unsafe': ('OFF', 'NORMAL'),
+}
+# Reminders one owner may have at once, None disables limit
+PENDING_LIMIT = 1000
+# Fields of reminder, whose assignment is recorded by unit of work
+_FIELDS = frozenset(('datetime', 'owner', 'text', 'rule'))
+
+class PendingLimitError(ValueError):
+    """Owner would have more reminders than allowed"""
+
+    def __init__(self, owner: int, limit: int):
+        super().__init__(f"Owner can't have more than {limit} reminders")
+        self.owner = owner
+        self.limit = limit
+
+
+class DateRangeError(ValueError):
+    """Reminder is set further than allowed"""
 
 
 class Cursor:
-    __slots__ = ('db', 'autocommit', '_cursor')
+    """
+    Synchronous usage (`with`) gives raw sqlite cursor of writer connection
+    and is meant only for startup and shutdown code.
+    Asynchronous usage (`async with`) runs every query in database threads
+    """
+    __slots__ = ('db', 'autocommit', '_cursor', '_written')
 
     def __init__(self, db: 'Database', autocommit: bool = False):
         self.db = db
         self.autocommit = autocommit
         self._cursor: Optional[SQLCursor] = None
+        self._written = False
 
     def __enter__(self) -> SQLCursor:
         assert self._cursor is None
@@ -25,52 +70,295 @@ class Cursor:
         if self.autocommit:
             self.db.db.commit()
 
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *_):
+        # Statements, that succeeded before exception, are committed too,
+        # otherwise open transaction would hold database lock
+        if self.autocommit and self._written:
+            await self.commit()
+
+    async def execute(self, sql: str, parameters: Iterable = ()) -> int:
+        """Runs writing query on writer thread. Returns amount of affected rows"""
+        self._written = True
+        return await self.db.write(_execute, sql, parameters)
+
+    async def executemany(self, sql: str, parameters: Iterable[Iterable]) -> int:
+        self._written = True
+        return await self.db.write(_executemany, sql, parameters)
+
+    async def execute_returning(self, sql: str, parameters: Iterable = ()) -> List[tuple]:
+        """
+        Runs writing query with RETURNING clause on writer thread.
+        Integer columns should be CAST in RETURNING, as SQLite 3.40
+        returns them with REAL affinity of 'reminds' datetime column
+        """
+        self._written = True
+        return await self.db.write(_fetchall, sql, parameters)
+
+    async def fetchone(self, sql: str, parameters: Iterable = ()) -> Optional[tuple]:
+        return await self.db.read(_fetchone, sql, parameters)
+
+    async def fetchall(self, sql: str, parameters: Iterable = ()) -> List[tuple]:
+        return await self.db.read(_fetchall, sql, parameters)
+
+    async def fetchmany(self, sql: str, parameters: Iterable = (), size: int = 1) -> List[tuple]:
+        return await self.db.read(_fetchmany, sql, parameters, size)
+
     async def commit(self) -> Self:
-        self.db.db.commit()
+        await self.db.commit()
+        self._written = False
         return self
 
 
+def _execute(connection: Connection, sql: str, parameters: Iterable) -> int:
+    return connection.execute(sql, parameters).rowcount
+
+
+def _executemany(connection: Connection, sql: str, parameters: Iterable[Iterable]) -> int:
+    return connection.executemany(sql, parameters).rowcount
+
+
+def _fetchone(connection: Connection, sql: str, parameters: Iterable) -> Optional[tuple]:
+    return connection.execute(sql, parameters).fetchone()
+
+
+def _fetchall(connection: Connection, sql: str, parameters: Iterable) -> List[tuple]:
+    return connection.execute(sql, parameters).fetchall()
+
+
+def _fetchmany(connection: Connection, sql: str, parameters: Iterable, size: int) -> List[tuple]:
+    return connection.execute(sql, parameters).fetchmany(size)
+
+
 class Database:
-    __slots__ = ('db', 'async_loop')
+    """
+    Owns one writer connection, used by single dedicated thread, and
+    pool of read-only connections. Readers see only committed data.
+    Commits of handlers, that come while previous commit is synced,
+    are one transaction. `group_commit` = None commits every handler alone.
+    Functions of handlers, that must be atomic, run in savepoints of that
+    transaction, see write_committed
+    """
+    __slots__ = ('db', 'path', 'durability', 'group_commit', '_writer', '_readers',
+                 '_reader_local', '_reader_connections', '_reader_lock',
+                 '_group', '_group_size', '_committing')
 
-    def __init__(self, path: str | Path):
+    def __init__(
+            self,
+            path: str | Path,
+            readers: int = 4,
+            durability: str = 'wal',
+            group_commit: Optional[float] = 0,
+    ):
         if isinstance(path, Path):
             path = path.absolute()
-        self.db = connect(path)
+        self.path = path
+        self.durability = durability
+        self.group_commit = group_commit
+        self.db = connect(path, check_same_thread=False)
 
+        journal_mode, synchronous = DURABILITY[durability]
         with self.cursor() as cur:
-            cur.execute('PRAGMA main.synchronous = NORMAL')
-            cur.execute('PRAGMA main.journal_mode = OFF')
+            cur.execute(f'PRAGMA main.journal_mode = {journal_mode}')
+            cur.execute(f'PRAGMA main.synchronous = {synchronous}')
             cur.execute('PRAGMA temp_store = MEMORY')
 
-            # Checking for tables in DB
-            cur.execute(f"SELECT name FROM sqlite_master WHERE type = 'table'")
-            tables = [table[0] for table in cur.fetchall()]
-
-            if 'reminds' not in tables:
-                cur.execute(f"""CREATE TABLE 'reminds'(
-                    datetime REAL NOT NULL,
-                    owner INTEGER NOT NULL,
-                    text TEXT NOT NULL)""")
+        migrate(self.db)
+
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='db-writer')
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._reader_local = local()
+        self._reader_connections: List[Connection] = []
+        self._reader_lock = Lock()
+        # Result of commit, which is waited by group of handlers,
+        # and of the previous one, which is being synced
+        self._group: Optional[Future] = None
+        self._group_size = 0
+        self._committing: Optional[Future] = None
+        # In-memory database can't be shared between connections
+        if readers > 0 and str(path) != ':memory:':
+            self._readers = ThreadPoolExecutor(readers, thread_name_prefix='db-reader')
 
     def cursor(self, autocommit: bool = False) -> Cursor:
         return Cursor(db=self, autocommit=autocommit)
 
+    def _reader_connection(self) -> Connection:
+        connection = getattr(self._reader_local, 'connection', None)
+        if connection is None:
+            connection = connect(
+                f'{Path(self.path).as_uri()}?mode=ro',
+                uri=True, check_same_thread=False
+            )
+            self._reader_local.connection = connection
+            with self._reader_lock:
+                self._reader_connections.append(connection)
+        return connection
+
+    def _run_read(self, func, *args) -> Any:
+        return timed_call(func, self._reader_connection(), *args)
+
+    async def write(self, func, *args) -> Any:
+        """Runs func(connection, *args) on writer thread"""
+        return await get_running_loop().run_in_executor(
+            self._writer, timed_call, func, self.db, *args
+        )
+
+    async def write_committed(self, func, *args) -> Any:
+        """
+        Runs func(connection, *args) on writer thread and waits for commit
+        of its group. Func makes its writes in `_savepoint`, so failed one is
+        rolled back alone, and commit still ends transaction, that it began
+        """
+        try:
+            return await self.write(func, *args)
+        finally:
+            await self.commit()
+
+    async def read(self, func, *args) -> Any:
+        """Runs func(connection, *args) on one of read-only connections"""
+        if self._readers is None:
+            return await self.write(func, *args)
+        return await get_running_loop().run_in_executor(
+            self._readers, self._run_read, func, *args
+        )
+
+    async def commit(self) -> None:
+        """
+        Commits writes of this and other handlers in one transaction, so disk
+        is synced once. Group is open while previous commit is synced, and
+        at least `group_commit` seconds
+        """
+        if self.group_commit is None:
+            await self.write(Connection.commit)
+            return
+        if self._group is None:
+            self._group = get_running_loop().create_future()
+            get_running_loop().create_task(self._commit_group(self._group))
+        self._group_size += 1
+        # Cancelled handler must not cancel commit of others
+        await shield(self._group)
+
+    async def _commit_group(self, group: Future) -> None:
+        # Zero sleep still lets handlers of the current loop iteration join
+        await sleep(self.group_commit)
+        previous = self._committing
+        if previous is not None:
+            await wait((previous,))
+        # Writes after this point are committed by the next group
+        self._group = None
+        COMMITS_PER_GROUP.observe(self._group_size)
+        self._group_size = 0
+        self._committing = group
+        try:
+            await self.write(Connection.commit)
+        except BaseException as e:
+            group.set_exception(e)
+        else:
+            group.set_result(None)
+        finally:
+            if self._committing is group:
+                self._committing = None
+
+    async def checkpoint(self, mode: str = 'PASSIVE') -> Optional[Tuple[int, int, int]]:
+        """Moves pages from write-ahead log to database. Returns (busy, log pages, moved pages)"""
+        if DURABILITY[self.durability][0] != 'WAL':
+            return None
+        return await self.write(_fetchone, f'PRAGMA main.wal_checkpoint({mode})', ())
+
     async def unload_instance(self) -> None:
+        if self._group is not None:
+            await shield(self._group)
         self.unload_instance_normal()
 
     def unload_instance_normal(self) -> None:
         if self.db is None:
             return
+        self._writer.shutdown(wait=True)
+        if self._readers is not None:
+            self._readers.shutdown(wait=True)
+        for connection in self._reader_connections:
+            connection.close()
+        self._reader_connections.clear()
         self.db.commit()
         self.db.close()
         self.db = None
 
 
+def check_fields(
+        date: datetime,
+        owner: int,
+        text: Optional[str],
+        rule: Optional[str],
+        date_limit: Optional[float] = None
+) -> float:
+    """
+    Rules of reminder fields, shared by Reminder.validate and bulk import.
+    Returns datetime timestamp. `date_limit` is the latest allowed timestamp,
+    a year from now by default
+    """
+    if date_limit is None:
+        date_limit = (datetime.now(Settings.timezone) + timedelta(days=366)).timestamp()
+    timestamp = date.timestamp()
+    if timestamp > date_limit:
+        raise DateRangeError("Can't set reminder further than on year")
+    if not isinstance(owner, int):
+        raise ValueError("Owner ID should be integer")
+    if text is not None:
+        if not isinstance(text, str):
+            raise ValueError("Text should be string")
+        if len(text) > TEXT_LIMIT:
+            raise ValueError(f"Text of reminder shouldn't be above {TEXT_LIMIT} characters")
+    if rule is not None:
+        try:
+            Rule.loads(rule)
+        except (AttributeError, IndexError) as e:
+            raise ValueError(f"Invalid recurrence rule {rule!r}") from e
+    return timestamp
+
+
+class IdentityMap:
+    """
+    Loaded reminders by rowid, so handlers share one object per reminder.
+    Least recently used are dropped. Entries expire after `ttl` seconds,
+    as other dispatcher processes don't invalidate them
+    """
+    __slots__ = ('size', 'ttl', '_reminders')
+
+    def __init__(self, size: int = 1024, ttl: float = 60):
+        self.size = size
+        self.ttl = ttl
+        self._reminders: OrderedDict[int, Tuple[float, 'Reminder']] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._reminders)
+
+    def get(self, id_: int) -> Optional['Reminder']:
+        entry = self._reminders.get(id_)
+        if entry is None:
+            return None
+        if monotonic() - entry[0] > self.ttl:
+            del self._reminders[id_]
+            return None
+        self._reminders.move_to_end(id_)
+        return entry[1]
+
+    def put(self, reminder: 'Reminder') -> None:
+        self._reminders[reminder.id] = (monotonic(), reminder)
+        self._reminders.move_to_end(reminder.id)
+        if len(self._reminders) > self.size:
+            self._reminders.popitem(last=False)
+
+    def forget(self, ids: Iterable[int]) -> None:
+        for id_ in ids:
+            self._reminders.pop(id_, None)
+
+
 class Reminder:
-    __slots__ = ('id', '_id', '_loaded',
-                 'datetime', 'owner', 'text',
-                 '_datetime', '_owner', '_text')
+    __slots__ = ('id', '_id', '_loaded', '_dirty',
+                 'datetime', 'owner', 'text', 'rule',
+                 '_datetime', '_owner', '_text', '_rule', '_text_hash')
 
     def __init__(
             self,
@@ -78,21 +366,74 @@ class Reminder:
             _datetime: datetime = None,
             _owner: int = None,
             _text: str = None,
-    
+            _rule: str = None,
     ):
+        # Fields assigned since load or write
+        self._dirty: Set[str] = set()
         self._id = self.id = id_
         self._datetime = self.datetime = _datetime
         self._owner = self.owner = _owner
         self._text = self.text = _text
+        # Serialized recurrence.Rule, None for one-time reminders
+        self._rule = self.rule = _rule
+        # Body is stored in 'reminder_texts' and loaded only when requested
+        self._text_hash: Optional[int] = None
         self._loaded = False
+        self._dirty.clear()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in _FIELDS:
+            self._dirty.add(name)
+        object.__setattr__(self, name, value)
 
     async def get_by_id(self, id_: int):
-        with Settings.Database.cursor() as cur:
-            return cur.execute(
-                "SELECT rowid, datetime, owner, text from 'reminds' "
-                f"WHERE rowid=?",
+        async with Settings.Database.cursor() as cur:
+            return await cur.fetchone(
+                "SELECT rowid, datetime, owner, text_hash, rule from 'reminds' "
+                "WHERE rowid=?",
                 (id_,)
-            ).fetchone()
+            )
+
+    @classmethod
+    async def by_id(cls, id_: int) -> 'Reminder':
+        """Loaded reminder from identity map, or loaded from database and put there"""
+        reminder = Settings.Reminders.get(id_)
+        if reminder is None:
+            reminder = cls(id_)
+            await reminder.load()
+            # Other handler could load it meanwhile, its object is shared
+            loaded = Settings.Reminders.get(id_)
+            if loaded is not None:
+                return loaded
+            Settings.Reminders.put(reminder)
+        return reminder
+
+    @classmethod
+    async def by_ids(cls, ids: Iterable[int]) -> Dict[int, 'Reminder']:
+        """Loaded reminders by rowid. Missing in identity map are loaded by one query"""
+        found = {}
+        missing = []
+        for id_ in ids:
+            reminder = Settings.Reminders.get(id_)
+            if reminder is None:
+                missing.append(id_)
+            else:
+                found[id_] = reminder
+        if missing:
+            async with Settings.Database.cursor() as cur:
+                rows = await cur.fetchall(
+                    "SELECT rowid, datetime, owner, text_hash, rule from 'reminds' "
+                    f"WHERE rowid IN ({', '.join('?' * len(missing))})",
+                    missing
+                )
+            for row in rows:
+                reminder = Settings.Reminders.get(row[0])
+                if reminder is None:
+                    reminder = cls(row[0])
+                    reminder._fill(row)
+                    Settings.Reminders.put(reminder)
+                found[row[0]] = reminder
+        return found
 
     @classmethod
     async def assert_existing(
@@ -112,15 +453,8 @@ class Reminder:
 
     @classmethod
     async def new(cls) -> 'Reminder':
-        with Settings.Database.cursor() as cur:
-            cur: SQLCursor
-            lastrowid = cur.execute(
-                "SELECT rowid FROM 'reminds' ORDER BY rowid DESC LIMIT 1;"
-            ).fetchone()
-            if lastrowid is None:
-                return Reminder(0)
-            else:
-                return Reminder(lastrowid[0]+1)
+        """Creates reminder without id. Database allocates id on first commit"""
+        return cls(None)
 
     async def get(self, item):
         if item in self.__slots__:
@@ -129,6 +463,8 @@ class Reminder:
             else:
                 if not self._loaded:
                     await self.load()
+                if item == 'text' and self.text is None:
+                    await self.load_text()
             return getattr(self, item)
         raise ValueError(f"There's no field {item} in reminder")
 
@@ -144,19 +480,31 @@ class Reminder:
         reminder = await self.get_by_id(self.id)
         if not reminder:
             raise IndexError(f"Trying to get reminder with index {self.id} which doesn't exist")
-        _, self._datetime, self._owner, self._text = reminder
-        assert 'timezone' in Settings
-        self._datetime = datetime.fromtimestamp(self.datetime, Settings.timezone)
-        if self.datetime is None:
-            self.datetime = self._datetime
-        if self.owner is None:
-            self.owner = self._owner
-        if self.text is None:
-            self.text = self._text
+        self._fill(reminder)
+
+    def _fill(self, row: tuple) -> None:
+        """Sets loaded fields, which weren't assigned by handler"""
+        _, self._datetime, self._owner, self._text_hash, self._rule = row
+        assert hasattr(Settings, 'timezone')
+        self._datetime = datetime.fromtimestamp(self._datetime, Settings.timezone)
+        # Loaded values aren't changes
+        for name in ('datetime', 'owner', 'rule'):
+            if getattr(self, name) is None:
+                object.__setattr__(self, name, getattr(self, f'_{name}'))
         self._loaded = True
 
-    async def commit(self) -> None:
+    async def load_text(self) -> None:
+        """Fetches body of loaded reminder"""
+        async with Settings.Database.cursor() as cur:
+            body, = await cur.fetchone(
+                "SELECT body FROM 'reminder_texts' WHERE hash = ?", (self._text_hash,)
+            )
+        self._text = decode(body)
+        if self.text is None:
+            object.__setattr__(self, 'text', self._text)
 
+    def validate(self) -> float:
+        """Checks and normalizes fields before writing. Returns datetime timestamp"""
         # Types
         if self.datetime == self._datetime:
             pass
@@ -169,46 +517,462 @@ class Reminder:
         else:
             raise ValueError("Datetime should be float or datetime object")
 
-        # Validation
-        date_limit = datetime.now(Settings.timezone) + timedelta(days=366)
-        if self.datetime.timestamp() > date_limit.timestamp():
-            raise ValueError("Can't set reminder further than on year")
+        if self.id != self._id:
+            raise ValueError("Trying to change reminder id")
+        # Text of None isn't loaded, so it's not changed
+        return check_fields(self.datetime, self.owner, self.text, self.rule)
+
+    def changed_columns(self) -> Dict[str, Any]:
+        """
+        Validates fields and returns values of columns, changed since load or
+        write. Body of reminder is returned as 'text', it's stored on flush
+        """
+        datetime_float = self.validate()
+        columns = {}
+        for name in self._dirty:
+            value = getattr(self, name)
+            # Text of None isn't loaded, rather than removed
+            if value == getattr(self, f'_{name}') or name == 'text' and value is None:
+                continue
+            columns[name] = datetime_float if name == 'datetime' else value
+        return columns
+
+    def _written(self) -> None:
+        if self._owner is not None and self._owner != self.owner:
+            owner_changed(self._owner)
+        owner_changed(self.owner)
+        self._id = self.id
+        self._datetime = self.datetime
+        self._owner = self.owner
+        self._text = self.text
+        self._rule = self.rule
+        self._loaded = True
+        self._dirty.clear()
+        Settings.Reminders.put(self)
+        Settings.Scheduler.schedule(self.id, self.datetime.timestamp())
 
-        if self.owner == self._owner:
-            pass
-        elif not isinstance(self.owner, int):
-            raise ValueError("Owner ID should be integer")
+    async def commit(self) -> None:
+        datetime_float = self.validate()
+        # Body is written only if it's changed
+        text = None if self.text is None or self.text == self._text else self.text
+        try:
+            id_, hash_ = await Settings.Database.write_committed(_write_reminder, (
+                self.id, datetime_float, self.owner, text, self._text_hash, self.rule
+            ), PENDING_LIMIT)
+        except IntegrityError as e:
+            raise ValueError("Owner already has reminder at this time") from e
+        if text is None and hash_ != self._text_hash:
+            # Body was changed by other handler, it's loaded again when requested
+            object.__setattr__(self, 'text', None)
+        self.id, self._text_hash = id_, hash_
+        self._written()
 
-        if self.text == self._text:
-            pass
-        elif not isinstance(self.text, str):
-            raise ValueError("Text should be string")
+    @classmethod
+    async def commit_many(cls, reminders: List['Reminder']) -> None:
+        """Writes all reminders in one transaction, allocating ids for new ones"""
+        rows = [
+            (reminder.id, reminder.validate(), reminder.owner, reminder.text, reminder.rule)
+            for reminder in reminders
+        ]
+        try:
+            written = await Settings.Database.write_committed(_write_reminders, rows, PENDING_LIMIT)
+        except IntegrityError as e:
+            raise ValueError("Owner already has reminder at this time") from e
+        for reminder, (id_, hash_) in zip(reminders, written):
+            reminder.id, reminder._text_hash = id_, hash_
+            reminder._written()
 
-        # Validation
-        if len(self.text) > 2000:
-            raise ValueError("Text of reminder shouldn't be above 2000 characters")
+    @classmethod
+    async def delete(cls, id_: int, owner: int) -> bool:
+        """
+        Deletes reminder of owner, so recurring one stops.
+        Returns False if owner has no such reminder
+        """
+        async with Settings.Database.cursor(autocommit=True) as cur:
+            deleted = await cur.execute(
+                "DELETE FROM 'reminds' WHERE rowid = ? AND owner = ?", (id_, owner)
+            )
+        if not deleted:
+            return False
+        reminders_changed((id_,))
+        owner_changed(owner)
+        return True
 
-        datetime_float = self.datetime.timestamp()
-        if self.id != self._id:
-            raise ValueError("Trying to change reminder id")
-        old_reminder = await self.get_by_id(self.id)
-        if old_reminder is not None:
-            command = (
-                "UPDATE 'reminds'"
-                "SET (datetime, owner, text)"
-                " = (?, ?, ?) "
-                f"WHERE rowid == {self.id}",
-                (datetime_float, self.owner, self.text)
+    @classmethod
+    async def append(cls, owner: int, date: datetime, text: str) -> 'Reminder':
+        """
+        Creates reminder or appends text to existing reminder of owner
+        at the same time in one transaction
+        """
+        reminder = cls(None)
+        reminder.owner, reminder.datetime, reminder.text = owner, date, text
+        datetime_float = reminder.validate()
+        row = await Settings.Database.write_committed(
+            _append_reminder, datetime_float, owner, text, PENDING_LIMIT
+        )
+        if row is None:
+            raise ValueError(f"Text of reminder shouldn't be above {TEXT_LIMIT} characters")
+        reminder.id, reminder.text, reminder._text_hash = row
+        reminder._written()
+        return reminder
+
+
+async def checkpoint_cycle(interval: float = 60) -> None:
+    """
+    Periodically checkpoints write-ahead log, so it doesn't grow and
+    automatic checkpoints rarely delay commits of handlers
+    """
+    while True:
+        await sleep(interval)
+        await Settings.Database.checkpoint()
+
+
+class UnitOfWork:
+    """
+    Reminders, created or changed by handler. On exit of `async with` block
+    only changed columns of them are written, all in one transaction.
+    If block raises, nothing is written and changed reminders are
+    dropped from identity map, so other handlers don't see the changes
+    """
+    __slots__ = ('_reminders',)
+
+    def __init__(self):
+        # By id of object, as new reminders have no rowid yet
+        self._reminders: Dict[int, Reminder] = {}
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, exc_type, *_):
+        if exc_type is not None:
+            self.discard()
+            return
+        try:
+            await self.flush()
+        except BaseException:
+            self.discard()
+            raise
+
+    def add(self, reminder: Reminder) -> Reminder:
+        self._reminders[id(reminder)] = reminder
+        return reminder
+
+    async def get(self, id_: int) -> Reminder:
+        """Loaded reminder, which is flushed by this unit of work"""
+        return self.add(await Reminder.by_id(id_))
+
+    def discard(self) -> None:
+        Settings.Reminders.forget(
+            reminder.id for reminder in self._reminders.values() if reminder.id is not None
+        )
+        self._reminders.clear()
+
+    async def flush(self) -> None:
+        new = [reminder for reminder in self._reminders.values() if reminder.id is None]
+        rows = [
+            (None, reminder.validate(), reminder.owner, reminder.text, reminder.rule)
+            for reminder in new
+        ]
+        changed = []
+        for reminder in self._reminders.values():
+            if reminder.id is not None:
+                columns = reminder.changed_columns()
+                if columns:
+                    changed.append((reminder, columns))
+        if rows or changed:
+            try:
+                written, hashes = await Settings.Database.write_committed(
+                    _flush, rows, [(reminder.id, columns) for reminder, columns in changed],
+                    PENDING_LIMIT
+                )
+            except IntegrityError as e:
+                raise ValueError("Owner already has reminder at this time") from e
+            for reminder, (id_, hash_) in zip(new, written):
+                reminder.id, reminder._text_hash = id_, hash_
+                reminder._written()
+            for (reminder, _), hash_ in zip(changed, hashes):
+                if hash_ is not None:
+                    reminder._text_hash = hash_
+                reminder._written()
+        self._reminders.clear()
+
+
+def reminders_changed(ids: Iterable[int]) -> None:
+    """Drops reminders, delivered, deleted or moved by queries, from identity map"""
+    Settings.Reminders.forget(ids)
+
+
+def owner_changed(owner: int) -> None:
+    """Notifies caches, that reminders of owner were created, changed or delivered"""
+    for listener in Settings.owner_listeners:
+        listener(owner)
+
+
+def _begin(connection: Connection) -> None:
+    """
+    Starts own transaction of bulk function on writer connection. Pending
+    writes of group commit are committed first, so rollback doesn't discard them
+    """
+    if connection.in_transaction:
+        connection.commit()
+    connection.execute('BEGIN IMMEDIATE')
+
+
+@contextmanager
+def _savepoint(connection: Connection) -> Iterator[None]:
+    """
+    Atomic writes of one function on writer thread, nested into transaction,
+    that group commit shares between handlers. If block raises, only its
+    writes are rolled back. Transaction is committed by caller, see
+    Database.write_committed
+    """
+    if not connection.in_transaction:
+        # Savepoint out of transaction would commit on release
+        connection.execute('BEGIN IMMEDIATE')
+    connection.execute('SAVEPOINT handler')
+    try:
+        yield
+    except BaseException:
+        connection.execute('ROLLBACK TO handler')
+        connection.execute('RELEASE handler')
+        raise
+    connection.execute('RELEASE handler')
+
+
+def _check_pending(connection: Connection, added: Dict[int, int], limit: Optional[int]) -> None:
+    """Raises PendingLimitError, if owners would have more than limit reminders with added ones"""
+    if limit is None:
+        return
+    for owner, amount in added.items():
+        row = connection.execute(
+            "SELECT count FROM 'pending_counts' WHERE owner = ?", (owner,)
+        ).fetchone()
+        if (0 if row is None else row[0]) + amount > limit:
+            raise PendingLimitError(owner, limit)
+
+
+def _stored_text(connection: Connection, id_: Optional[int], hash_: Optional[int] = None) -> int:
+    """
+    Hash of body of reminder, whose text isn't written. Cached hash of stale
+    reminder may point to body, which triggers already deleted, so hash of
+    stored row is used, and cached one only if row is absent and body exists
+    """
+    if id_ is not None:
+        row = connection.execute("SELECT text_hash FROM 'reminds' WHERE rowid = ?", (id_,)).fetchone()
+        if row is not None:
+            return row[0]
+    if hash_ is None or connection.execute(
+            "SELECT 1 FROM 'reminder_texts' WHERE hash = ?", (hash_,)
+    ).fetchone() is None:
+        raise ValueError("Text of reminder is required")
+    return hash_
+
+
+def _write_reminder(connection: Connection, row: tuple, limit: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Runs on writer thread. Stores body, if it's given, and inserts or
+    updates reminder in one transaction. Returns rowid and hash of body
+    """
+    id_, datetime_float, owner, text, hash_, rule = row
+    with _savepoint(connection):
+        if id_ is None:
+            _check_pending(connection, {owner: 1}, limit)
+        if text is not None:
+            hash_ = store_text(connection, text)
+        else:
+            hash_ = _stored_text(connection, id_, hash_)
+        if id_ is None:
+            (id_,), = connection.execute(
+                "INSERT INTO 'reminds' (datetime, owner, text_hash, rule) "
+                "VALUES (?, ?, ?, ?) RETURNING CAST(rowid AS INTEGER)",
+                (datetime_float, owner, hash_, rule)
+            ).fetchall()
+        else:
+            connection.execute(
+                "INSERT INTO 'reminds' (rowid, datetime, owner, text_hash, rule) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(rowid) DO UPDATE SET "
+                "datetime = excluded.datetime, owner = excluded.owner, "
+                "text_hash = excluded.text_hash, rule = excluded.rule",
+                (id_, datetime_float, owner, hash_, rule)
             )
+    return id_, hash_
+
+
+def _append_reminder(
+        connection: Connection,
+        datetime_float: float,
+        owner: int,
+        text: str,
+        limit: Optional[int] = None
+) -> Optional[Tuple[int, str, int]]:
+    """
+    Runs on writer thread. Creates reminder or appends text to reminder
+    of owner at the same time. Returns rowid, full text and its hash,
+    or None if text would be too long
+    """
+    with _savepoint(connection):
+        existing = connection.execute(
+            "SELECT rowid, text_hash FROM 'reminds' WHERE owner = ? AND datetime = ?",
+            (owner, datetime_float)
+        ).fetchone()
+        if existing is None:
+            _check_pending(connection, {owner: 1}, limit)
+            hash_ = store_text(connection, text)
+            (id_,), = connection.execute(
+                "INSERT INTO 'reminds' (datetime, owner, text_hash) "
+                "VALUES (?, ?, ?) RETURNING CAST(rowid AS INTEGER)",
+                (datetime_float, owner, hash_)
+            ).fetchall()
         else:
-            command = (
-                "INSERT INTO 'reminds' "
-                "(rowid, datetime, owner, text) "
-                "VALUES (?, ?, ?, ?)",
-                (self.id, datetime_float, self.owner, self.text)
+            id_, hash_ = existing
+            text = load_text(connection, hash_) + APPEND_SEPARATOR + text
+            # Nothing is written yet
+            if len(text) > TEXT_LIMIT:
+                return None
+            hash_ = store_text(connection, text)
+            connection.execute(
+                "UPDATE 'reminds' SET text_hash = ? WHERE rowid = ?", (hash_, id_)
+            )
+    return id_, text, hash_
+
+
+def _write_reminders(
+        connection: Connection,
+        rows: List[tuple],
+        limit: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Runs on writer thread, so ids allocation and inserts are atomic.
+    Returns rowid and hash of body of every reminder
+    """
+    with _savepoint(connection):
+        return _insert_reminders(connection, rows, limit)
+
+
+def _flush(
+        connection: Connection,
+        rows: List[tuple],
+        updates: List[Tuple[int, Dict[str, Any]]],
+        limit: Optional[int] = None
+) -> Tuple[List[Tuple[int, int]], List[Optional[int]]]:
+    """
+    Runs on writer thread. Inserts new reminders and updates only changed
+    columns of others, one statement per set of columns, in one transaction.
+    Returns rowids and body hashes of new reminders, and new body hashes of
+    updated ones, None if body wasn't changed
+    """
+    with _savepoint(connection):
+        written = _insert_reminders(connection, rows, limit)
+        hashes = []
+        statements: Dict[Tuple[str, ...], List[tuple]] = {}
+        for id_, columns in updates:
+            hash_ = None
+            if 'text' in columns:
+                columns = dict(columns)
+                hash_ = columns['text_hash'] = store_text(connection, columns.pop('text'))
+            hashes.append(hash_)
+            names = tuple(sorted(columns))
+            statements.setdefault(names, []).append((*(columns[name] for name in names), id_))
+        for names, parameters in statements.items():
+            # Names are keys of _FIELDS and 'text_hash', never user input
+            connection.executemany(
+                f"UPDATE 'reminds' SET {', '.join(f'{name} = ?' for name in names)} "
+                "WHERE rowid = ?",
+                parameters
             )
-        with Settings.Database.cursor() as cur:
-            return cur.execute(*command)
+    return written, hashes
+
+
+def import_reminders(
+        connection: Connection,
+        rows: List[Tuple[float, int, str, Optional[str]]],
+        limit: Optional[int] = PENDING_LIMIT
+) -> Tuple[int, int]:
+    """
+    Runs on writer connection. Inserts validated (timestamp, owner, text, rule)
+    rows in one transaction. Rows at the time of existing reminder of the
+    same owner, and rows above pending limit of owner, are skipped.
+    Returns amounts of inserted rows and of rows skipped because of limit
+    """
+    _begin(connection)
+    try:
+        over_limit = 0
+        if limit is not None:
+            room: Dict[int, int] = {}
+            kept = []
+            for row in rows:
+                owner = row[1]
+                if owner not in room:
+                    count = connection.execute(
+                        "SELECT count FROM 'pending_counts' WHERE owner = ?", (owner,)
+                    ).fetchone()
+                    room[owner] = limit - (0 if count is None else count[0])
+                if room[owner] > 0:
+                    room[owner] -= 1
+                    kept.append(row)
+            over_limit = len(rows) - len(kept)
+            rows = kept
+        hashes: Dict[str, int] = {}
+        for _, _, text, _ in rows:
+            if text not in hashes:
+                hashes[text] = store_text(connection, text)
+        # In order of (owner, datetime) index, so its pages are written once
+        inserted = connection.executemany(
+            "INSERT INTO 'reminds' (datetime, owner, text_hash, rule) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING",
+            sorted(
+                ((timestamp, owner, hashes[text], rule) for timestamp, owner, text, rule in rows),
+                key=lambda row: (row[1], row[0])
+            )
+        ).rowcount
+        # Bodies of skipped rows have no references
+        connection.executemany(
+            "DELETE FROM 'reminder_texts' WHERE hash = ? AND refs <= 0",
+            [(hash_,) for hash_ in hashes.values()]
+        )
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
+    return inserted, over_limit
+
+
+def _insert_reminders(
+        connection: Connection,
+        rows: List[tuple],
+        limit: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """Inserts or replaces reminders within transaction of caller, allocating ids for new ones"""
+    added: Dict[int, int] = {}
+    for id_, _, owner, _, _ in rows:
+        if id_ is None:
+            added[owner] = added.get(owner, 0) + 1
+    _check_pending(connection, added, limit)
+    next_id = connection.execute(
+        "SELECT coalesce(max(rowid), 0) + 1 FROM 'reminds'"
+    ).fetchone()[0]
+    written = []
+    for id_, _, _, text, _ in rows:
+        if text is not None:
+            hash_ = store_text(connection, text)
+        else:
+            hash_ = _stored_text(connection, id_)
+        if id_ is None:
+            id_, next_id = next_id, next_id + 1
+        written.append((id_, hash_))
+    connection.executemany(
+        "INSERT INTO 'reminds' (rowid, datetime, owner, text_hash, rule) "
+        "VALUES (?, ?, ?, ?, ?) ON CONFLICT(rowid) DO UPDATE SET "
+        "datetime = excluded.datetime, owner = excluded.owner, "
+        "text_hash = excluded.text_hash, rule = excluded.rule",
+        [
+            (id_, datetime_float, owner, hash_, rule)
+            for (id_, hash_), (_, datetime_float, owner, _, rule) in zip(written, rows)
+        ]
+    )
+    return written
 
 
 Settings.DB_Reminder = Reminder
+Settings.Reminders = IdentityMap()
+Settings.owner_listeners = []
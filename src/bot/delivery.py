@@ -0,0 +1,269 @@
+"""
+Rate-limited delivery of due reminders. Leased row is deleted from 'reminds'
+only after Telegram accepted the message, so delivery is at-least-once
+"""
+import logging
+from asyncio import Queue, QueueFull, Task, sleep
+from datetime import datetime
+from time import monotonic, time
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+from .settings import Settings
+from .db import owner_changed, reminders_changed
+from .recurrence import Rule
+from .metrics import DELIVERY_LAG, REMINDERS_PER_MESSAGE
+
+
+logger = logging.getLogger(__name__)
+
+# Reminder delivered by queued message: (rowid, datetime, rule)
+REMINDER = Tuple[int, float, str]
+# Claimed row: (rowid, owner, text, datetime, rule)
+ROW = Tuple[int, int, str, float, str]
+
+MESSAGE_LIMIT = 4096
+COALESCED_HEADER = 'Напоминания:'
+
+
+def coalesce(
+        rows: Iterable[ROW],
+        header: str = COALESCED_HEADER,
+        single: Callable[[str, float], str] = lambda text, date: text,
+) -> List[Tuple[int, str, Tuple[REMINDER, ...]]]:
+    """
+    Groups claimed rows by owner into as few messages (owner, text, reminders)
+    as fit into Telegram limit. Lone reminder is formatted by `single`
+    """
+    owners: Dict[int, List[ROW]] = {}
+    for row in rows:
+        owners.setdefault(row[1], []).append(row)
+    messages = []
+    for owner, owned in owners.items():
+        if len(owned) == 1:
+            id_, _, text, date, rule = owned[0]
+            messages.append((owner, single(text, date), ((id_, date, rule),)))
+            continue
+        text, reminders = header, []
+        for id_, _, body, date, rule in owned:
+            date_text = f'{datetime.fromtimestamp(date, Settings.timezone):%d.%m.%y %H:%M}'
+            entry = f'\n\n> На {date_text}:\n{body}'
+            if reminders and len(text) + len(entry) > MESSAGE_LIMIT:
+                messages.append((owner, text, tuple(reminders)))
+                text, reminders = header, []
+            text += entry
+            reminders.append((id_, date, rule))
+        messages.append((owner, text, tuple(reminders)))
+    return messages
+
+
+class TokenBucket:
+    """Allows `rate` actions per second with bursts up to `capacity`"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = monotonic()
+
+    def take(self) -> float:
+        """Takes one token. Returns 0 on success or seconds to wait for next token"""
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while (delay := self.take()) > 0:
+            await sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Takes all tokens, so the next one is given not earlier than in `seconds`"""
+        now = monotonic()
+        tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.tokens, self.updated = min(tokens, 1 - seconds * self.rate), now
+
+    def idle(self) -> bool:
+        return self.tokens + (monotonic() - self.updated) * self.rate >= self.capacity
+
+
+class Sender:
+    """
+    Bounded queue of due reminders drained by fixed amount of workers.
+    Respects global and per-chat rate limits and Telegram RetryAfter errors.
+    Reminders of one owner, claimed together, are sent as one message if `coalesce`
+    """
+    __slots__ = ('bot', 'queue', 'workers', 'retries', 'chat_rate', 'coalesce',
+                 '_global', '_chats', '_in_flight', '_tasks')
+
+    def __init__(
+            self,
+            bot: Bot,
+            workers: int = 16,
+            queue_size: int = 1000,
+            global_rate: float = 30,
+            chat_rate: float = 1,
+            retries: int = 5,
+            coalesce: bool = True,
+    ):
+        self.bot = bot
+        self.coalesce = coalesce
+        self.queue: Queue = Queue(queue_size)
+        self.workers = workers
+        self.retries = retries
+        self.chat_rate = chat_rate
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._in_flight: Set[int] = set()
+        self._tasks: List[Task] = []
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    def free_slots(self) -> int:
+        return self.queue.maxsize - self.queue.qsize()
+
+    async def put(
+            self,
+            id_: int,
+            owner: int,
+            text: str,
+            date: float = None,
+            rule: str = None
+    ) -> None:
+        """Queues reminder, if it's not queued already. Waits while queue is full"""
+        await self.put_group(owner, text, ((id_, date, rule),))
+
+    async def put_rows(self, rows: List[ROW]) -> None:
+        """Queues claimed rows, merged per owner if coalescing is enabled"""
+        if self.coalesce:
+            for owner, text, reminders in coalesce(rows):
+                await self.put_group(owner, text, reminders)
+        else:
+            for row in rows:
+                await self.put(*row)
+
+    async def put_group(self, owner: int, text: str, reminders: Tuple[REMINDER, ...]) -> None:
+        """
+        Queues one message, which delivers several freshly claimed reminders
+        of owner. Reminders are completed or released together
+        """
+        reminders = tuple(reminder for reminder in reminders if reminder[0] not in self._in_flight)
+        if not reminders:
+            return
+        self._in_flight.update(reminder[0] for reminder in reminders)
+        await self.queue.put((owner, text, reminders))
+
+    def notify(self, chat_id: int, text: str) -> bool:
+        """
+        Queues service message, which delivers no reminders, without waiting.
+        Returns False if queue is full and message is dropped
+        """
+        try:
+            self.queue.put_nowait((chat_id, text, ()))
+        except QueueFull:
+            return False
+        return True
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._chats = {
+                    chat: bucket for chat, bucket in self._chats.items()
+                    if not bucket.idle()
+                }
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, 1)
+        return bucket
+
+    async def _send(self, owner: int, text: str) -> bool:
+        """Sends message with retries. Returns False if message should be retried later"""
+        for attempt in range(self.retries):
+            await self._chat_bucket(owner).acquire()
+            await self._global.acquire()
+            try:
+                await self.bot.send_message(owner, text)
+                return True
+            except TelegramRetryAfter as e:
+                # Flood limit is shared, so every worker waits
+                self._global.pause(e.retry_after)
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # User blocked bot or chat doesn't exist, retrying won't help
+                logger.warning('Dropping reminder for chat %s: %s', owner, e)
+                return True
+            except Exception as e:
+                logger.warning('Failed to send reminder to chat %s: %s', owner, e)
+                await sleep(2 ** attempt)
+        return False
+
+    async def _rearm(self, id_: int, date: float, rule: str) -> None:
+        """Moves recurring reminder to its next free occurrence"""
+        rule = Rule.loads(rule)
+        now = datetime.now(Settings.timezone)
+        date = datetime.fromtimestamp(date, Settings.timezone)
+        for _ in range(10):
+            date = rule.next_after(date, now)
+            if await Settings.Leases.rearm(id_, date.timestamp()):
+                Settings.Scheduler.schedule(id_, date.timestamp())
+                return
+            now = date
+        await Settings.Leases.complete(id_)
+
+    async def _deliver(self, owner: int, text: str, reminders: Tuple[REMINDER, ...]) -> None:
+        if not reminders:
+            # Service message, there's nothing to complete or retry
+            await self._send(owner, text)
+            return
+        if await self._send(owner, text):
+            REMINDERS_PER_MESSAGE.observe(len(reminders))
+            now = time()
+            for id_, date, rule in reminders:
+                if date is not None:
+                    DELIVERY_LAG.observe(now - date)
+            once = [id_ for id_, _, rule in reminders if rule is None]
+            if once:
+                await Settings.Leases.complete_many(once)
+            for id_, date, rule in reminders:
+                if rule is not None:
+                    await self._rearm(id_, date, rule)
+            reminders_changed(id_ for id_, *_ in reminders)
+            owner_changed(owner)
+        else:
+            # Rows stay in outbox until retry time, which survives re-claims
+            retry = time() + 2 ** self.retries
+            for id_, *_ in reminders:
+                await Settings.Leases.release(id_, retry)
+                Settings.Scheduler.schedule(id_, retry)
+
+    async def _worker(self) -> None:
+        while True:
+            owner, text, reminders = await self.queue.get()
+            try:
+                await self._deliver(owner, text, reminders)
+            except Exception:
+                logger.exception('Failed to deliver reminders %s', [id_ for id_, *_ in reminders])
+            finally:
+                self._in_flight.difference_update(id_ for id_, *_ in reminders)
+                self.queue.task_done()
+
+    def start(self) -> None:
+        assert not self._tasks, "Sender already started"
+        self._tasks = [
+            Settings.loop.create_task(self._worker())
+            for _ in range(self.workers)
+        ]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
@@ -0,0 +1,227 @@
+"""
+Diagnostics mode for long-running instances: periodic tracemalloc snapshot
+diffs, on-demand sampling CPU profiler and asyncio task counts.
+Enabled by `run_reminderbot --diagnostics` or REMINDERBOT_DIAGNOSTICS=1,
+reports are dumped by /diag command of admins or SIGUSR1
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from threading import Event, Thread, enumerate as threads, get_ident
+from time import monotonic
+from typing import List, Optional
+
+from .settings import Settings
+from .paths import DATA_FOLDER
+
+
+logger = logging.getLogger(__name__)
+
+DIAGNOSTICS_FOLDER = DATA_FOLDER / 'diagnostics'
+
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def _format_diff(new: tracemalloc.Snapshot, old: tracemalloc.Snapshot, limit: int) -> List[str]:
+    stats = new.compare_to(old, 'lineno')
+    total = sum(stat.size_diff for stat in stats)
+    lines = [f'Total difference: {total / 1024:+.1f} KiB']
+    lines.extend(str(stat) for stat in stats[:limit])
+    return lines
+
+
+class SamplingProfiler:
+    """
+    Samples stacks of all threads from separate thread every `interval`
+    seconds. Result is in folded format, accepted by flamegraph tools
+    """
+    __slots__ = ('interval', 'samples', 'started', 'elapsed', '_stop', '_thread')
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.started: Optional[float] = None
+        self.elapsed = 0.0
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.samples.clear()
+        self.elapsed = 0.0
+        self.started = monotonic()
+        self._stop.clear()
+        self._thread = Thread(target=self._sample, name='diagnostics-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.elapsed = monotonic() - self.started
+
+    def _sample(self) -> None:
+        own = get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threads()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 64:
+                    code = frame.f_code
+                    stack.append(f'{code.co_qualname} ({Path(code.co_filename).name}:{frame.f_lineno})')
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def report(self) -> List[str]:
+        elapsed = monotonic() - self.started if self.running else self.elapsed
+        lines = [f'# {sum(self.samples.values())} samples in {elapsed:.1f} s, interval {self.interval} s']
+        lines.extend(f'{stack} {count}' for stack, count in self.samples.most_common())
+        return lines
+
+
+def task_report() -> List[str]:
+    """Counts asyncio tasks by coroutine and reminders waiting in sender"""
+    tasks = Counter(
+        getattr(task.get_coro(), '__qualname__', repr(task.get_coro()))
+        for task in asyncio.all_tasks(Settings.loop)
+    )
+    lines = [f'Tasks: {sum(tasks.values())}']
+    lines.extend(f'  {name}: {count}' for name, count in tasks.most_common())
+    if hasattr(Settings, 'Sender'):
+        # Messages are sent by sender workers, not by separate tasks
+        queued = Settings.Sender.queue.qsize()
+        lines.append(f'Pending sends: {len(Settings.Sender)} (queued {queued}, '
+                     f'sending {len(Settings.Sender) - queued})')
+    if hasattr(Settings, 'Scheduler'):
+        lines.append(f'Scheduled reminders: {len(Settings.Scheduler)}')
+    return lines
+
+
+class Diagnostics:
+    """Periodic memory snapshots, CPU profiler and dumps of both"""
+    __slots__ = ('folder', 'interval', 'keep', 'frames', 'profiler',
+                 '_baseline', '_previous', '_task')
+
+    def __init__(
+            self,
+            folder: Path = DIAGNOSTICS_FOLDER,
+            interval: float = 600,
+            keep: int = 48,
+            frames: int = 1,
+    ):
+        self.folder = folder
+        self.interval = interval
+        self.keep = keep
+        self.frames = frames
+        self.profiler = SamplingProfiler()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        assert self._task is None, "Diagnostics already started"
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._baseline = self._previous = _snapshot()
+        self._task = Settings.loop.create_task(self._cycle())
+        try:
+            Settings.loop.add_signal_handler(signal.SIGUSR1, self.dump)
+            Settings.loop.add_signal_handler(signal.SIGUSR2, self.toggle_profiler)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            # No such signals on Windows
+            pass
+        logger.info('Diagnostics enabled, reports are written to %s', self.folder)
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.profiler.stop()
+        tracemalloc.stop()
+
+    def _write(self, name: str, lines: List[str]) -> Path:
+        path = self.folder / name
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        return path
+
+    def _rotate(self) -> None:
+        periodic = sorted(self.folder.glob('memory-*.txt'))
+        for path in periodic[:-self.keep]:
+            path.unlink(missing_ok=True)
+
+    async def _cycle(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            snapshot = _snapshot()
+            lines = _format_diff(snapshot, self._previous, 25)
+            self._previous = snapshot
+            logger.info('Memory since previous snapshot: %s', lines[0])
+            self._write(f'memory-{datetime.now():%Y%m%d-%H%M%S}.txt', lines)
+            self._rotate()
+
+    def toggle_profiler(self) -> bool:
+        """Starts or stops profiler. Returns whether it's running now"""
+        if self.profiler.running:
+            self.profiler.stop()
+        else:
+            self.profiler.start()
+        return self.profiler.running
+
+    def dump(self) -> Path:
+        """Writes memory, tasks and profiler reports to new folder"""
+        folder = self.folder / f'dump-{datetime.now():%Y%m%d-%H%M%S-%f}'
+        folder.mkdir(parents=True, exist_ok=True)
+        snapshot = _snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        memory = [f'Traced: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB', '',
+                  '# Since start']
+        memory.extend(_format_diff(snapshot, self._baseline, 50))
+        memory.extend(['', '# Since last periodic snapshot'])
+        memory.extend(_format_diff(snapshot, self._previous, 50))
+        memory.extend(['', '# Top allocations'])
+        memory.extend(str(stat) for stat in snapshot.statistics('lineno')[:50])
+        (folder / 'memory.txt').write_text('\n'.join(memory) + '\n', encoding='utf-8')
+        (folder / 'tasks.txt').write_text('\n'.join(task_report()) + '\n', encoding='utf-8')
+        if self.profiler.samples:
+            (folder / 'profile.folded').write_text(
+                '\n'.join(self.profiler.report()) + '\n', encoding='utf-8'
+            )
+        logger.info('Diagnostics dumped to %s', folder)
+        return folder
+
+
+def admins() -> frozenset:
+    """Telegram ids from REMINDERBOT_ADMINS, separated by commas"""
+    return frozenset(
+        int(value) for value in os.environ.get('REMINDERBOT_ADMINS', '').split(',')
+        if value.strip()
+    )
+
+
+Settings.Diagnostics = None
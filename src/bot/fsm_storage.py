@@ -0,0 +1,215 @@
+"""
+aiogram FSM storage on top of reminders database. Hot states are kept in
+LRU cache, changes are written to database in batches
+"""
+import json
+import logging
+from asyncio import Task, sleep
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from time import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from .settings import Settings
+
+
+logger = logging.getLogger(__name__)
+
+_DATETIME_KEY = '$dt'
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        offset = value.utcoffset()
+        return {_DATETIME_KEY: [
+            value.timestamp(),
+            None if offset is None else int(offset.total_seconds())
+        ]}
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _decode(value: Dict[str, Any]) -> Any:
+    if len(value) == 1 and _DATETIME_KEY in value:
+        timestamp, offset = value[_DATETIME_KEY]
+        if offset is None:
+            return datetime.fromtimestamp(timestamp)
+        return datetime.fromtimestamp(timestamp, timezone(timedelta(seconds=offset)))
+    return value
+
+
+def dumps(data: Dict[str, Any]) -> str:
+    """Compact JSON, datetime is stored as timestamp and UTC offset"""
+    return json.dumps(data, default=_encode, separators=(',', ':'), ensure_ascii=False)
+
+
+def loads(data: str) -> Dict[str, Any]:
+    return json.loads(data, object_hook=_decode)
+
+
+class _Record:
+    __slots__ = ('state', 'data', 'updated')
+
+    def __init__(self, state: Optional[str] = None, data: Dict[str, Any] = None, updated: float = 0):
+        self.state = state
+        self.data = {} if data is None else data
+        self.updated = updated
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage, which survives restarts.
+    Conversations untouched for `ttl` seconds are dropped
+    """
+
+    def __init__(
+            self,
+            db,
+            cache_size: int = 10000,
+            flush_interval: float = 1,
+            flush_size: int = 500,
+            ttl: float = 7 * 24 * 60 * 60,
+    ):
+        self.db = db
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.ttl = ttl
+        self._cache: OrderedDict[str, _Record] = OrderedDict()
+        # Changed records, which are not written yet. Survive eviction from cache
+        self._dirty: Dict[str, _Record] = {}
+        self._flushing: Dict[str, _Record] = {}
+        self._task: Optional[Task] = None
+        # Flush started, because changed records reached flush_size
+        self._flush_task: Optional[Task] = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f'{key.bot_id}:{key.chat_id}:{key.user_id}:{key.destiny}'
+
+    async def _get(self, key: StorageKey) -> _Record:
+        key = self._key(key)
+        record = self._cache.get(key)
+        if record is not None:
+            self._cache.move_to_end(key)
+            return record
+        record = self._dirty.get(key) or self._flushing.get(key)
+        if record is None:
+            async with self.db.cursor() as cur:
+                row = await cur.fetchone(
+                    "SELECT state, data, updated FROM 'fsm_states' WHERE key = ?",
+                    (key,)
+                )
+            record = _Record() if row is None else _Record(row[0], loads(row[1]), row[2])
+            # Record could be changed while waiting for database
+            record = self._dirty.get(key) or self._flushing.get(key) or record
+        self._cache[key] = record
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return record
+
+    def _touch(self, key: StorageKey, record: _Record) -> None:
+        record.updated = time()
+        self._dirty[self._key(key)] = record
+        if len(self._dirty) < self.flush_size:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = Settings.loop.create_task(self._background_flush())
+
+    async def set_state(self, bot: Bot, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, bot: Bot, key: StorageKey) -> Optional[str]:
+        return (await self._get(key)).state
+
+    async def set_data(self, bot: Bot, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get(key)
+        record.data = data.copy()
+        self._touch(key, record)
+
+    async def get_data(self, bot: Bot, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get(key)).data.copy()
+
+    async def flush(self) -> None:
+        """
+        Writes all changed records in one transaction. If write fails, records
+        are changed again, unless they were changed meanwhile, and error is raised
+        """
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        self._flushing.update(dirty)
+        upserts = []
+        deletes = []
+        for key, record in dirty.items():
+            if record.state is None and not record.data:
+                deletes.append((key,))
+            else:
+                upserts.append((key, record.state, dumps(record.data), record.updated))
+        try:
+            await self._write(upserts, deletes)
+        except BaseException:
+            for key, record in dirty.items():
+                self._dirty.setdefault(key, record)
+            raise
+        finally:
+            for key, record in dirty.items():
+                if self._flushing.get(key) is record:
+                    del self._flushing[key]
+
+    async def _write(self, upserts: list, deletes: list) -> None:
+        async with self.db.cursor(autocommit=True) as cur:
+            if upserts:
+                await cur.executemany(
+                    "INSERT INTO 'fsm_states' (key, state, data, updated) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                    "state = excluded.state, data = excluded.data, updated = excluded.updated",
+                    upserts
+                )
+            if deletes:
+                await cur.executemany("DELETE FROM 'fsm_states' WHERE key = ?", deletes)
+
+    async def evict(self) -> None:
+        """Drops abandoned conversations from cache and database"""
+        border = time() - self.ttl
+        for key in [key for key, record in self._cache.items() if record.updated < border]:
+            del self._cache[key]
+        async with self.db.cursor(autocommit=True) as cur:
+            await cur.execute("DELETE FROM 'fsm_states' WHERE updated < ?", (border,))
+
+    async def _background_flush(self) -> None:
+        """Flush of background tasks, failed records are written by the next one"""
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception('Failed to write %s FSM states', len(self._dirty))
+
+    async def _cycle(self) -> None:
+        last_eviction = time()
+        while True:
+            await sleep(self.flush_interval)
+            await self._background_flush()
+            if time() - last_eviction > self.ttl / 100:
+                last_eviction = time()
+                try:
+                    await self.evict()
+                except Exception:
+                    logger.exception('Failed to drop abandoned FSM states')
+
+    def start(self) -> None:
+        assert self._task is None, "Storage already started"
+        self._task = Settings.loop.create_task(self._cycle())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._flush_task is not None:
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
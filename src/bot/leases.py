@@ -0,0 +1,136 @@
+"""
+Lease-based claiming of due reminders, so several dispatcher
+processes can share one storage without sending duplicates
+"""
+import logging
+import os
+import socket
+from abc import ABC, abstractmethod
+from asyncio import sleep
+from sqlite3 import IntegrityError
+from typing import List, Optional, Tuple
+
+from .settings import Settings
+from .texts import decode
+
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseBackend(ABC):
+    """Storage of reminders, which hands out due reminders under time-limited lease"""
+    __slots__ = ('worker_id', 'ttl')
+
+    def __init__(self, worker_id: str = None, ttl: float = 120):
+        if worker_id is None:
+            worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.worker_id = worker_id
+        self.ttl = ttl
+
+    @abstractmethod
+    async def claim(self, timestamp: float, limit: int) -> List[Tuple[int, int, str, float, str]]:
+        """
+        Atomically leases up to `limit` reminders, due at timestamp, which are
+        not leased or whose lease expired. Returns (rowid, owner, text, datetime, rule)
+        """
+
+    @abstractmethod
+    async def complete(self, id_: int) -> None:
+        """Removes delivered reminder"""
+
+    async def complete_many(self, ids: List[int]) -> None:
+        """Removes delivered reminders, sent by one message"""
+        for id_ in ids:
+            await self.complete(id_)
+
+    @abstractmethod
+    async def release(self, id_: int, until: Optional[float] = None) -> None:
+        """
+        Gives reminder back without delivering, so it can be claimed again,
+        not before timestamp `until` if it's given
+        """
+
+    @abstractmethod
+    async def rearm(self, id_: int, timestamp: float) -> bool:
+        """
+        Moves delivered recurring reminder to its next occurrence and releases it.
+        Returns False if owner already has reminder at that time
+        """
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    __slots__ = ('db',)
+
+    def __init__(self, db, worker_id: str = None, ttl: float = 120):
+        super().__init__(worker_id=worker_id, ttl=ttl)
+        self.db = db
+
+    async def claim(self, timestamp: float, limit: int) -> List[Tuple[int, int, str, float, str]]:
+        async with self.db.cursor(autocommit=True) as cur:
+            rows = await cur.execute_returning(
+                "UPDATE 'reminds' SET lease_owner = ?, lease_expiry = ? "
+                "WHERE rowid IN ("
+                "SELECT rowid FROM 'reminds' "
+                "WHERE datetime <= ? "
+                "AND (lease_expiry IS NULL OR lease_expiry < ?) "
+                "ORDER BY datetime LIMIT ?"
+                ") RETURNING CAST(rowid AS INTEGER), CAST(owner AS INTEGER), "
+                "(SELECT body FROM 'reminder_texts' WHERE hash = text_hash), "
+                "datetime, rule",
+                (self.worker_id, timestamp + self.ttl, timestamp, timestamp, limit)
+            )
+        claimed = []
+        for id_, owner, body, date, rule in rows:
+            if body is None:
+                # Stays leased, so it doesn't block due reminders of next claims
+                logger.error('Reminder %s has no stored text, skipped', id_)
+                continue
+            claimed.append((id_, owner, decode(body), date, rule))
+        return claimed
+
+    async def complete(self, id_: int) -> None:
+        async with self.db.cursor(autocommit=True) as cur:
+            await cur.execute(
+                "DELETE FROM 'reminds' WHERE rowid = ? AND lease_owner = ?",
+                (id_, self.worker_id)
+            )
+
+    async def complete_many(self, ids: List[int]) -> None:
+        async with self.db.cursor(autocommit=True) as cur:
+            await cur.executemany(
+                "DELETE FROM 'reminds' WHERE rowid = ? AND lease_owner = ?",
+                [(id_, self.worker_id) for id_ in ids]
+            )
+
+    async def release(self, id_: int, until: Optional[float] = None) -> None:
+        async with self.db.cursor(autocommit=True) as cur:
+            # Unowned lease until retry time keeps every dispatcher from claiming it
+            await cur.execute(
+                "UPDATE 'reminds' SET lease_owner = NULL, lease_expiry = ? "
+                "WHERE rowid = ? AND lease_owner = ?",
+                (until, id_, self.worker_id)
+            )
+
+    async def rearm(self, id_: int, timestamp: float) -> bool:
+        try:
+            async with self.db.cursor(autocommit=True) as cur:
+                await cur.execute(
+                    "UPDATE 'reminds' SET datetime = ?, "
+                    "lease_owner = NULL, lease_expiry = NULL "
+                    "WHERE rowid = ? AND lease_owner = ?",
+                    (timestamp, id_, self.worker_id)
+                )
+        except IntegrityError:
+            return False
+        return True
+
+
+async def reclaim_cycle() -> None:
+    """
+    Periodically runs notify functions, so reminders scheduled by other
+    dispatchers, or left by crashed ones, are delivered after lease expiry
+    """
+    while True:
+        await sleep(Settings.Leases.ttl)
+        for func in Settings.Scheduler.notify_list:
+            await func()
@@ -1,66 +1,183 @@
 import asyncio
-import sys
-# import tracemalloc
+import os
+from argparse import ArgumentParser, BooleanOptionalAction
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 from aiogram.utils.token import TokenValidationError
 from datetime import timezone, timedelta, datetime
+from time import perf_counter, time
 
 from .settings import Settings
-from .db import Database
+from .admission import Admission
+from .db import DURABILITY, Database, checkpoint_cycle
+from .delivery import Sender
+from .fsm_storage import SQLiteStorage
+from .leases import SQLiteLeaseBackend, reclaim_cycle
+from .metrics import NOTIFY_LATENCY, instrument, serve
 from .paths import DB_REMINDS
 from .reminders_cycle import start_cycle
+from .startup import catch_up_phase
 
+if TYPE_CHECKING:
+    # Imported by run only when enabled
+    from .diagnostics import Diagnostics
+    from .webhook import Webhook
 
-async def user_notify() -> None:
-    current_time: float = datetime.now(Settings.timezone).timestamp()
-    bot: Bot = Settings.Bot
-    with Settings.Database.cursor(autocommit=True) as cur:
-        reminders = cur.execute(
-            'SELECT rowid, datetime, owner, text '
-            "FROM 'reminds' "
-            f"WHERE datetime < {int(current_time)}"
-        ).fetchall()
 
-        if not reminders:
-            return
+async def user_notify() -> None:
+    """Claims due reminders and queues them to sender. Called by scheduler when earliest reminder is due"""
+    start = perf_counter()
+    try:
+        await _claim_due()
+    finally:
+        NOTIFY_LATENCY.observe(perf_counter() - start)
 
-        cur.execute(
-            "DELETE FROM 'reminds' "
-            f"WHERE datetime < {int(current_time)}"
-        )
 
-    for reminder in reminders:
-        asyncio.create_task(bot.send_message(reminder[2], reminder[3]))
+async def _claim_due() -> None:
+    while True:
+        current_time: float = datetime.now(Settings.timezone).timestamp()
+        # Claiming no more than sender can take, so leases don't expire in queue
+        limit = max(Settings.Sender.free_slots(), 1)
+        reminders = await Settings.Leases.claim(current_time, limit)
+        await Settings.Sender.put_rows(reminders)
+        if len(reminders) < limit:
+            return
 
 
-async def main(token: str) -> None:
-    """Main running function. Creates bot, dispatcher and starts polling"""
+async def main(
+        token: str,
+        diagnostics: 'Diagnostics' = None,
+        webhook: 'Webhook' = None,
+        merge_missed: bool = True,
+        coalesce: bool = True,
+        database: Path = DB_REMINDS,
+        api: TelegramAPIServer = PRODUCTION,
+        durability: str = 'wal',
+        group_commit: Optional[float] = 0,
+        checkpoint_interval: float = 60,
+) -> None:
+    """Main running function. Creates bot, dispatcher and starts polling or webhook"""
+    started = time()
+    Settings.Startup.mark('imports')
     Settings.timezone = timezone(timedelta(hours=3), name='MSK')
-    Settings.Bot = Bot(token=token)
-    Settings.Dispatcher = Dispatcher()
-    Settings.Database = Database(DB_REMINDS.absolute())
+    Settings.Bot = Bot(token=token, session=AiohttpSession(api=api))
+    Settings.Database = Database(
+        database.absolute(), durability=durability, group_commit=group_commit
+    )
+    storage = SQLiteStorage(Settings.Database)
+    Settings.Dispatcher = Dispatcher(storage=storage)
+    Settings.Dispatcher.update.outer_middleware(Settings.Startup.first_update)
+    Settings.Admission = Admission()
+    Settings.Dispatcher.update.outer_middleware(Settings.Admission)
+    Settings.Dispatcher.startup.register(lambda: Settings.Startup.mark('ready'))
+    Settings.Leases = SQLiteLeaseBackend(Settings.Database)
+    Settings.Sender = Sender(Settings.Bot, coalesce=coalesce)
+    # Admin command is registered only if diagnostics are enabled
+    Settings.Diagnostics = diagnostics
     from . import states_functions
-    start_cycle()
-    Settings.minute_notify_list.append(user_notify)
+    Settings.Sender.start()
+    storage.start()
+    instrument()
+    if diagnostics is not None:
+        diagnostics.start()
+    metrics_server = None
+    if os.environ.get('REMINDERBOT_METRICS'):
+        metrics_server = await serve(os.environ['REMINDERBOT_METRICS'])
+    Settings.Scheduler.notify_list.append(user_notify)
+    # Updates are accepted while reminders are loaded and missed ones are sent
+    background = [
+        asyncio.create_task(start_cycle(after=started)),
+        asyncio.create_task(catch_up_phase(started, merge_missed)),
+        asyncio.create_task(reclaim_cycle()),
+        asyncio.create_task(checkpoint_cycle(checkpoint_interval)),
+    ]
     try:
-        await Settings.Dispatcher.start_polling(Settings.Bot)
+        if webhook is not None:
+            await webhook.run(Settings.Bot, Settings.Dispatcher)
+        else:
+            # Telegram refuses getUpdates while webhook is set
+            await Settings.Bot.delete_webhook()
+            await Settings.Dispatcher.start_polling(Settings.Bot)
     finally:
         # Unload instances
+        for task in background:
+            task.cancel()
+        Settings.Scheduler.stop()
+        Settings.Sender.stop()
+        if metrics_server is not None:
+            metrics_server.close()
+        if diagnostics is not None:
+            diagnostics.stop()
         await Settings.Database.unload_instance()
 
 
 def run() -> None:
     """Cli-function to run app with one-line call"""
-    args = sys.argv[1:]
-    if len(args) < 1:
-        raise RuntimeError('To run server, pass token as first argument')
-    token = args[0]
+    parser = ArgumentParser(prog='run_reminderbot')
+    parser.add_argument('token', help='Telegram bot token')
+    parser.add_argument(
+        '--diagnostics', action='store_true',
+        default=os.environ.get('REMINDERBOT_DIAGNOSTICS', '') not in ('', '0'),
+        help='Track memory and allow profiling, also enabled by REMINDERBOT_DIAGNOSTICS=1'
+    )
+    parser.add_argument(
+        '--diagnostics-interval', type=float, default=600,
+        help='Seconds between memory snapshots'
+    )
+    parser.add_argument(
+        '--webhook', metavar='URL',
+        default=os.environ.get('REMINDERBOT_WEBHOOK_URL'),
+        help='Public url of webhook. Bot polls updates if not given'
+    )
+    parser.add_argument('--webhook-host', default='127.0.0.1')
+    parser.add_argument('--webhook-port', type=int, default=8080)
+    parser.add_argument('--webhook-path', default='/webhook')
+    parser.add_argument('--webhook-workers', type=int, default=32,
+                        help='Updates handled at once')
+    parser.add_argument('--merge-missed', action=BooleanOptionalAction, default=True,
+                        help='Send reminders missed during downtime as one message per user')
+    parser.add_argument('--coalesce', action=BooleanOptionalAction, default=True,
+                        help='Send reminders of user, due at once, as one message')
+    parser.add_argument(
+        '--durability', choices=DURABILITY,
+        default=os.environ.get('REMINDERBOT_DURABILITY', 'wal'),
+        help="'wal' survives crash of process, 'wal-full' also power loss, "
+             "'unsafe' may corrupt database. Also set by REMINDERBOT_DURABILITY"
+    )
+    parser.add_argument('--group-commit', action=BooleanOptionalAction, default=True,
+                        help='Commit writes of concurrent handlers in one transaction')
+    parser.add_argument('--group-commit-window', type=float, default=0, metavar='SECONDS',
+                        help='Least time group of commits waits for more handlers')
+    parser.add_argument('--checkpoint-interval', type=float, default=60,
+                        help='Seconds between checkpoints of write-ahead log')
+    args = parser.parse_args()
+    diagnostics = None
+    if args.diagnostics:
+        from .diagnostics import Diagnostics
+        diagnostics = Diagnostics(interval=args.diagnostics_interval)
+    webhook = None
+    if args.webhook:
+        from .webhook import Webhook
+        webhook = Webhook(
+            args.webhook,
+            args.webhook_host,
+            args.webhook_port,
+            args.webhook_path,
+            os.environ.get('REMINDERBOT_WEBHOOK_SECRET'),
+            args.webhook_workers,
+        )
     try:
         loop = asyncio.new_event_loop()
         Settings.loop = loop
-        # tracemalloc.start()
-        loop.run_until_complete(main(token))
+        loop.run_until_complete(main(
+            args.token, diagnostics, webhook, args.merge_missed, args.coalesce,
+            durability=args.durability, group_commit=args.group_commit_window if args.group_commit else None,
+            checkpoint_interval=args.checkpoint_interval,
+        ))
     except TokenValidationError as e:
         raise TokenValidationError('Token is invalid') from e
     except KeyboardInterrupt:
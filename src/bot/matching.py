@@ -0,0 +1,77 @@
+"""
+Fuzzy search of lesson by name. Candidates are selected with trigram
+inverted index, and only they are scored with SequenceMatcher
+"""
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+from heapq import nlargest
+from typing import Any, Dict, List, Set, Tuple
+
+
+def trigrams(string: str) -> Set[str]:
+    padded = f'  {string} '
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+
+class PairMatcher:
+    """
+    Built once from mapping of aliases tuple to lesson.
+    `find` returns (ratio, lesson, alias) of best matching alias
+    """
+    __slots__ = ('_aliases', '_values', '_sizes', '_index',
+                 'candidates', 'default', 'find')
+
+    def __init__(
+            self,
+            pairs: Dict[Tuple[str, ...], Any],
+            default: Any = None,
+            candidates: int = 32,
+            cache_size: int = 1024,
+    ):
+        self._aliases: List[str] = []
+        self._values: List[Any] = []
+        self._sizes: List[int] = []
+        self._index: Dict[str, List[int]] = {}
+        for aliases, value in pairs.items():
+            for alias in aliases:
+                alias_id = len(self._aliases)
+                self._aliases.append(alias)
+                self._values.append(value)
+                grams = trigrams(alias)
+                self._sizes.append(len(grams))
+                for gram in grams:
+                    self._index.setdefault(gram, []).append(alias_id)
+        self.candidates = candidates
+        self.default = default
+        self.find = lru_cache(cache_size)(self._find)
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def _candidates(self, string: str) -> List[int]:
+        if len(self._aliases) <= self.candidates:
+            return list(range(len(self._aliases)))
+        grams = trigrams(string)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._index.get(gram, ()))
+        size = len(grams)
+        # Dice coefficient of trigram sets
+        best = nlargest(
+            self.candidates, shared.items(),
+            key=lambda item: item[1] / (size + self._sizes[item[0]])
+        )
+        # Scoring in definition order, so ties are resolved as in linear scan
+        return sorted(alias_id for alias_id, _ in best)
+
+    def _find(self, string: str) -> Tuple[float, Any, str]:
+        output = (0, self.default, '')
+        matcher = SequenceMatcher(None, '', string)
+        for alias_id in self._candidates(string):
+            # SequenceMatcher caches second sequence, first one is changed
+            matcher.set_seq1(self._aliases[alias_id])
+            ratio = matcher.quick_ratio()
+            if ratio > output[0]:
+                output = (ratio, self._values[alias_id], self._aliases[alias_id])
+        return output
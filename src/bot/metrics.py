@@ -0,0 +1,229 @@
+"""
+In-process metrics with Prometheus text exposition.
+Optional HTTP endpoint is enabled by REMINDERBOT_METRICS=[host:]port
+"""
+import asyncio
+from bisect import bisect_left
+from functools import lru_cache
+from hashlib import blake2b
+from threading import Lock
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+
+from .settings import Settings
+
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+LAG_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 300, 3600)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [
+        f'{name}="{_escape(str(value)[:100])}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Cumulative histogram. Safe to observe from database threads"""
+    __slots__ = ('name', 'help', 'labels', 'buckets', '_series', '_lock')
+
+    def __init__(self, name: str, help_: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_
+        self.labels = labels
+        self.buckets = buckets
+        # Label values: [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        """Amount of observed values"""
+        with self._lock:
+            return int(sum(self._series.get(labels, (0, 0))[:-1]))
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: values.copy() for labels, values in self._series.items()}
+        for labels, values in series.items():
+            total = 0
+            for bound, count in zip((*self.buckets, '+Inf'), values):
+                total += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, labels, le)} {total}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, labels)} {values[-1]}')
+            lines.append(f'{self.name}_count{_labels(self.labels, labels)} {total}')
+        return lines
+
+
+class Gauge:
+    """Value is read from function at scrape time, so updating costs nothing"""
+    __slots__ = ('name', 'help', 'func')
+    type_ = 'gauge'
+
+    def __init__(self, name: str, help_: str, func: Callable[[], float]):
+        self.name = name
+        self.help = help_
+        self.func = func
+
+    def render(self) -> List[str]:
+        try:
+            value = self.func()
+        except Exception:
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type_}', f'{self.name} {value}']
+
+
+class Counter(Gauge):
+    """Total, that only grows, read from function at scrape time. Name should end with _total"""
+    __slots__ = ()
+    type_ = 'counter'
+
+
+class Registry:
+    __slots__ = ('metrics',)
+
+    def __init__(self):
+        self.metrics: List[Histogram | Gauge] = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+SQL_LATENCY = registry.add(Histogram(
+    'reminderbot_sql_seconds', 'Execution time of SQL statement in database thread', ('statement',)
+))
+DELIVERY_LAG = registry.add(Histogram(
+    'reminderbot_delivery_lag_seconds', 'Time of successful send minus reminder datetime',
+    buckets=LAG_BUCKETS
+))
+HANDLER_LATENCY = registry.add(Histogram(
+    'reminderbot_handler_seconds', 'Processing time of update by handler', ('handler',)
+))
+REMINDERS_PER_MESSAGE = registry.add(Histogram(
+    'reminderbot_reminders_per_message', 'Reminders delivered by one sent message',
+    buckets=(1, 2, 3, 5, 10, 20, 50)
+))
+NOTIFY_LATENCY = registry.add(Histogram(
+    'reminderbot_notify_seconds', 'Duration of one user_notify call'
+))
+COMMITS_PER_GROUP = registry.add(Histogram(
+    'reminderbot_commits_per_group', 'Commits of handlers written by one transaction',
+    buckets=(1, 2, 5, 10, 20, 50, 100)
+))
+
+
+def gauge(name: str, help_: str, func: Callable[[], float]) -> None:
+    registry.add(Gauge(name, help_, func))
+
+
+def counter(name: str, help_: str, func: Callable[[], float]) -> None:
+    registry.add(Counter(name, help_, func))
+
+
+@lru_cache(maxsize=512)
+def statement_label(sql: str) -> str:
+    """
+    Beginning of statement and short hash of whole one, so statements,
+    that differ only after beginning, like page queries, have own labels
+    """
+    sql = ' '.join(sql.split())
+    return f'{sql[:60]} #{blake2b(sql.encode(), digest_size=4).hexdigest()}'
+
+
+def timed_call(func: Callable, connection, *args) -> Any:
+    """Runs database function, observing its duration under statement label"""
+    start = perf_counter()
+    try:
+        return func(connection, *args)
+    finally:
+        label = statement_label(args[0]) if args and isinstance(args[0], str) else func.__name__
+        SQL_LATENCY.observe(perf_counter() - start, label)
+
+
+class HandlerTimer(BaseMiddleware):
+    """Inner middleware, measuring every handler of observer it's registered on"""
+
+    async def __call__(
+            self,
+            handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+            event: Any,
+            data: Dict[str, Any]
+    ) -> Any:
+        start = perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_object = data.get('handler')
+            name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+            HANDLER_LATENCY.observe(perf_counter() - start, name)
+
+
+async def _respond(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request = await reader.readline()
+        if request.split(b' ')[1:2] == [b'/metrics']:
+            body = registry.render().encode()
+            status = b'200 OK'
+        else:
+            body = b'Not found\n'
+            status = b'404 Not Found'
+        writer.write(
+            b'HTTP/1.1 ' + status + b'\r\n'
+            b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+            b'Connection: close\r\n\r\n' + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(address: str) -> Optional[asyncio.AbstractServer]:
+    """Starts HTTP endpoint /metrics on '[host:]port'. Binds to localhost by default"""
+    host, _, port = address.rpartition(':')
+    return await asyncio.start_server(_respond, host or '127.0.0.1', int(port))
+
+
+def instrument() -> None:
+    """Registers gauges of running instances and handler timing on dispatcher"""
+    gauge('reminderbot_sender_queue_depth', 'Reminders waiting for sender worker',
+          lambda: Settings.Sender.queue.qsize())
+    gauge('reminderbot_sender_in_flight', 'Reminders queued or being sent',
+          lambda: len(Settings.Sender))
+    gauge('reminderbot_scheduler_pending', 'Entries in scheduler heap',
+          lambda: len(Settings.Scheduler))
+    gauge('reminderbot_admission_users', 'Users with token bucket, which is not refilled',
+          lambda: len(Settings.Admission.users))
+    counter('reminderbot_admission_rejected_total', 'Updates dropped by flood limits since start',
+            lambda: Settings.Admission.rejected)
+    timer = HandlerTimer()
+    Settings.Dispatcher.message.middleware(timer)
+    Settings.Dispatcher.callback_query.middleware(timer)
@@ -0,0 +1,207 @@
+"""
+Ordered schema migrations. Current schema version is kept in PRAGMA user_version
+"""
+from typing import Callable, List
+from sqlite3 import Connection
+from sqlite3 import Cursor as SQLCursor
+
+from .texts import encode, text_hash
+
+
+MIGRATIONS: List[Callable[[SQLCursor], None]] = []
+
+
+def migration(func: Callable[[SQLCursor], None]) -> Callable[[SQLCursor], None]:
+    """Registers function as next migration step. Steps are applied in definition order"""
+    MIGRATIONS.append(func)
+    return func
+
+
+@migration
+def _create_reminds(cur: SQLCursor) -> None:
+    cur.execute("""CREATE TABLE IF NOT EXISTS 'reminds'(
+        datetime REAL NOT NULL,
+        owner INTEGER NOT NULL,
+        text TEXT NOT NULL)""")
+
+
+@migration
+def _index_reminds(cur: SQLCursor) -> None:
+    # Due reminders lookup
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS 'reminds_datetime' "
+        "ON 'reminds'(datetime)"
+    )
+    # Reminders of user, sorted by datetime
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS 'reminds_owner_datetime' "
+        "ON 'reminds'(owner, datetime)"
+    )
+
+
+@migration
+def _lease_reminds(cur: SQLCursor) -> None:
+    # Dispatcher which currently delivers reminder and until when
+    cur.execute("ALTER TABLE 'reminds' ADD COLUMN lease_owner TEXT")
+    cur.execute("ALTER TABLE 'reminds' ADD COLUMN lease_expiry REAL")
+
+
+@migration
+def _create_fsm_states(cur: SQLCursor) -> None:
+    # aiogram FSM state and data of every chat, see fsm_storage.py
+    cur.execute("""CREATE TABLE IF NOT EXISTS 'fsm_states'(
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT NOT NULL,
+        updated REAL NOT NULL) WITHOUT ROWID""")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS 'fsm_states_updated' "
+        "ON 'fsm_states'(updated)"
+    )
+
+
+@migration
+def _unique_owner_datetime(cur: SQLCursor) -> None:
+    # Merging reminders of one owner at one time, as text_date handler does
+    duplicates = cur.execute(
+        "SELECT owner, datetime FROM 'reminds' "
+        "GROUP BY owner, datetime HAVING count(*) > 1"
+    ).fetchall()
+    for owner, datetime in duplicates:
+        rows = cur.execute(
+            "SELECT rowid, text FROM 'reminds' "
+            "WHERE owner = ? AND datetime = ? ORDER BY rowid",
+            (owner, datetime)
+        ).fetchall()
+        cur.execute(
+            "UPDATE 'reminds' SET text = ? WHERE rowid = ?",
+            ('\n---\n'.join(text for _, text in rows), rows[0][0])
+        )
+        cur.executemany(
+            "DELETE FROM 'reminds' WHERE rowid = ?",
+            [(rowid,) for rowid, _ in rows[1:]]
+        )
+    cur.execute("DROP INDEX IF EXISTS 'reminds_owner_datetime'")
+    cur.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS 'reminds_owner_datetime_unique' "
+        "ON 'reminds'(owner, datetime)"
+    )
+
+
+@migration
+def _recurrence_rule(cur: SQLCursor) -> None:
+    # Serialized recurrence.Rule, NULL for one-time reminders
+    cur.execute("ALTER TABLE 'reminds' ADD COLUMN rule TEXT")
+
+
+@migration
+def _split_texts(cur: SQLCursor) -> None:
+    # Bodies are moved out of hot table, see texts.py
+    cur.execute("""CREATE TABLE IF NOT EXISTS 'reminder_texts'(
+        hash INTEGER PRIMARY KEY,
+        body BLOB NOT NULL,
+        refs INTEGER NOT NULL)""")
+    cur.execute("ALTER TABLE 'reminds' ADD COLUMN text_hash INTEGER")
+    last = 0
+    while chunk := cur.execute(
+            "SELECT rowid, text FROM 'reminds' WHERE rowid > ? ORDER BY rowid LIMIT 10000",
+            (last,)
+    ).fetchall():
+        last = chunk[-1][0]
+        hashes = [text_hash(text) for _, text in chunk]
+        cur.executemany(
+            "INSERT INTO 'reminder_texts' (hash, body, refs) VALUES (?, ?, 1) "
+            "ON CONFLICT(hash) DO UPDATE SET refs = refs + 1",
+            [(hash_, encode(text)) for hash_, (_, text) in zip(hashes, chunk)]
+        )
+        cur.executemany(
+            "UPDATE 'reminds' SET text_hash = ? WHERE rowid = ?",
+            [(hash_, rowid) for hash_, (rowid, _) in zip(hashes, chunk)]
+        )
+    cur.execute("ALTER TABLE 'reminds' DROP COLUMN text")
+    # Body is deleted with the last reminder referencing it
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS 'reminds_text_insert'
+        AFTER INSERT ON 'reminds' BEGIN
+            UPDATE 'reminder_texts' SET refs = refs + 1 WHERE hash = new.text_hash;
+        END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS 'reminds_text_update'
+        AFTER UPDATE OF text_hash ON 'reminds'
+        WHEN old.text_hash IS NOT new.text_hash BEGIN
+            UPDATE 'reminder_texts' SET refs = refs + 1 WHERE hash = new.text_hash;
+            UPDATE 'reminder_texts' SET refs = refs - 1 WHERE hash = old.text_hash;
+            DELETE FROM 'reminder_texts' WHERE hash = old.text_hash AND refs <= 0;
+        END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS 'reminds_text_delete'
+        AFTER DELETE ON 'reminds' BEGIN
+            UPDATE 'reminder_texts' SET refs = refs - 1 WHERE hash = old.text_hash;
+            DELETE FROM 'reminder_texts' WHERE hash = old.text_hash AND refs <= 0;
+        END""")
+
+
+@migration
+def _user_groups(cur: SQLCursor) -> None:
+    # Users without row are in default group, see timetable.py
+    cur.execute("""CREATE TABLE IF NOT EXISTS 'user_groups'(
+        owner INTEGER PRIMARY KEY,
+        group_name TEXT NOT NULL)""")
+
+
+@migration
+def _pending_counts(cur: SQLCursor) -> None:
+    # Amount of reminders of every owner, so limit is checked without COUNT(*)
+    cur.execute("""CREATE TABLE IF NOT EXISTS 'pending_counts'(
+        owner INTEGER PRIMARY KEY,
+        count INTEGER NOT NULL)""")
+    cur.execute(
+        "INSERT INTO 'pending_counts' (owner, count) "
+        "SELECT owner, count(*) FROM 'reminds' GROUP BY owner"
+    )
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS 'reminds_count_insert'
+        AFTER INSERT ON 'reminds' BEGIN
+            INSERT INTO 'pending_counts' (owner, count) VALUES (new.owner, 1)
+            ON CONFLICT(owner) DO UPDATE SET count = count + 1;
+        END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS 'reminds_count_update'
+        AFTER UPDATE OF owner ON 'reminds'
+        WHEN old.owner IS NOT new.owner BEGIN
+            INSERT INTO 'pending_counts' (owner, count) VALUES (new.owner, 1)
+            ON CONFLICT(owner) DO UPDATE SET count = count + 1;
+            UPDATE 'pending_counts' SET count = count - 1 WHERE owner = old.owner;
+            DELETE FROM 'pending_counts' WHERE owner = old.owner AND count <= 0;
+        END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS 'reminds_count_delete'
+        AFTER DELETE ON 'reminds' BEGIN
+            UPDATE 'pending_counts' SET count = count - 1 WHERE owner = old.owner;
+            DELETE FROM 'pending_counts' WHERE owner = old.owner AND count <= 0;
+        END""")
+
+
+def get_version(connection: Connection) -> int:
+    return connection.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(connection: Connection) -> int:
+    """Applies all missing migrations, each one in separate transaction. Returns new version"""
+    version = get_version(connection)
+    if version > len(MIGRATIONS):
+        raise RuntimeError(
+            f'Database schema version {version} is newer than '
+            f'latest known version {len(MIGRATIONS)}'
+        )
+    for number, step in enumerate(MIGRATIONS[version:], start=version+1):
+        cur = connection.cursor()
+        try:
+            # Other process sharing database file may have applied step already
+            cur.execute('BEGIN IMMEDIATE')
+            if get_version(connection) >= number:
+                connection.commit()
+                continue
+            step(cur)
+            cur.execute(f'PRAGMA user_version = {number}')
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            cur.close()
+    return len(MIGRATIONS)
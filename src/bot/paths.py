@@ -6,5 +6,13 @@ DATA_FOLDER = ROOT / 'data'
 
 DB_REMINDS = DATA_FOLDER / 'reminds.db'
 
+STATIC_FOLDER = ROOT / 'static'
+
+TRANSLATIONS = STATIC_FOLDER / 'translations.json'
+
+CATALOGS = STATIC_FOLDER / 'catalogs'
+
+TIMETABLES = STATIC_FOLDER / 'timetables'
+
 
 DATA_FOLDER.mkdir(exist_ok=True)
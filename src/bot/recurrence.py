@@ -0,0 +1,96 @@
+"""
+Recurrence rules of reminders. Rule is stored in 'rule' column of the
+only row of reminder, and only its next occurrence is kept in 'datetime'
+"""
+import re
+from datetime import datetime, timedelta, tzinfo
+from typing import Optional
+
+
+_UNITS = (
+    ('мин', 60),
+    ('час', 60 * 60),
+    ('дн', 24 * 60 * 60),
+    ('ден', 24 * 60 * 60),
+    ('сут', 24 * 60 * 60),
+    ('нед', 7 * 24 * 60 * 60),
+)
+_INTERVAL = re.compile(r'^(?:кажд\w*\s+)?(\d+)?\s*([а-яё]+)$')
+
+
+class Rule:
+    """
+    Either every `step` seconds, or weekly on `weekday` at `minute` of the day.
+    Serialized as 'every:<seconds>' or 'weekly:<weekday>:<minute>'
+    """
+    __slots__ = ('kind', 'step', 'weekday', 'minute')
+
+    def __init__(self, kind: str, step: int = None, weekday: int = None, minute: int = None):
+        if kind == 'every':
+            if step is None or step < 60:
+                raise ValueError("Interval can't be shorter than minute")
+        elif kind == 'weekly':
+            if not 0 <= weekday < 7 or not 0 <= minute < 24 * 60:
+                raise ValueError("Invalid weekday or time of weekly rule")
+        else:
+            raise ValueError(f'Unknown rule kind {kind}')
+        self.kind = kind
+        self.step = step
+        self.weekday = weekday
+        self.minute = minute
+
+    @classmethod
+    def every(cls, seconds: int) -> 'Rule':
+        return cls('every', step=seconds)
+
+    @classmethod
+    def weekly(cls, weekday: int, start_time: str) -> 'Rule':
+        """Start time is in format of PAIR_TUPLE, e.g. '9:00'"""
+        hours, minutes = start_time.split(':')
+        return cls('weekly', weekday=weekday, minute=int(hours) * 60 + int(minutes))
+
+    @classmethod
+    def loads(cls, string: str) -> 'Rule':
+        kind, *values = string.split(':')
+        if kind == 'every':
+            return cls(kind, step=int(values[0]))
+        return cls(kind, weekday=int(values[0]), minute=int(values[1]))
+
+    def dumps(self) -> str:
+        if self.kind == 'every':
+            return f'every:{self.step}'
+        return f'weekly:{self.weekday}:{self.minute}'
+
+    def next_after(self, previous: datetime, now: datetime) -> datetime:
+        """First occurrence later than now. Missed occurrences are skipped"""
+        if self.kind == 'every':
+            skipped = max(0, int((now - previous).total_seconds() // self.step))
+            return previous + timedelta(seconds=self.step * (skipped + 1))
+        return self.first_after(now, now.tzinfo)
+
+    def first_after(self, now: datetime, tz: tzinfo) -> datetime:
+        """First occurrence of rule later than now"""
+        if self.kind == 'every':
+            return now + timedelta(seconds=self.step)
+        now = now.astimezone(tz)
+        date = now.replace(
+            hour=self.minute // 60, minute=self.minute % 60, second=0, microsecond=0
+        ) + timedelta(days=(self.weekday - now.weekday()) % 7)
+        if date <= now:
+            date += timedelta(days=7)
+        return date
+
+
+def parse_interval(text: str) -> Optional[Rule]:
+    """Reads interval like '30 минут', 'каждые 2 часа', 'неделя'"""
+    match = _INTERVAL.match(text.strip().casefold())
+    if match is None:
+        return None
+    amount, unit = match.groups()
+    for prefix, seconds in _UNITS:
+        if unit.startswith(prefix):
+            try:
+                return Rule.every(int(amount or 1) * seconds)
+            except ValueError:
+                return None
+    return None
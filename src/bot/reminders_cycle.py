@@ -1,27 +1,174 @@
-from typing import List
-from asyncio import AbstractEventLoop, iscoroutinefunction
-from threading import Thread
-from datetime import datetime
-from time import sleep
+from typing import Dict, List, Optional, Tuple
+from array import array
+from math import ceil
+from asyncio import Event, Task, TimeoutError, iscoroutinefunction, wait_for
+from bisect import bisect_left, bisect_right, insort
+from itertools import groupby
+from time import time
 
 from .settings import Settings
 
 
-_MINUTE_CHANGE_NOTIFY_LIST: List[callable] = []
+# Width of bucket in seconds. Timestamps are stored as milliseconds from
+# bucket start, rounded up, so reminder is never considered due too early
+BUCKET = 3600
+LOAD_CHUNK = 50_000
 
+BUCKET_ARRAYS = Tuple[array, array]
 
-def _cycle():
-    assert hasattr(Settings, 'loop'), "Settings doesn't have asyncio loop"
-    loop: AbstractEventLoop = Settings.loop
-    while True:
-        sleep(60 - datetime.now().second)
-        for func in _MINUTE_CHANGE_NOTIFY_LIST:
-            assert iscoroutinefunction(func), "All function in list should be asynchronous"
-            loop.create_task(func())
 
+class Scheduler:
+    """
+    Keeps timestamps and rowids of upcoming reminders in hourly buckets of
+    compact arrays (12 bytes per reminder) and runs notify functions exactly
+    when the earliest of them is due. Texts and owners stay in database
+    """
+    __slots__ = ('_keys', '_buckets', '_sorted', '_size', '_earliest',
+                 '_wakeup', '_task', 'notify_list')
 
-def start_cycle():
-    Thread(target=_cycle, daemon=True).start()
+    def __init__(self):
+        # Sorted bucket numbers, timestamp // BUCKET
+        self._keys: List[int] = []
+        # Bucket number: (array('I') offsets, array('q') rowids). Only
+        # current bucket is sorted, so due reminders are found by bisect
+        self._buckets: Dict[int, BUCKET_ARRAYS] = {}
+        self._sorted: Optional[int] = None
+        self._size = 0
+        self._earliest = float('inf')
+        self._wakeup = Event()
+        self._task: Optional[Task] = None
+        self.notify_list: List[callable] = []
 
+    def __len__(self) -> int:
+        return self._size
 
-Settings.minute_notify_list = _MINUTE_CHANGE_NOTIFY_LIST
+    def _bucket(self, key: int) -> BUCKET_ARRAYS:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = (array('I'), array('q'))
+            insort(self._keys, key)
+        return bucket
+
+    def _add(self, id_: int, timestamp: float) -> float:
+        """Returns timestamp as it's stored"""
+        key = int(timestamp // BUCKET)
+        offsets, ids = self._bucket(key)
+        offset = ceil((timestamp - key * BUCKET) * 1000)
+        if key == self._sorted:
+            index = bisect_right(offsets, offset)
+            offsets.insert(index, offset)
+            ids.insert(index, id_)
+        else:
+            offsets.append(offset)
+            ids.append(id_)
+        self._size += 1
+        return key * BUCKET + offset / 1000
+
+    async def load(self, db, after: float = float('-inf')) -> None:
+        """Fills buckets with reminders from database, due after timestamp, in chunks"""
+        key = (after, -1)
+        while True:
+            async with db.cursor() as cur:
+                rows = await cur.fetchall(
+                    "SELECT datetime, rowid FROM 'reminds' "
+                    "WHERE (datetime, rowid) > (?, ?) "
+                    "ORDER BY datetime, rowid LIMIT ?",
+                    (*key, LOAD_CHUNK)
+                )
+            # Rows are ordered, so every bucket is extended at once
+            for key, group in groupby(rows, lambda row: int(row[0] // BUCKET)):
+                offsets, ids = self._bucket(key)
+                start = key * BUCKET
+                for timestamp, id_ in group:
+                    offsets.append(ceil((timestamp - start) * 1000))
+                    ids.append(id_)
+            self._size += len(rows)
+            if len(rows) < LOAD_CHUNK:
+                break
+            key = rows[-1]
+        self._earliest = self._find_earliest()
+        self._wakeup.set()
+
+    def schedule(self, id_: int, timestamp: float) -> None:
+        """Adds reminder to index. Should be called on every write of reminder datetime"""
+        timestamp = self._add(id_, timestamp)
+        if timestamp < self._earliest:
+            self._earliest = timestamp
+            self._wakeup.set()
+
+    def _find_earliest(self) -> float:
+        if not self._keys:
+            return float('inf')
+        key = self._keys[0]
+        offsets = self._buckets[key][0]
+        return key * BUCKET + (offsets[0] if key == self._sorted else min(offsets)) / 1000
+
+    def pop_due(self, timestamp: float) -> array:
+        """Removes from index and returns ids of all reminders due at timestamp"""
+        due = array('q')
+        current = int(timestamp // BUCKET)
+        # Buckets before current one are entirely due
+        end = bisect_left(self._keys, current)
+        for key in self._keys[:end]:
+            due.extend(self._buckets.pop(key)[1])
+        del self._keys[:end]
+        if self._keys and self._keys[0] == current:
+            offsets, ids = self._buckets[current]
+            if self._sorted != current:
+                pairs = sorted(zip(offsets, ids))
+                offsets = array('I', (offset for offset, _ in pairs))
+                ids = array('q', (id_ for _, id_ in pairs))
+                self._buckets[current] = (offsets, ids)
+                self._sorted = current
+            end = bisect_right(offsets, (timestamp - current * BUCKET) * 1000)
+            due.extend(ids[:end])
+            del offsets[:end]
+            del ids[:end]
+            if not ids:
+                del self._buckets[current]
+                del self._keys[0]
+        self._size -= len(due)
+        self._earliest = self._find_earliest()
+        return due
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._keys:
+                await self._wakeup.wait()
+                continue
+            delay = self._earliest - time()
+            if delay > 0:
+                # Earlier reminder can be scheduled while sleeping
+                try:
+                    await wait_for(self._wakeup.wait(), delay)
+                except TimeoutError:
+                    pass
+                continue
+            if not self.pop_due(time()):
+                continue
+            for func in self.notify_list:
+                assert iscoroutinefunction(func), "All function in list should be asynchronous"
+                Settings.loop.create_task(func())
+
+    def start(self) -> None:
+        assert hasattr(Settings, 'loop'), "Settings doesn't have asyncio loop"
+        assert self._task is None, "Scheduler already started"
+        self._task = Settings.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+async def start_cycle(after: float = float('-inf')) -> None:
+    """
+    Loads upcoming reminders from database and starts scheduler.
+    Reminders due before `after` are left to catch-up
+    """
+    await Settings.Scheduler.load(Settings.Database, after)
+    Settings.Scheduler.start()
+
+
+Settings.Scheduler = Scheduler()
@@ -0,0 +1,85 @@
+"""
+Startup phases: time from process start to first handled update, and
+catch-up of reminders missed while bot was down.
+Imported by package before anything else, so import time is counted
+"""
+from time import perf_counter
+
+STARTED = perf_counter()
+
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict
+
+from .settings import Settings
+from .delivery import coalesce
+
+
+logger = logging.getLogger(__name__)
+
+LATE_HEADER = 'Пропущенное напоминание на {:%d.%m.%y %H:%M}:\n'
+MERGED_HEADER = 'Пока бот был недоступен, вы пропустили напоминания:'
+
+
+class StartupTimer:
+    """Seconds since process start, when every phase was first reached"""
+    __slots__ = ('phases',)
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> None:
+        if phase not in self.phases:
+            self.phases[phase] = perf_counter() - STARTED
+            logger.info('Startup: %s after %.3f s', phase, self.phases[phase])
+
+    async def first_update(
+            self,
+            handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+            event: Any,
+            data: Dict[str, Any]
+    ) -> Any:
+        """Outer middleware of updates"""
+        try:
+            return await handler(event, data)
+        finally:
+            self.mark('first_update')
+
+
+def late_text(text: str, date: float) -> str:
+    return LATE_HEADER.format(datetime.fromtimestamp(date, Settings.timezone)) + text
+
+
+async def catch_up(started: float, merge_per_user: bool = True) -> int:
+    """
+    Claims reminders due before start in chunks, no larger than free space
+    of sender queue, and queues them tagged as late. Returns amount of reminders
+    """
+    total = 0
+    while True:
+        limit = max(Settings.Sender.free_slots(), 1)
+        rows = await Settings.Leases.claim(started, limit)
+        total += len(rows)
+        if merge_per_user:
+            messages = coalesce(rows, MERGED_HEADER, late_text)
+        else:
+            messages = [
+                (owner, late_text(text, date), ((id_, date, rule),))
+                for id_, owner, text, date, rule in rows
+            ]
+        for owner, text, reminders in messages:
+            await Settings.Sender.put_group(owner, text, reminders)
+        if len(rows) < limit:
+            return total
+
+
+async def catch_up_phase(started: float, merge_per_user: bool = True) -> None:
+    """Runs catch-up beside polling and reports when backlog is sent"""
+    missed = await catch_up(started, merge_per_user)
+    Settings.Startup.mark('caught_up')
+    await Settings.Sender.queue.join()
+    Settings.Startup.mark('drained')
+    logger.info('Delivered %s reminders missed during downtime', missed)
+
+
+Settings.Startup = StartupTimer()
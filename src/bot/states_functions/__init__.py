@@ -1,6 +1,12 @@
 """
 Contains all states functions
 """
+# Registers Settings.Translations used by all handlers
+from .. import translations
 from . import main
+# Commands go before handlers of states, which take any text
+from . import diagnostics
+from . import group_choosing
+from . import exporting
 from . import reminder_creating
 from . import reminder_viewing
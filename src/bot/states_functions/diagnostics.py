@@ -0,0 +1,29 @@
+"""
+Admin command of diagnostics mode, registered only when it's enabled
+"""
+from aiogram import Dispatcher, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from ..settings import Settings
+
+
+form_router: Dispatcher = Settings.Dispatcher
+
+
+if getattr(Settings, 'Diagnostics', None) is not None:
+    # Imported only in diagnostics mode, as it loads tracemalloc and profiler
+    from ..diagnostics import admins, task_report
+
+    @form_router.message(
+        Command('diag'),
+        F.from_user.id.in_(admins()),
+    )
+    async def diagnostics(message: Message, command: CommandObject) -> None:
+        """/diag dumps reports, /diag profile starts or stops CPU profiler"""
+        if command.args == 'profile':
+            running = Settings.Diagnostics.toggle_profiler()
+            await message.answer('Профилировщик запущен' if running else 'Профилировщик остановлен')
+            return
+        folder = Settings.Diagnostics.dump()
+        await message.answer('\n'.join([f'Отчёт сохранён в {folder}', *task_report()]))
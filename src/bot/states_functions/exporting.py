@@ -0,0 +1,26 @@
+"""
+Export of reminders of user as JSONL document, same format as bulk import reads
+"""
+from aiogram import Dispatcher
+from aiogram.filters import Command
+from aiogram.types import BufferedInputFile, Message
+
+from ..settings import Settings
+from ..transfer import export_owner
+
+
+form_router: Dispatcher = Settings.Dispatcher
+tr = Settings.Translations
+
+
+@form_router.message(Command('export'))
+async def export(message: Message) -> None:
+    """/export sends all reminders of user as file"""
+    data = await Settings.Database.read(export_owner, message.from_user.id)
+    if not data:
+        await message.answer(tr(message, 'У вас нет напоминаний'))
+        return
+    await message.answer_document(
+        BufferedInputFile(data, filename='reminders.jsonl'),
+        caption=tr(message, 'Ваши напоминания:')
+    )
@@ -0,0 +1,33 @@
+"""
+Binding of user to group, whose timetable is used to find lessons
+"""
+from aiogram import Dispatcher
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from ..settings import Settings
+from ..timetable import set_user_group, user_group
+
+
+form_router: Dispatcher = Settings.Dispatcher
+tr = Settings.Translations
+
+
+@form_router.message(Command('group'))
+async def choose_group(message: Message, command: CommandObject) -> None:
+    """/group shows current and available groups, /group <name> chooses group"""
+    groups = Settings.Timetables.groups()
+    if not command.args:
+        await message.answer(tr(
+            message,
+            'Ваша группа: {group}\n'
+            'Доступные группы: {groups}\n'
+            'Выберите группу командой /group <название>'
+        ).format(group=await user_group(message.from_user.id), groups=', '.join(groups)))
+        return
+    group = command.args.strip()
+    if group not in groups:
+        await message.answer(tr(message, 'Нет расписания группы {group}').format(group=group))
+        return
+    await set_user_group(message.from_user.id, group)
+    await message.answer(tr(message, 'Выбрана группа {group}').format(group=group))
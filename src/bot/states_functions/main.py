@@ -19,6 +19,7 @@ Settings.Form = Form
 
 
 form_router: Dispatcher = Settings.Dispatcher
+tr = Settings.Translations
 
 
 @form_router.message(Command('start'))
@@ -26,10 +27,10 @@ async def start(message: Message, state: FSMContext) -> None:
     current_state = await state.get_state()
     answer = 'Привет!' if current_state is None else 'Главное меню'
     await message.answer(
-        answer,
+        tr(message, answer),
         reply_markup=ReplyKeyboardMarkup(keyboard=[[
-            KeyboardButton(text='Создать напоминание'),
-            KeyboardButton(text='Просмотреть напоминания'),
+            KeyboardButton(text=tr(message, 'Создать напоминание')),
+            KeyboardButton(text=tr(message, 'Просмотреть напоминания')),
         ]], resize_keyboard=True)
     )
     await state.set_state(Form.main)
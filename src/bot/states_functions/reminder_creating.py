@@ -1,11 +1,10 @@
 import asyncio
-import sqlite3
-from datetime import datetime, timedelta
+import logging
+from datetime import datetime
+from typing import Optional
 from io import StringIO
-from typing import Optional, List
-from difflib import SequenceMatcher
 
-from aiogram import Dispatcher, F
+from aiogram import Dispatcher
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import (
@@ -16,12 +15,20 @@ from aiogram.types import (
 )
 
 from ..settings import Settings
+from ..dates import TOO_FAR, DateParser
+from ..db import DateRangeError, PendingLimitError, UnitOfWork
+from ..recurrence import Rule, parse_interval
+from ..timetable import Timetable, user_timetable
+from ..translations import Button
 from . import _constants
 
 
+logger = logging.getLogger(__name__)
+
 form_router: Dispatcher = Settings.Dispatcher
 MainForm: StatesGroup = Settings.Form
 ReminderDB = Settings.DB_Reminder
+tr = Settings.Translations
 
 
 class NewReminderStates(StatesGroup):
@@ -37,14 +44,15 @@ class NewReminderStates(StatesGroup):
 
 @form_router.message(
     MainForm.main,
-    F.text.casefold() == 'создать напоминание'
+    Button('Создать напоминание')
 )
 async def new_reminder(message: Message, state: FSMContext) -> None:
     await message.answer(
-        'Каким образом задать время напоминания?',
+        tr(message, 'Каким образом задать время напоминания?'),
         reply_markup=ReplyKeyboardMarkup(keyboard=[[
-            KeyboardButton(text='Дата и время'),
-            KeyboardButton(text='До пары'),
+            KeyboardButton(text=tr(message, 'Дата и время')),
+            KeyboardButton(text=tr(message, 'До пары')),
+            KeyboardButton(text=tr(message, 'Интервал')),
         ]], resize_keyboard=True)
     )
     await state.set_state(NewReminderStates.main)
@@ -52,20 +60,24 @@ async def new_reminder(message: Message, state: FSMContext) -> None:
 
 @form_router.message(
     NewReminderStates.main,
-    F.text.casefold() == 'дата и время'
+    Button('Дата и время')
 )
 async def new_date(message: Message, state: FSMContext) -> None:
-    current_date = datetime.now(Settings.timezone)
     await message.answer(
-        'Введите дату в формате ДД.ММ.ГГ ЧЧ:ММ, где:\n'
-        '• Д - номер дня месяца\n'
-        '• М - номер месяца\n'
-        '• Г - номер года\n'
-        '• Ч - час напоминания\n'
-        '• М - минута напоминания\n'
-        'Дата обязательно, время необязательно. В случае '
-        'отсутствия времени устанавливается текущее.\n'
-        f'Текущая дата и время (MSK): {current_date:%d.%m.%y %H:%M}',
+        tr(
+            message,
+            'Введите дату в формате ДД.ММ.ГГ ЧЧ:ММ, где:\n'
+            '• Д - номер дня месяца\n'
+            '• М - номер месяца\n'
+            '• Г - номер года\n'
+            '• Ч - час напоминания\n'
+            '• М - минута напоминания\n'
+            'Дата обязательно, время необязательно. В случае '
+            'отсутствия времени устанавливается текущее.\n'
+            'Также можно написать "через 2 часа", "завтра в 9" '
+            'или "в среду в 10:40".\n'
+            'Текущая дата и время (MSK): {now:%d.%m.%y %H:%M}'
+        ).format(now=datetime.now(Settings.timezone)),
         reply_markup=ReplyKeyboardRemove()
     )
     await state.set_state(NewReminderStates.new_date)
@@ -73,12 +85,15 @@ async def new_date(message: Message, state: FSMContext) -> None:
 
 @form_router.message(
     NewReminderStates.main,
-    F.text.casefold() == 'до пары'
+    Button('До пары')
 )
 async def new_pair(message: Message, state: FSMContext) -> None:
     await message.answer(
-        'Введите название пары, например:\n'
-        '• трпп лекция\n• теория програмных\n• теор вер',
+        tr(
+            message,
+            'Введите название пары, например:\n'
+            '• трпп лекция\n• теория програмных\n• теор вер'
+        ),
         reply_markup=ReplyKeyboardRemove()
     )
     await state.set_state(NewReminderStates.new_pair)
@@ -86,105 +101,45 @@ async def new_pair(message: Message, state: FSMContext) -> None:
 
 @form_router.message(
     NewReminderStates.main,
-    F.text.casefold() == 'интервал'
+    Button('Интервал')
 )
 async def new_interval(message: Message, state: FSMContext) -> None:
     await message.answer(
-        'Введите дату в формате ДД.ММ.ГГ ЧЧ:ММ, где:\n',
-        reply_markup=ReplyKeyboardMarkup(keyboard=[[
-            KeyboardButton(text='Coci'),
-        ]], resize_keyboard=True)
+        tr(
+            message,
+            'Введите интервал повторения, например:\n'
+            '• 30 минут\n• каждые 2 часа\n• 3 дня\n• неделя\n'
+            'Или название пары, чтобы напоминать о ней каждую неделю'
+        ),
+        reply_markup=ReplyKeyboardRemove()
     )
     await state.set_state(NewReminderStates.new_interval)
 
 
-async def analyze_date(message: Message) -> Optional[datetime | List[str]]:
-    answer: List[str] = []
-    current = datetime.now(Settings.timezone)
-    text = message.text
-    try:
-        day = int(text[0:2])
-    except ValueError:
-        await message.answer(f'Не смог прочитать день напоминания: "{text[0:2]}"')
-        return
-    try:
-        month = int(text[3:5])
-    except ValueError:
-        await message.answer(f'Не смог прочитать месяц напоминания: "{text[3:5]}"')
-        return
-    try:
-        year = int(text[6:8])
-    except ValueError:
-        await message.answer(f'Не смог прочитать год напоминания: "{text[6:8]}"')
-        return
-
-    hour = text[9:11]
-    if hour:
-        try:
-            hour = int(hour)
-        except ValueError:
-            await message.answer(f'Не смог прочитать час напоминания: "{hour}"')
-            return
-        try:
-            minute = int(text[12:15])
-        except ValueError:
-            await message.answer(f'Не смог прочитать минуты напоминания: "{text[6:8]}"')
-            return
-    else:
-        hour = 0
-        minute = 0
-
-    if 1 > day < 31:
-        answer.append('\nДень месяца должен быть числом от 01 до 31')
-    if 1 > month < 12:
-        answer.append('\nМесяц должен быть числом от 01 до 12')
-    if 1 > year < 99:
-        answer.append(f'\nГод должен быть числом от {current.year} до {current.year+1}')
-    if 0 > hour < 24:
-        answer.append(f'\nЧас должен быть от 0 до 24')
-    if 0 > minute < 60:
-        answer.append(f'\nМинуты должны быть от 0 до 60')
-
-    if answer:
-        return answer
-
-    return datetime(
-        day=day,
-        month=month,
-        year=year+2000,
-        hour=hour,
-        minute=minute,
-        tzinfo=Settings.timezone
-    )
+date_parser = DateParser(_constants.WEEK_NAMES)
 
 
 @form_router.message(NewReminderStates.new_date)
 async def read_date(message: Message, state: FSMContext) -> None:
     date = (await state.get_data()).get('date')
     if date is None:
-        date = await analyze_date(message)
-
-    current = datetime.now(Settings.timezone)
+        date = date_parser.parse(message.text, datetime.now(Settings.timezone))
 
     if isinstance(date, list):
+        # All errors are sent in one message
         await message.answer(
-            "Были встречены следующий ошибки при чтение даты и времени:"
-            ''.join(date)
+            tr(message, 'Были встречены следующие ошибки при чтении даты и времени:')
+            + ''.join(f'\n• {tr(message, error.message)}: "{error.value}"' for error in date)
         )
         await state.set_state(NewReminderStates.main)
         return await new_reminder(message=message, state=state)
-    if isinstance(date, datetime):
-        if date.hour == 0 and date.minute == 0:
-            date.replace(hour=current.hour, minute=current.minute)
-        await message.answer(
-            "Выбраны дата и время: "
-            f'{date.day} {Settings.months[date.month]} {date:%Y} года {date:%H:%M}.'
-            '\nВведите текст напоминания'
-        )
-        await state.set_state(NewReminderStates.text_date)
-        return await state.set_data({'date': date})
-
-    await new_date(message=message, state=state)
+    await message.answer(tr(
+        message,
+        'Выбраны дата и время: {date.day} {month} {date:%Y} года {date:%H:%M}.'
+        '\nВведите текст напоминания'
+    ).format(date=date, month=tr(message, Settings.months[date.month])))
+    await state.set_state(NewReminderStates.text_date)
+    return await state.set_data({'date': date})
 
 
 @form_router.message(NewReminderStates.text_date)
@@ -193,51 +148,37 @@ async def text_date(message: Message, state: FSMContext) -> None:
     assert date is not None
 
     if len(message.text) > 2000:
-        await message.answer("Слишком много символов")
-        await read_date(message=message, state=state)
-
-    db = Settings.Database
-    with db.cursor() as cur:
-        cur: sqlite3.Cursor
-        reminder: tuple = cur.execute(
-            "SELECT ROWID, owner, datetime, text FROM reminds "
-            f"WHERE OWNER=? and datetime=?",
-            (message.from_user.id, int(date.timestamp()))
-        ).fetchone()
-
-    if reminder:
-        reminder: list = list(reminder)
-        reminder[2] = datetime.fromtimestamp(
-            reminder[2], tz=Settings.timezone
-        )
-        reminder = await ReminderDB.assert_existing(*reminder)
-        reminder.text += f"\n---\n{message.text}"
-        await reminder.commit()
-    else:
-        reminder: ReminderDB = await ReminderDB.new()
-        reminder.datetime = date
-        reminder.text = message.text
-        reminder.owner = message.from_user.id
-        await reminder.commit()
+        await message.answer(tr(message, 'Слишком много символов'))
+        return await read_date(message=message, state=state)
 
-    await message.answer(
-        f"Напоминание на {date.day} {Settings.months[date.month]}"
-        f' успешно создано'
-    )
+    try:
+        # Text is appended to existing reminder at the same time
+        await ReminderDB.append(message.from_user.id, date, message.text)
+    except PendingLimitError as e:
+        await message.answer(tr(message, 'Нельзя иметь больше {limit} напоминаний').format(limit=e.limit))
+        return await Settings.main_menu(message=message, state=state)
+    except DateRangeError:
+        # Date is chosen again, the stored one can't be used
+        await message.answer(tr(message, TOO_FAR))
+        await state.set_data({'date': None})
+        return await new_date(message=message, state=state)
+    except ValueError:
+        await message.answer(tr(message, 'Слишком много символов'))
+        return await read_date(message=message, state=state)
+
+    await message.answer(tr(message, 'Напоминание на {date.day} {month} успешно создано').format(
+        date=date, month=tr(message, Settings.months[date.month])
+    ))
     await state.set_data({'date': None})
 
     await Settings.main_menu(message=message, state=state)
 
 
-async def find_pair(string: str) -> tuple[float, _constants.PAIR_TUPLE, str]:
-    output = (0, _constants.PAIR_TUPLE(None, None, None), '')
-    for strings, value in _constants.PAIRS.items():
-        for expecting_string in strings:
-            sq = SequenceMatcher(None, string, expecting_string)
-            ratio = sq.quick_ratio()
-            if ratio > output[0]:
-                output = (ratio, value, expecting_string)
-    return output
+async def find_pair(owner: int, string: str) -> tuple[float, Timetable, Optional[int], str]:
+    """Lesson with the most similar name in timetable of user's group"""
+    timetable = await user_timetable(owner)
+    ratio, number, alias = timetable.find(string)
+    return ratio, timetable, number, alias
 
 
 @form_router.message(
@@ -246,49 +187,116 @@ async def find_pair(string: str) -> tuple[float, _constants.PAIR_TUPLE, str]:
 async def read_pair(message: Message, state: FSMContext) -> None:
     text = message.text
     if len(text) > 50:
-        await message.answer('Название пары не может быть таким большим')
+        await message.answer(tr(message, 'Название пары не может быть таким большим'))
         asyncio.create_task(new_reminder(message=message, state=state))
         return
-    ratio, pair_values, expecting_string = await find_pair(text.lower())
+    ratio, timetable, number, expecting_string = await find_pair(message.from_user.id, text.lower())
     if ratio < 0.3:
-        await message.answer(
-            'Я не понял, что это за пара. ',
+        await message.answer(tr(
+            message,
+            'Я не понял, что это за пара. '
             'Может попробуете написать более длинно, '
             'или воспользуетесь известным сокращением?'
-        )
+        ))
         return
 
     output = StringIO()
+    lesson = timetable.lessons[number]
+    weekday = tr(message, _constants.WEEK_NAMES[lesson.weekday])
 
     if ratio < 0.6:
-        output.write(
-            f'Я думаю, вы имели в виду пару {expecting_string} '
-            f'в {_constants.WEEK_NAMES[pair_values.week_digit]} '
-            f'{pair_values.start_time}.\n'
-        )
+        output.write(tr(message, 'Я думаю, вы имели в виду пару {pair} в {weekday} {time}.\n').format(
+            pair=expecting_string, weekday=weekday, time=lesson.start_time
+        ))
     elif ratio < 0.85:
-        output.write(
-            f'Скорее всего вы о паре {expecting_string} '
-            f'в {_constants.WEEK_NAMES[pair_values.week_digit]} '
-            f'{pair_values.start_time}.\n'
-        )
+        output.write(tr(message, 'Скорее всего вы о паре {pair} в {weekday} {time}.\n').format(
+            pair=expecting_string, weekday=weekday, time=lesson.start_time
+        ))
 
-    date = datetime.now(Settings.timezone)
-    while date.weekday() != pair_values.week_digit:
-        date += timedelta(days=1)
-    start_time = pair_values.start_time
-    hours = int(start_time[:-3])
-    minutes = int(start_time[-2:])
-    date = date.replace(hour=hours, minute=minutes)
+    date, _ = timetable.next_after(datetime.now(Settings.timezone), number)
 
-    output.write(
-        f'Выбрал датой {date:%d.%m.%y %H:%M}. '
+    output.write(tr(
+        message,
+        'Выбрал датой {date:%d.%m.%y %H:%M}. '
         'Введите текст напоминания, '
         'или командой /cancel вернитесь в меню\n'
         'DEBUG информация:\n'
-        f'Похоже на фразу "{expecting_string}", '
-        f'схожесть {ratio}'
-    )
+        'Похоже на фразу "{pair}", '
+        'схожесть {ratio}'
+    ).format(date=date, pair=expecting_string, ratio=ratio))
     await message.answer(output.getvalue())
     await state.set_state(NewReminderStates.text_date)
     return await state.set_data({'date': date})
+
+
+@form_router.message(NewReminderStates.new_interval)
+async def read_interval(message: Message, state: FSMContext) -> None:
+    text = message.text
+    now = datetime.now(Settings.timezone)
+    rule = parse_interval(text)
+    date = None if rule is None else rule.first_after(now, Settings.timezone)
+    if rule is None and len(text) <= 50:
+        ratio, timetable, number, expecting_string = await find_pair(message.from_user.id, text.lower())
+        if ratio >= 0.3:
+            lesson = timetable.lessons[number]
+            date, _ = timetable.next_after(now, number)
+            if lesson.weeks == 'all':
+                rule = Rule.weekly(lesson.weekday, lesson.start_time)
+                template = 'Буду напоминать о паре {pair} каждый {weekday} в {time}'
+            else:
+                # Lesson of odd or even weeks only
+                rule = Rule.every(2 * 7 * 24 * 60 * 60)
+                template = 'Буду напоминать о паре {pair} раз в две недели, в {weekday} в {time}'
+            await message.answer(tr(message, template).format(
+                pair=expecting_string,
+                weekday=tr(message, _constants.WEEK_NAMES[lesson.weekday]),
+                time=lesson.start_time
+            ))
+    if rule is None:
+        await message.answer(tr(message, 'Не смог прочитать интервал или название пары'))
+        return await new_interval(message=message, state=state)
+
+    await message.answer(tr(
+        message,
+        'Первое напоминание: {date:%d.%m.%y %H:%M}. '
+        'Введите текст напоминания, '
+        'или командой /cancel вернитесь в меню'
+    ).format(date=date))
+    await state.set_state(NewReminderStates.text_interval)
+    return await state.set_data({'date': date, 'rule': rule.dumps()})
+
+
+@form_router.message(NewReminderStates.text_interval)
+async def text_interval(message: Message, state: FSMContext) -> None:
+    data = await state.get_data()
+    assert data.get('rule') is not None
+
+    if len(message.text) > 2000:
+        await message.answer(tr(message, 'Слишком много символов'))
+        return
+
+    try:
+        async with UnitOfWork() as uow:
+            reminder: ReminderDB = uow.add(await ReminderDB.new())
+            reminder.datetime = data['date']
+            reminder.owner = message.from_user.id
+            reminder.text = message.text
+            reminder.rule = data['rule']
+    except PendingLimitError as e:
+        await message.answer(tr(message, 'Нельзя иметь больше {limit} напоминаний').format(limit=e.limit))
+        return await Settings.main_menu(message=message, state=state)
+    except DateRangeError:
+        # Interval is chosen again, the stored first date can't be used
+        await message.answer(tr(message, TOO_FAR))
+        await state.set_data({'date': None, 'rule': None})
+        return await new_interval(message=message, state=state)
+    except ValueError:
+        logger.warning('Repeating reminder of %s is not created', message.from_user.id, exc_info=True)
+        await message.answer(tr(message, 'Не удалось создать напоминание, задайте интервал заново'))
+        await state.set_data({'date': None, 'rule': None})
+        return await new_interval(message=message, state=state)
+
+    await message.answer(tr(message, 'Повторяющееся напоминание успешно создано'))
+    await state.set_data({'date': None, 'rule': None})
+
+    await Settings.main_menu(message=message, state=state)
@@ -1,64 +1,219 @@
-import sqlite3
 from io import StringIO
+from collections import OrderedDict
 from datetime import datetime
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
 
-from aiogram import Dispatcher, F
+from aiogram import Dispatcher
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.state import StatesGroup
 from aiogram.types import (
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
     Message,
-    ReplyKeyboardMarkup,
-    ReplyKeyboardRemove,
-    KeyboardButton
 )
 
 
 from ..settings import Settings
+from ..texts import decode
+from ..translations import Button, plural
 
 
 form_router: Dispatcher = Settings.Dispatcher
 MainForm: StatesGroup = Settings.Form
+tr = Settings.Translations
 
+PAGE_SIZE = 5
 
-@form_router.message(
-    MainForm.main,
-    F.text.casefold() == 'просмотреть напоминания'
-)
-async def view_reminders(message: Message, state: FSMContext) -> None:
-    db = Settings.Database
-    with db.cursor() as cur:
-        cur: sqlite3.Cursor
-        reminders = cur.execute(
-            "SELECT datetime, text "
-            "FROM reminds "
-            f"WHERE OWNER=? "
-            "ORDER BY datetime DESC",
-            (message.from_user.id,)
-        ).fetchmany(5)
+
+class PageCallback(CallbackData, prefix='reminders'):
+    """Keyset cursor: page after or before reminder with given datetime and rowid"""
+    direction: str
+    datetime: float
+    rowid: int
+
+
+class DeleteCallback(CallbackData, prefix='delete'):
+    """Deletes reminder shown on page, recurring one stops"""
+    rowid: int
+
+
+PAGE = Tuple[str, Optional[InlineKeyboardMarkup]]
+
+
+class PageCache:
+    """Rendered pages of most active users, dropped when their reminders change"""
+    __slots__ = ('max_owners', 'ttl', '_owners')
+
+    def __init__(self, max_owners: int = 1000, ttl: float = 60):
+        self.max_owners = max_owners
+        self.ttl = ttl
+        self._owners: OrderedDict[int, Dict[tuple, Tuple[float, PAGE]]] = OrderedDict()
+
+    def get(self, owner: int, cursor: tuple) -> Optional[PAGE]:
+        pages = self._owners.get(owner)
+        if pages is None or cursor not in pages:
+            return None
+        created, page = pages[cursor]
+        # Other dispatcher processes don't invalidate cache
+        if monotonic() - created > self.ttl:
+            del pages[cursor]
+            return None
+        self._owners.move_to_end(owner)
+        return page
+
+    def put(self, owner: int, cursor: tuple, page: PAGE) -> None:
+        self._owners.setdefault(owner, {})[cursor] = (monotonic(), page)
+        self._owners.move_to_end(owner)
+        if len(self._owners) > self.max_owners:
+            self._owners.popitem(last=False)
+
+    def invalidate(self, owner: int) -> None:
+        self._owners.pop(owner, None)
+
+
+page_cache = PageCache()
+Settings.owner_listeners.append(page_cache.invalidate)
+
+
+async def fetch_page(owner: int, cursor: tuple) -> Tuple[List[tuple], bool, bool]:
+    """
+    Returns reminders (datetime, rowid, text, rule), newest first,
+    and whether there are previous and next pages
+    """
+    direction, *key = cursor
+    async with Settings.Database.cursor() as cur:
+        if direction == 'first':
+            rows = await cur.fetchall(
+                "SELECT datetime, reminds.rowid, body, rule FROM reminds "
+                "JOIN reminder_texts ON hash = text_hash WHERE owner = ? "
+                "ORDER BY datetime DESC, reminds.rowid DESC LIMIT ?",
+                (owner, PAGE_SIZE + 1)
+            )
+        elif direction == 'next':
+            rows = await cur.fetchall(
+                "SELECT datetime, reminds.rowid, body, rule FROM reminds "
+                "JOIN reminder_texts ON hash = text_hash "
+                "WHERE owner = ? AND (datetime, reminds.rowid) < (?, ?) "
+                "ORDER BY datetime DESC, reminds.rowid DESC LIMIT ?",
+                (owner, *key, PAGE_SIZE + 1)
+            )
+        else:
+            rows = await cur.fetchall(
+                "SELECT datetime, reminds.rowid, body, rule FROM reminds "
+                "JOIN reminder_texts ON hash = text_hash "
+                "WHERE owner = ? AND (datetime, reminds.rowid) > (?, ?) "
+                "ORDER BY datetime ASC, reminds.rowid ASC LIMIT ?",
+                (owner, *key, PAGE_SIZE + 1)
+            )
+    more = len(rows) > PAGE_SIZE
+    rows = [(date, id_, decode(body), rule) for date, id_, body, rule in rows[:PAGE_SIZE]]
+    if direction == 'prev':
+        return rows[::-1], more, True
+    return rows, direction == 'next', more
+
+
+def shorten(text: str) -> str:
+    if len(text) <= 50:
+        return text
+    ends = [end for end in (text.find(' ', 50, 100), text.find('\n', 50, 100)) if end != -1]
+    return text[:min(ends, default=100)] + ' ...'
+
+
+def render(rows: List[tuple], has_prev: bool, has_next: bool, first: bool, locale: str) -> PAGE:
     output = StringIO()
-    amount = len(reminders)
+    amount = len(rows)
     if amount == 0:
-        output.write('У вас нет напоминаний')
+        output.write(tr.get(locale, 'У вас нет напоминаний'))
+    elif not first or has_next:
+        output.write(tr.get(locale, 'Ваши напоминания:'))
     elif amount == 1:
-        output.write('Ваше одно напоминание:')
-    elif amount < 5:
-        output.write(f'Ваши {amount} напоминания:')
+        output.write(tr.get(locale, 'Ваше одно напоминание:'))
     else:
-        output.write('Ваши 5 напоминаний:')
-
-    for (date, text) in reminders:
-        text: str
-        date: int
-        date: datetime = datetime.fromtimestamp(date, Settings.timezone)
-        output.write(f'\n\n> Напоминание на {date:%d.%m.%y %H:%M}:\n')
-        if len(text) > 50:
-            last_space = text.find(' ', 50, 100)
-            last_new_line = text.find('\n', 50, 100)
-            last_character = min(last_space, last_new_line)
-            output.write(text[:last_character])
-            output.write(' ...')
-        else:
-            output.write(text)
+        output.write(tr.get(locale, plural(
+            amount,
+            'Ваши {amount} напоминание:',
+            'Ваши {amount} напоминания:',
+            'Ваши {amount} напоминаний:'
+        )).format(amount=amount))
+
+    entry = tr.get(locale, '\n\n> Напоминание на {date:%d.%m.%y %H:%M}:\n')
+    recurring = tr.get(locale, '\n\n> Повторяющееся напоминание, следующее {date:%d.%m.%y %H:%M}:\n')
+    keyboard = []
+    for (date, id_, text, rule) in rows:
+        date = datetime.fromtimestamp(date, Settings.timezone)
+        output.write((entry if rule is None else recurring).format(date=date))
+        output.write(shorten(text))
+        # Deleted recurring reminder stops
+        button = 'Удалить {date:%d.%m.%y %H:%M}' if rule is None else 'Остановить {date:%d.%m.%y %H:%M}'
+        keyboard.append([InlineKeyboardButton(
+            text=tr.get(locale, button).format(date=date),
+            callback_data=DeleteCallback(rowid=id_).pack()
+        )])
+
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(
+            text=tr.get(locale, '« Назад'),
+            callback_data=PageCallback(
+                direction='prev', datetime=rows[0][0], rowid=rows[0][1]
+            ).pack()
+        ))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            text=tr.get(locale, 'Далее »'),
+            callback_data=PageCallback(
+                direction='next', datetime=rows[-1][0], rowid=rows[-1][1]
+            ).pack()
+        ))
+    if buttons:
+        keyboard.append(buttons)
+    markup = InlineKeyboardMarkup(inline_keyboard=keyboard) if keyboard else None
+    return output.getvalue(), markup
+
+
+async def get_page(owner: int, cursor: tuple, locale: str) -> PAGE:
+    page = page_cache.get(owner, (locale, *cursor))
+    if page is None:
+        rows, has_prev, has_next = await fetch_page(owner, cursor)
+        if not rows and cursor[0] != 'first':
+            # Reminders of page were delivered or deleted since it was shown
+            return await get_page(owner, ('first',), locale)
+        page = render(rows, has_prev, has_next, cursor[0] == 'first', locale)
+        page_cache.put(owner, (locale, *cursor), page)
+    return page
 
-    await message.answer(output.getvalue())
+
+@form_router.message(
+    MainForm.main,
+    Button('Просмотреть напоминания')
+)
+async def view_reminders(message: Message, state: FSMContext) -> None:
+    text, markup = await get_page(
+        message.from_user.id, ('first',), tr.locale(message.from_user.language_code)
+    )
+    await message.answer(text, reply_markup=markup)
     await Settings.main_menu(message=message, state=state)
+
+
+@form_router.callback_query(PageCallback.filter())
+async def view_reminders_page(query: CallbackQuery, callback_data: PageCallback) -> None:
+    text, markup = await get_page(query.from_user.id, (
+        callback_data.direction, callback_data.datetime, callback_data.rowid
+    ), tr.locale(query.from_user.language_code))
+    await query.message.edit_text(text, reply_markup=markup)
+    await query.answer()
+
+
+@form_router.callback_query(DeleteCallback.filter())
+async def delete_reminder(query: CallbackQuery, callback_data: DeleteCallback) -> None:
+    locale = tr.locale(query.from_user.language_code)
+    deleted = await Settings.DB_Reminder.delete(callback_data.rowid, query.from_user.id)
+    if deleted:
+        text, markup = await get_page(query.from_user.id, ('first',), locale)
+        await query.message.edit_text(text, reply_markup=markup)
+    await query.answer(tr.get(
+        locale, 'Напоминание удалено' if deleted else 'Напоминание уже отправлено или удалено'
+    ))
@@ -0,0 +1,65 @@
+"""
+Bodies of reminders are kept apart from scheduling columns of 'reminds',
+in 'reminder_texts', compressed and deduplicated by hash. Rows of
+'reminder_texts' are reference-counted by triggers, see migrations.py
+"""
+import zlib
+from hashlib import blake2b
+from sqlite3 import Connection
+from typing import Iterable, List
+
+# First byte of body tells how text is stored
+_RAW = b'r'
+_ZLIB = b'z'
+
+
+def text_hash(text: str) -> int:
+    """Signed 64-bit hash, so it's stored as SQLite integer"""
+    return int.from_bytes(blake2b(text.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def encode(text: str) -> bytes:
+    raw = text.encode()
+    compressed = zlib.compress(raw, 6)
+    # Short texts don't get smaller
+    if len(compressed) < len(raw):
+        return _ZLIB + compressed
+    return _RAW + raw
+
+
+def decode(body: bytes) -> str:
+    if body[:1] == _ZLIB:
+        return zlib.decompress(body[1:]).decode()
+    return body[1:].decode()
+
+
+def store(connection: Connection, text: str) -> int:
+    """
+    Inserts body, if there's no such text yet, and returns its hash.
+    Should be called in the same transaction as write of reminder,
+    otherwise body without references stays in table
+    """
+    hash_ = text_hash(text)
+    inserted = connection.execute(
+        "INSERT INTO 'reminder_texts' (hash, body, refs) VALUES (?, ?, 0) "
+        "ON CONFLICT(hash) DO NOTHING",
+        (hash_, encode(text))
+    ).rowcount
+    if not inserted:
+        body, = connection.execute(
+            "SELECT body FROM 'reminder_texts' WHERE hash = ?", (hash_,)
+        ).fetchone()
+        if decode(body) != text:
+            raise ValueError('Hash collision of reminder texts')
+    return hash_
+
+
+def store_many(connection: Connection, texts: Iterable[str]) -> List[int]:
+    return [store(connection, text) for text in texts]
+
+
+def load(connection: Connection, hash_: int) -> str:
+    body, = connection.execute(
+        "SELECT body FROM 'reminder_texts' WHERE hash = ?", (hash_,)
+    ).fetchone()
+    return decode(body)
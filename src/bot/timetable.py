@@ -0,0 +1,169 @@
+"""
+Timetables of student groups, one JSON file per group in static/timetables.
+Every timetable is compiled into sorted array of lesson starts within
+two-week cycle, so next occurrence after any moment is found by bisect.
+File of group is reloaded on access when its modification time changes
+"""
+import json
+import os
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, timezone
+from time import monotonic
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .matching import PairMatcher
+from .paths import TIMETABLES
+from .settings import Settings
+
+
+DEFAULT_GROUP = 'default'
+WEEK = 7 * 24 * 60
+# Odd and even weeks, in minutes
+CYCLE = 2 * WEEK
+KINDS = ('practice', 'lecture')
+KIND_WORDS = ('практика', 'лекция')
+PARITIES = {'all': (0, 1), 'odd': (0,), 'even': (1,)}
+_EPOCH = date(1970, 1, 1)
+
+
+class Lesson(NamedTuple):
+    name: str
+    weekday: int
+    start_time: str
+    # Index in KINDS, 0 for practice and 1 for lecture
+    practice_lecture: int
+    weeks: str
+
+
+class Timetable:
+    """
+    Lessons of one group. Week of `first_week` date is odd, and weeks
+    alternate since it. Times are wall-clock times in timezone of moment
+    """
+    __slots__ = ('group', 'lessons', 'matcher', '_first_minute', '_starts',
+                 '_owners', '_lesson_starts')
+
+    def __init__(self, group: str, data: dict):
+        self.group = group
+        first_week = date.fromisoformat(data.get('first_week', '2023-09-04'))
+        # Minutes since epoch of Monday of the first week, as if it was UTC
+        self._first_minute = (
+            first_week.toordinal() - first_week.weekday() - _EPOCH.toordinal()
+        ) * 24 * 60
+        self.lessons: List[Lesson] = []
+        aliases = {}
+        occurrences = []
+        self._lesson_starts: List[array] = []
+        for number, lesson in enumerate(data['lessons']):
+            hours, minutes = lesson['start_time'].split(':')
+            weeks = lesson.get('weeks', 'all')
+            self.lessons.append(Lesson(
+                lesson['names'][0], lesson['weekday'], lesson['start_time'],
+                KINDS.index(lesson.get('kind', 'practice')), weeks
+            ))
+            # Practice and lecture of one subject are told apart by kind word
+            kind_word = KIND_WORDS[self.lessons[-1].practice_lecture]
+            aliases[tuple(lesson['names']) + tuple(
+                f'{name} {kind_word}' for name in lesson['names'] if kind_word not in name
+            )] = number
+            starts = array('I', sorted(
+                parity * WEEK + lesson['weekday'] * 24 * 60 + int(hours) * 60 + int(minutes)
+                for parity in PARITIES[weeks]
+            ))
+            self._lesson_starts.append(starts)
+            occurrences.extend((start, number) for start in starts)
+        occurrences.sort()
+        # Starts of all lessons in cycle and lesson of every start
+        self._starts = array('I', (start for start, _ in occurrences))
+        self._owners = array('H', (number for _, number in occurrences))
+        self.matcher = PairMatcher(aliases, default=None)
+
+    def __len__(self) -> int:
+        return len(self.lessons)
+
+    def next_after(self, moment: datetime, lesson: Optional[int] = None) -> Tuple[datetime, int]:
+        """Start of the first lesson, or of given one, later than moment, and number of lesson"""
+        offset = moment.utcoffset()
+        # Wall-clock minutes since first Monday, integer math only
+        wall = int(moment.timestamp()) + (offset.days * 86400 + offset.seconds if offset else 0)
+        cycle, position = divmod(wall // 60 - self._first_minute, CYCLE)
+        if lesson is None:
+            starts, owners = self._starts, self._owners
+        else:
+            starts, owners = self._lesson_starts[lesson], None
+        if not starts:
+            raise ValueError(f'Timetable of group {self.group} has no lessons')
+        index = bisect_right(starts, position)
+        if index == len(starts):
+            cycle, index = cycle + 1, 0
+        start = (self._first_minute + cycle * CYCLE + starts[index]) * 60
+        return (
+            datetime.fromtimestamp(start, timezone.utc).replace(tzinfo=moment.tzinfo),
+            lesson if owners is None else owners[index]
+        )
+
+    def find(self, string: str) -> Tuple[float, Optional[int], str]:
+        """(ratio, number of lesson, alias) of lesson with the most similar name"""
+        return self.matcher.find(string)
+
+
+class Timetables:
+    """Loaded timetables of groups. File is checked at most once in `check_interval` seconds"""
+    __slots__ = ('folder', 'check_interval', '_loaded')
+
+    def __init__(self, folder=TIMETABLES, check_interval: float = 5):
+        self.folder = folder
+        self.check_interval = check_interval
+        # Group: (timetable, modification time of file, monotonic time of check)
+        self._loaded: Dict[str, Tuple[Timetable, int, float]] = {}
+
+    def groups(self) -> List[str]:
+        return sorted(path.stem for path in self.folder.glob('*.json'))
+
+    def get(self, group: str) -> Timetable:
+        """Timetable of group, loaded from its file only if the file was changed"""
+        loaded = self._loaded.get(group)
+        now = monotonic()
+        if loaded is not None and now - loaded[2] < self.check_interval:
+            return loaded[0]
+        path = self.folder / f'{group}.json'
+        try:
+            modified = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            if loaded is not None:
+                # Keep timetable of removed file, users are still bound to group
+                return loaded[0]
+            raise KeyError(f'There is no timetable of group {group}')
+        if loaded is None or loaded[1] != modified:
+            timetable = Timetable(group, json.loads(path.read_text(encoding='utf-8')))
+        else:
+            timetable = loaded[0]
+        self._loaded[group] = (timetable, modified, now)
+        return timetable
+
+
+async def user_group(owner: int) -> str:
+    async with Settings.Database.cursor() as cur:
+        row = await cur.fetchone("SELECT group_name FROM 'user_groups' WHERE owner = ?", (owner,))
+    return DEFAULT_GROUP if row is None else row[0]
+
+
+async def set_user_group(owner: int, group: str) -> None:
+    async with Settings.Database.cursor(autocommit=True) as cur:
+        await cur.execute(
+            "INSERT INTO 'user_groups' (owner, group_name) VALUES (?, ?) "
+            "ON CONFLICT(owner) DO UPDATE SET group_name = excluded.group_name",
+            (owner, group)
+        )
+
+
+async def user_timetable(owner: int) -> Timetable:
+    """Timetable of group user is bound to. Default group, if that one is removed"""
+    try:
+        return Settings.Timetables.get(await user_group(owner))
+    except KeyError:
+        return Settings.Timetables.get(DEFAULT_GROUP)
+
+
+Settings.Timetables = Timetables()
@@ -0,0 +1,267 @@
+"""
+Bulk import and export of reminders as JSONL or CSV. Files are streamed
+through generators and written in chunks, one transaction per chunk,
+so memory doesn't depend on amount of reminders:
+
+reminderbot_transfer export reminders.jsonl [--owner ID]
+reminderbot_transfer import reminders.csv
+
+Record has owner, datetime, text and rule. Datetime is ISO 8601, Unix
+timestamp or text, that bot understands, e.g. 'завтра в 9'. Imported
+records are checked by the same rules as Reminder.commit, invalid ones
+are reported and skipped
+"""
+import csv
+import io
+import json
+import sys
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from pathlib import Path
+from sqlite3 import Connection
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from .dates import DateParser
+from .db import PENDING_LIMIT, Database, check_fields, import_reminders
+from .paths import DB_REMINDS
+from .settings import Settings
+from .texts import decode
+
+
+FIELDS = ('owner', 'datetime', 'text', 'rule')
+FORMATS = ('jsonl', 'csv')
+# (owner, timestamp, text, rule)
+ROW = Tuple[int, float, str, Optional[str]]
+# Page cache of connection during import
+CACHE_KIB = 64 * 1024
+
+
+def export_rows(connection: Connection, owner: Optional[int] = None, chunk: int = 10_000) -> Iterator[ROW]:
+    """Reminders by rowid, or reminders of owner by datetime, read by chunks"""
+    last_date, last_id = float('-inf'), 0
+    while True:
+        if owner is None:
+            rows = connection.execute(
+                "SELECT reminds.rowid, owner, datetime, body, rule FROM 'reminds' "
+                "JOIN 'reminder_texts' ON hash = text_hash "
+                "WHERE reminds.rowid > ? ORDER BY reminds.rowid LIMIT ?",
+                (last_id, chunk)
+            ).fetchall()
+        else:
+            rows = connection.execute(
+                "SELECT reminds.rowid, owner, datetime, body, rule FROM 'reminds' "
+                "JOIN 'reminder_texts' ON hash = text_hash "
+                "WHERE owner = ? AND (datetime, reminds.rowid) > (?, ?) "
+                "ORDER BY datetime, reminds.rowid LIMIT ?",
+                (owner, last_date, last_id, chunk)
+            ).fetchall()
+        if not rows:
+            return
+        last_id, _, last_date = rows[-1][:3]
+        for _, owner_, date, body, rule in rows:
+            yield owner_, date, decode(body), rule
+
+
+def dump(rows: Iterable[ROW], file: TextIO, format_: str = 'jsonl') -> int:
+    """Writes rows to text file. Returns amount of rows"""
+    tz = Settings.timezone
+    count = 0
+    if format_ == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(FIELDS)
+        for owner, date, text, rule in rows:
+            writer.writerow((owner, datetime.fromtimestamp(date, tz).isoformat(), text, rule or ''))
+            count += 1
+        return count
+    for owner, date, text, rule in rows:
+        file.write(json.dumps({
+            'owner': owner,
+            'datetime': datetime.fromtimestamp(date, tz).isoformat(),
+            'text': text,
+            'rule': rule,
+        }, ensure_ascii=False))
+        file.write('\n')
+        count += 1
+    return count
+
+
+def export_owner(connection: Connection, owner: int) -> bytes:
+    """JSONL of reminders of one user, which bot sends as document"""
+    output = io.StringIO()
+    dump(export_rows(connection, owner), output)
+    return output.getvalue().encode()
+
+
+def records(file: TextIO, format_: str, errors: Callable[[int, str], None]) -> Iterator[Tuple[int, dict]]:
+    """(line number, record) of every record of file"""
+    if format_ == 'csv':
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            errors(number, f'Invalid JSON: {e}')
+            continue
+        if not isinstance(record, dict):
+            errors(number, 'Record should be JSON object')
+            continue
+        yield number, record
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Validator:
+    """Checks records of one import, relative dates are counted from its start"""
+    __slots__ = ('parser', 'now', 'date_limit', 'errors')
+
+    def __init__(self, errors: Callable[[int, str], None], now: datetime = None):
+        self.parser = DateParser()
+        self.now = now or datetime.now(Settings.timezone)
+        self.date_limit = (self.now + timedelta(days=366)).timestamp()
+        self.errors = errors
+
+    def rows(self, chunk: List[Tuple[int, dict]]) -> List[Tuple[float, int, str, Optional[str]]]:
+        """Valid records of chunk as rows for import_reminders"""
+        dates: Dict[int, datetime] = {}
+        # Texts like 'завтра в 9' are parsed together
+        texts = []
+        for index, (number, record) in enumerate(chunk):
+            date = self._date(record.get('datetime'))
+            if date is None:
+                texts.append((index, str(record.get('datetime') or '')))
+            else:
+                dates[index] = date
+        for (index, _), parsed in zip(texts, self.parser.parse_many((text for _, text in texts), self.now)):
+            if isinstance(parsed, datetime):
+                dates[index] = parsed
+            else:
+                self.errors(chunk[index][0], '; '.join(f'{error.field}: {error.message}' for error in parsed))
+
+        rows = []
+        for index, (number, record) in enumerate(chunk):
+            if index not in dates:
+                continue
+            owner, text, rule = record.get('owner'), record.get('text'), record.get('rule') or None
+            try:
+                # CSV has only strings
+                if isinstance(owner, str):
+                    owner = int(owner)
+                if not text:
+                    raise ValueError('Text is required')
+                timestamp = check_fields(dates[index], owner, text, rule, self.date_limit)
+            except ValueError as e:
+                self.errors(number, str(e))
+                continue
+            rows.append((timestamp, owner, text, rule))
+        return rows
+
+    def _date(self, value) -> Optional[datetime]:
+        """Date of ISO 8601 string or timestamp, None for text, that parser should read"""
+        if isinstance(value, str):
+            try:
+                date = datetime.fromisoformat(value)
+            except ValueError:
+                pass
+            else:
+                return date if date.tzinfo is not None else date.replace(tzinfo=Settings.timezone)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        try:
+            return datetime.fromtimestamp(float(value), Settings.timezone)
+        except (ValueError, OverflowError, OSError):
+            return None
+
+
+def import_file(
+        connection: Connection,
+        file: TextIO,
+        format_: str,
+        errors: Callable[[int, str], None],
+        chunk: int = 50_000,
+        limit: Optional[int] = PENDING_LIMIT,
+) -> Dict[str, int]:
+    """Imports records of file chunk by chunk. Returns amounts of read, inserted and skipped records"""
+    validator = Validator(errors)
+    report = {'read': 0, 'inserted': 0, 'invalid': 0, 'duplicate': 0, 'over_limit': 0}
+    cache_size, = connection.execute('PRAGMA cache_size').fetchone()
+    # Indexes of large table don't fit default cache, so pages are read again
+    connection.execute(f'PRAGMA cache_size = {-CACHE_KIB}')
+    try:
+        for records_chunk in chunked(records(file, format_, errors), chunk):
+            rows = validator.rows(records_chunk)
+            inserted, over_limit = import_reminders(connection, rows, limit)
+            report['read'] += len(records_chunk)
+            report['invalid'] += len(records_chunk) - len(rows)
+            report['inserted'] += inserted
+            report['over_limit'] += over_limit
+            report['duplicate'] += len(rows) - inserted - over_limit
+    finally:
+        connection.execute(f'PRAGMA cache_size = {cache_size}')
+    return report
+
+
+def _format(path: str, format_: Optional[str]) -> str:
+    if format_ is not None:
+        return format_
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def run() -> None:
+    """Cli-function of import and export"""
+    parser = ArgumentParser(prog='reminderbot_transfer', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database', type=Path, default=DB_REMINDS)
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='Write reminders to file')
+    export.add_argument('file', help="Path of file, '-' for standard output")
+    export.add_argument('--owner', type=int, help='Only reminders of this user')
+    export.add_argument('--format', choices=FORMATS, help='By extension of file by default')
+    import_ = commands.add_parser('import', help='Read reminders from file')
+    import_.add_argument('file', help="Path of file, '-' for standard input")
+    import_.add_argument('--format', choices=FORMATS, help='By extension of file by default')
+    import_.add_argument('--chunk', type=int, default=50_000, help='Records per transaction')
+    import_.add_argument('--no-limit', action='store_true',
+                         help=f'Allow more than {PENDING_LIMIT} reminders per user')
+    import_.add_argument('--max-errors', type=int, default=100, help='Invalid records to print')
+    args = parser.parse_args()
+
+    # Same as timezone of bot
+    Settings.timezone = timezone(timedelta(hours=3), name='MSK')
+    db = Database(args.database.absolute(), readers=0)
+    format_ = _format(args.file, args.format)
+    try:
+        if args.command == 'export':
+            file = sys.stdout if args.file == '-' else open(args.file, 'w', encoding='utf-8', newline='')
+            with file:
+                count = dump(export_rows(db.db, args.owner), file, format_)
+            print(json.dumps({'exported': count}), file=sys.stderr)
+            return
+        printed = 0
+
+        def errors(number: int, message: str) -> None:
+            nonlocal printed
+            if printed < args.max_errors:
+                print(f'{args.file}:{number}: {message}', file=sys.stderr)
+            printed += 1
+
+        file = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8', newline='')
+        with file:
+            report = import_file(
+                db.db, file, format_, errors, args.chunk, None if args.no_limit else PENDING_LIMIT
+            )
+        print(json.dumps(report), file=sys.stderr)
+    finally:
+        db.unload_instance_normal()
+
+
+if __name__ == '__main__':
+    run()
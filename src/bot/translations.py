@@ -1,8 +1,160 @@
-from .paths import TRANSLATIONS
+"""
+Translations of user-facing strings. Russian strings are message ids, so
+default locale needs no catalog. Other locales are compiled from
+static/translations.json into binary catalogs at build time:
+
+python -m bot.translations
+
+Catalog is memory-mapped on the first lookup in its locale, and lookups
+are cached, so locales nobody uses cost nothing
+"""
+import json
+import logging
+import mmap
+import struct
+from bisect import bisect_left
+from functools import lru_cache
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .paths import CATALOGS, TRANSLATIONS
 from .settings import Settings
 
 
+logger = logging.getLogger(__name__)
+
+# Header is magic and amount of messages. Sorted hashes of message ids
+# and offsets of templates in UTF-8 blob follow it
+MAGIC = b'RBC1'
+_HEADER = struct.Struct('<4sI')
+
+
+def message_hash(message: str) -> int:
+    return int.from_bytes(blake2b(message.encode(), digest_size=8).digest(), 'little')
+
+
+def compile_catalog(messages: Dict[str, str]) -> bytes:
+    """Binary catalog of one locale"""
+    hashed = sorted((message_hash(message), template) for message, template in messages.items())
+    if len({hash_ for hash_, _ in hashed}) != len(hashed):
+        raise ValueError('Hash collision of message ids')
+    offsets, blob = [0], bytearray()
+    for _, template in hashed:
+        blob += template.encode()
+        offsets.append(len(blob))
+    return b''.join((
+        _HEADER.pack(MAGIC, len(hashed)),
+        struct.pack(f'<{len(hashed)}Q', *(hash_ for hash_, _ in hashed)),
+        struct.pack(f'<{len(offsets)}I', *offsets),
+        blob,
+    ))
+
+
+def compile_all(source: Path = TRANSLATIONS, folder: Path = CATALOGS) -> Dict[str, int]:
+    """Writes catalog of every locale in source. Returns amount of messages by locale"""
+    folder.mkdir(exist_ok=True)
+    locales = json.loads(source.read_text(encoding='utf-8'))
+    for locale, messages in locales.items():
+        (folder / f'{locale}.cat').write_bytes(compile_catalog(messages))
+    return {locale: len(messages) for locale, messages in locales.items()}
+
+
+class Catalog:
+    """Read-only view of compiled catalog, templates are decoded on lookup"""
+    __slots__ = ('_buffer', '_hashes', '_offsets', '_blob')
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, count = _HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError('Not a translations catalog')
+        view = memoryview(buffer)
+        start = _HEADER.size
+        self._hashes = view[start:start + count * 8].cast('Q')
+        start += count * 8
+        self._offsets = view[start:start + (count + 1) * 4].cast('I')
+        self._blob = view[start + (count + 1) * 4:]
+
+    @classmethod
+    def open(cls, path: Path) -> 'Catalog':
+        with open(path, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def get(self, message: str) -> Optional[str]:
+        hash_ = message_hash(message)
+        index = bisect_left(self._hashes, hash_)
+        if index == len(self._hashes) or self._hashes[index] != hash_:
+            return None
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+
 class Translations:
     """Contains translations for bot with different languages"""
-    def __init__(self):
-        pass
+    __slots__ = ('default', 'folder', '_catalogs', 'locale', 'get')
+
+    def __init__(self, default: str = 'ru', folder: Path = CATALOGS, cache_size: int = 4096):
+        self.default = default
+        self.folder = folder
+        self._catalogs: Dict[str, Optional[Catalog]] = {}
+        self.locale = lru_cache(256)(self._locale)
+        self.get = lru_cache(cache_size)(self._get)
+
+    def __call__(self, event: Any, message: str) -> str:
+        """Template of message in locale of user, who sent event"""
+        user = getattr(event, 'from_user', None)
+        return self.get(self.locale(user and user.language_code), message)
+
+    def _locale(self, language_code: Optional[str]) -> str:
+        """'en-US' is 'en'. Locales without catalog fall back to default"""
+        if not language_code:
+            return self.default
+        locale = language_code.split('-')[0].lower()
+        if locale == self.default or self._catalog(locale) is None:
+            return self.default
+        return locale
+
+    def _catalog(self, locale: str) -> Optional[Catalog]:
+        if locale not in self._catalogs:
+            path = self.folder / f'{locale}.cat'
+            self._catalogs[locale] = Catalog.open(path) if path.is_file() else None
+        return self._catalogs[locale]
+
+    def _get(self, locale: str, message: str) -> str:
+        if locale == self.default:
+            return message
+        template = self._catalog(locale).get(message)
+        if template is None:
+            logger.debug('No translation to %s of %r', locale, message)
+            return message
+        return template
+
+
+def plural(amount: int, one: str, few: str, many: str) -> str:
+    """Russian form for amount: 1 and 21 is one, 2-4 and 22 is few, 0 and 5-20 is many"""
+    if amount % 10 == 1 and amount % 100 != 11:
+        return one
+    if 2 <= amount % 10 <= 4 and not 12 <= amount % 100 <= 14:
+        return few
+    return many
+
+
+class Button:
+    """Filter of message with text of button, in locale of its sender, ignoring case"""
+    __slots__ = ('text',)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __call__(self, message: Any) -> bool:
+        return (
+            message.text is not None
+            and message.text.casefold() == Settings.Translations(message, self.text).casefold()
+        )
+
+
+Settings.Translations = Translations()
+
+
+if __name__ == '__main__':
+    print(json.dumps(compile_all()))
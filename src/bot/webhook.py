@@ -0,0 +1,134 @@
+"""
+Webhook mode: Telegram pushes updates to aiohttp server instead of long
+polling. Updates are acknowledged at once and handled by bounded pool of workers
+"""
+import asyncio
+import logging
+import secrets
+import signal
+from contextlib import suppress
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookHandler(SimpleRequestHandler):
+    """
+    Checks secret token of request and queues update. Telegram waits
+    while queue is full, so amount of handled updates stays bounded
+    """
+
+    def __init__(
+            self,
+            dispatcher: Dispatcher,
+            bot: Bot,
+            secret_token: str,
+            workers: int = 32,
+            queue_size: int = 1000,
+            **data: Any
+    ):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **data)
+        self.secret_token = secret_token
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._tasks: List[asyncio.Task] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not secrets.compare_digest(
+                request.headers.get(SECRET_HEADER, '').encode(),
+                self.secret_token.encode()
+        ):
+            return web.Response(status=401)
+        update = await request.json(loads=self.bot.session.json_loads)
+        await self.queue.put(update)
+        return web.json_response({}, dumps=self.bot.session.json_dumps)
+
+    __call__ = handle
+
+    async def _worker(self) -> None:
+        while True:
+            update: Dict[str, Any] = await self.queue.get()
+            try:
+                result = await self.dispatcher.feed_raw_update(self.bot, update, **self.data)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(self.bot, result)
+            except Exception:
+                logger.exception('Failed to handle update %s', update.get('update_id'))
+            finally:
+                self.queue.task_done()
+
+    def start(self) -> None:
+        assert not self._tasks, "Webhook workers already started"
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        """Handles queued updates, then stops workers"""
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        await super().close()
+
+
+class Webhook:
+    """Serves webhook on host:port/path and registers `url` in Telegram"""
+    __slots__ = ('url', 'host', 'port', 'path', 'secret_token', 'workers', '_stop')
+
+    def __init__(
+            self,
+            url: str,
+            host: str = '127.0.0.1',
+            port: int = 8080,
+            path: str = '/webhook',
+            secret_token: Optional[str] = None,
+            workers: int = 32,
+    ):
+        self.url = url
+        self.host = host
+        self.port = port
+        self.path = path
+        # Telegram gets token in setWebhook, so random one works unless several instances share url
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.workers = workers
+        self._stop: Optional[asyncio.Event] = None
+
+    async def run(self, bot: Bot, dispatcher: Dispatcher) -> None:
+        """Serves until stop is called"""
+        self._stop = asyncio.Event()
+        with suppress(NotImplementedError):
+            # As start_polling does, there are no signal handlers on Windows
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGTERM, self.stop)
+            loop.add_signal_handler(signal.SIGINT, self.stop)
+        handler = WebhookHandler(dispatcher, bot, self.secret_token, self.workers)
+        app = web.Application()
+        handler.register(app, path=self.path)
+        setup_application(app, dispatcher, bot=bot)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        handler.start()
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+            await bot.set_webhook(
+                self.url,
+                secret_token=self.secret_token,
+                max_connections=self.workers,
+                allowed_updates=dispatcher.resolve_used_update_types(),
+            )
+            logger.info('Webhook is served on %s:%s%s', self.host, self.port, self.path)
+            await self._stop.wait()
+        finally:
+            # Closes handler and bot session on shutdown
+            await runner.cleanup()
+
+    def stop(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
@@ -0,0 +1,119 @@
+"""
+Fake Bot API of benchmarks: errors are answered as Telegram answers them,
+and bot served by it answers users end to end
+"""
+import asyncio
+import sys
+import unittest
+from importlib import import_module
+from datetime import timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import ClientSession
+
+import bot
+from benchmarks.fake_api import FakeBotAPI
+from bot.settings import Settings
+from bot.db import Database
+from bot.fsm_storage import SQLiteStorage
+
+
+TOKEN = '123456:fake-token-for-local-api'
+
+
+class FakeAPITest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.api = FakeBotAPI()
+        await self.api.start()
+
+    async def asyncTearDown(self):
+        await self.api.stop()
+
+    async def post(self, method: str, body: str) -> tuple:
+        async with ClientSession() as session:
+            async with session.post(
+                f'{self.api.base}/bot{TOKEN}/{method}',
+                data=body, headers={'Content-Type': 'application/json'}
+            ) as response:
+                return response.status, await response.json()
+
+    async def test_invalid_json(self):
+        status, answer = await self.post('sendMessage', '{"chat_id": 1,')
+        self.assertEqual(status, 400)
+        self.assertFalse(answer['ok'])
+        self.assertEqual(answer['error_code'], 400)
+
+    async def test_missing_parameter(self):
+        status, answer = await self.post('sendMessage', '{"text": "text"}')
+        self.assertEqual(status, 400)
+        self.assertFalse(answer['ok'])
+
+    async def test_json_parameters(self):
+        status, answer = await self.post('sendMessage', '{"chat_id": 1, "text": "text"}')
+        self.assertEqual(status, 200)
+        self.assertTrue(answer['ok'])
+        self.assertEqual(self.api.sent[-1][:2], (1, 'text'))
+
+
+class PollingTest(unittest.IsolatedAsyncioTestCase):
+    """User sends /start twice to bot, which polls fake API"""
+
+    async def asyncSetUp(self):
+        self.saved = {
+            name: getattr(Settings, name, None)
+            for name in ('Dispatcher', 'Database', 'loop', 'timezone')
+        }
+        self.modules = {
+            name: module for name, module in sys.modules.items()
+            if name.startswith('bot.states_functions')
+        }
+        for name in self.modules:
+            del sys.modules[name]
+        Settings.loop = asyncio.get_running_loop()
+        Settings.timezone = timezone(timedelta(hours=3), name='MSK')
+        self.folder = TemporaryDirectory()
+        Settings.Database = Database(Path(self.folder.name) / 'reminds.db', readers=0)
+        self.storage = SQLiteStorage(Settings.Database)
+        Settings.Dispatcher = Dispatcher(storage=self.storage)
+        import_module('bot.states_functions')
+
+        self.api = FakeBotAPI()
+        await self.api.start()
+        self.bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(self.api.base)))
+        self.polling = asyncio.create_task(Settings.Dispatcher.start_polling(
+            self.bot, polling_timeout=1, handle_signals=False
+        ))
+        await asyncio.wait_for(self.api.ready.wait(), 10)
+
+    async def asyncTearDown(self):
+        await Settings.Dispatcher.stop_polling()
+        await self.polling
+        await self.bot.session.close()
+        await self.api.stop()
+        await self.storage.close()
+        await Settings.Database.unload_instance()
+        self.folder.cleanup()
+        for name in [name for name in sys.modules if name.startswith('bot.states_functions')]:
+            del sys.modules[name]
+        sys.modules.update(self.modules)
+        if 'bot.states_functions' in self.modules:
+            bot.states_functions = self.modules['bot.states_functions']
+        else:
+            del bot.states_functions
+        for name, value in self.saved.items():
+            setattr(Settings, name, value)
+
+    async def test_start(self):
+        await asyncio.wait_for(self.api.inject(1, '/start'), 10)
+        self.assertEqual(self.api.sent[-1][:2], (1, 'Привет!'))
+        # State of user is kept by storage between updates
+        await asyncio.wait_for(self.api.inject(1, '/start'), 10)
+        self.assertEqual(self.api.sent[-1][:2], (1, 'Главное меню'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Order of message handlers. Handlers of states take any text, so every
+command has to be registered before them, or it's taken as state input
+"""
+import sys
+import unittest
+from importlib import import_module
+
+from aiogram import Dispatcher
+
+import bot
+from bot.settings import Settings
+
+
+def _filters(handler) -> set:
+    return {type(filter_.callback).__name__ for filter_ in handler.filters}
+
+
+class HandlerOrderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.saved = {
+            name: getattr(Settings, name, None) for name in ('Dispatcher', 'Diagnostics')
+        }
+        cls.modules = {
+            name: module for name, module in sys.modules.items()
+            if name.startswith('bot.states_functions')
+        }
+        for name in cls.modules:
+            del sys.modules[name]
+        Settings.Dispatcher = Dispatcher()
+        # /diag is registered only with diagnostics enabled
+        Settings.Diagnostics = object()
+        # Parent package keeps imported submodule as attribute
+        import_module('bot.states_functions')
+        cls.handlers = Settings.Dispatcher.message.handlers
+
+    @classmethod
+    def tearDownClass(cls):
+        for name in [name for name in sys.modules if name.startswith('bot.states_functions')]:
+            del sys.modules[name]
+        sys.modules.update(cls.modules)
+        if 'bot.states_functions' in cls.modules:
+            bot.states_functions = cls.modules['bot.states_functions']
+        else:
+            del bot.states_functions
+        for name, value in cls.saved.items():
+            setattr(Settings, name, value)
+
+    def test_commands_before_states(self):
+        names = [handler.callback.__name__ for handler in self.handlers]
+        commands = [i for i, handler in enumerate(self.handlers) if 'Command' in _filters(handler)]
+        states = [i for i, handler in enumerate(self.handlers) if _filters(handler) == {'State'}]
+        self.assertTrue(commands)
+        self.assertTrue(states)
+        self.assertLess(max(commands), min(states), names)
+
+    def test_diagnostics_registered(self):
+        names = [handler.callback.__name__ for handler in self.handlers]
+        for name in ('diagnostics', 'choose_group', 'export'):
+            with self.subTest(handler=name):
+                self.assertIn(name, names)
+
+
+if __name__ == '__main__':
+    unittest.main()
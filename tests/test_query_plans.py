@@ -0,0 +1,113 @@
+"""
+Query plans of hot queries on 'reminds'. Statements are captured from real
+code by trace callback of writer connection, so plans of queries as they
+are sent are checked: every one should search by index and none should
+scan the whole table
+"""
+import asyncio
+import re
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import time
+from typing import List
+
+from aiogram import Dispatcher
+
+from bot.settings import Settings
+from bot.db import Database, IdentityMap, Reminder
+from bot.leases import SQLiteLeaseBackend
+from bot.texts import store
+
+
+OWNERS = 50
+ROWS = 2000
+# Full scan of table, not of index in order of which it's read
+_SCAN = re.compile(r'\bSCAN reminds\b(?! USING)')
+
+
+class Scheduler:
+    def schedule(self, id_: int, timestamp: float) -> None:
+        pass
+
+
+class QueryPlansTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        Settings.timezone = timezone(timedelta(hours=3), name='MSK')
+        Settings.Scheduler = Scheduler()
+        Settings.Reminders = IdentityMap()
+        if getattr(Settings, 'Dispatcher', None) is None:
+            Settings.Dispatcher = Dispatcher()
+        # Handlers need registered dispatcher
+        from bot import states_functions
+        from bot.states_functions.reminder_viewing import fetch_page
+        cls.fetch_page = staticmethod(fetch_page)
+
+        cls.folder = TemporaryDirectory()
+        cls.db = Settings.Database = Database(Path(cls.folder.name) / 'reminds.db', readers=0)
+        now = time()
+        with cls.db.cursor(autocommit=True) as cur:
+            hash_ = store(cls.db.db, 'text')
+            cur.executemany(
+                "INSERT INTO reminds (datetime, owner, text_hash) VALUES (?, ?, ?)",
+                ((now + (i - ROWS // 10) * 60, i % OWNERS, hash_) for i in range(ROWS))
+            )
+            cur.execute('ANALYZE')
+        cls.statements: List[str] = []
+        cls.db.db.set_trace_callback(cls.statements.append)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.db.set_trace_callback(None)
+        cls.db.unload_instance_normal()
+        cls.folder.cleanup()
+
+    def captured(self, coroutine) -> List[str]:
+        """Statements on 'reminds', run by coroutine"""
+        self.statements.clear()
+        asyncio.run(coroutine)
+        return [
+            statement for statement in self.statements
+            if re.search(r'\breminds\b', statement)
+            and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'INSERT', 'DELETE'))
+        ]
+
+    def assert_indexed(self, statements: List[str]) -> None:
+        self.assertTrue(statements)
+        for statement in statements:
+            plan = [row[3] for row in self.db.db.execute(f'EXPLAIN QUERY PLAN {statement}')]
+            with self.subTest(statement=statement):
+                self.assertFalse([line for line in plan if _SCAN.search(line)], plan)
+        plans = ' '.join(
+            row[3] for statement in statements
+            for row in self.db.db.execute(f'EXPLAIN QUERY PLAN {statement}')
+        )
+        self.assertRegex(plans, r'USING (COVERING )?INDEX reminds_')
+
+    def test_claim(self):
+        leases = SQLiteLeaseBackend(self.db, worker_id='test')
+        self.assert_indexed(self.captured(leases.claim(time(), 10)))
+
+    def test_page_navigation(self):
+        first = self.captured(self.fetch_page(1, ('first',)))
+        self.assert_indexed(first)
+        rows, _, _ = asyncio.run(self.fetch_page(1, ('first',)))
+        date, id_, *_ = rows[-1]
+        self.assert_indexed(self.captured(self.fetch_page(1, ('next', date, id_))))
+        self.assert_indexed(self.captured(self.fetch_page(1, ('prev', date, id_))))
+
+    def test_scheduler_load(self):
+        from bot.reminders_cycle import Scheduler as Index
+        self.assert_indexed(self.captured(Index().load(self.db, time())))
+
+    def test_append_lookup(self):
+        date = datetime.now(Settings.timezone) + timedelta(days=3)
+        statements = self.captured(Reminder.append(OWNERS + 1, date, 'appended'))
+        lookup = [statement for statement in statements if statement.startswith('SELECT')]
+        self.assert_indexed(lookup)
+
+
+if __name__ == '__main__':
+    unittest.main()
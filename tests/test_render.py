@@ -0,0 +1,73 @@
+"""
+Header of reminders page agrees with amount of reminders on it
+"""
+import unittest
+from datetime import timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import time
+
+from aiogram import Dispatcher
+
+from bot.settings import Settings
+from bot.translations import Translations, compile_all, plural
+
+
+class PluralTest(unittest.TestCase):
+    def test_forms(self):
+        forms = {
+            'one': (1, 21, 31, 101),
+            'few': (2, 3, 4, 22, 34, 102),
+            'many': (0, 5, 10, 11, 12, 14, 19, 20, 25, 111, 112),
+        }
+        for form, amounts in forms.items():
+            for amount in amounts:
+                with self.subTest(amount=amount):
+                    self.assertEqual(plural(amount, 'one', 'few', 'many'), form)
+
+
+class RenderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        Settings.timezone = timezone(timedelta(hours=3), name='MSK')
+        if getattr(Settings, 'Dispatcher', None) is None:
+            Settings.Dispatcher = Dispatcher()
+        # Handlers need registered dispatcher
+        from bot import states_functions
+        from bot.states_functions.reminder_viewing import render
+        cls.render = staticmethod(render)
+
+    def header(self, amount: int, locale: str = 'ru') -> str:
+        rows = [(time() + i * 60, i, 'text', None) for i in range(amount)]
+        text, _ = self.render(rows, False, False, True, locale)
+        return text.split('\n')[0]
+
+    def test_headers(self):
+        headers = {
+            0: 'У вас нет напоминаний',
+            1: 'Ваше одно напоминание:',
+            2: 'Ваши 2 напоминания:',
+            4: 'Ваши 4 напоминания:',
+            5: 'Ваши 5 напоминаний:',
+        }
+        for amount, header in headers.items():
+            with self.subTest(amount=amount):
+                self.assertEqual(self.header(amount), header)
+
+    def test_translated_headers(self):
+        """Every plural form has its own key in catalog"""
+        from bot.states_functions import reminder_viewing
+        with TemporaryDirectory() as folder:
+            compile_all(folder=Path(folder))
+            translations = Translations(folder=Path(folder))
+            saved, reminder_viewing.tr = reminder_viewing.tr, translations
+            try:
+                for amount in (2, 5, 21):
+                    with self.subTest(amount=amount):
+                        self.assertEqual(self.header(amount, 'en'), f'Your {amount} reminders:')
+            finally:
+                reminder_viewing.tr = saved
+
+
+if __name__ == '__main__':
+    unittest.main()